@@ -0,0 +1,17 @@
+import os
+import sys
+import time
+
+# Бот-пустышка для бенчмарков: пишет строку в stdout раз в INTERVAL секунд
+# и держит BALLAST_KB килобайт памяти.
+
+INTERVAL = float(os.environ.get('DUMMY_BOT_INTERVAL', '1'))
+BALLAST_KB = int(os.environ.get('DUMMY_BOT_BALLAST_KB', '1024'))
+
+ballast = bytearray(BALLAST_KB * 1024)
+name = os.path.basename(sys.argv[0])
+counter = 0
+while True:
+    counter += 1
+    print(f'{time.strftime("%Y-%m-%d %H:%M:%S")} {name} tick {counter}', flush=True)
+    time.sleep(INTERVAL)
@@ -0,0 +1,163 @@
+import argparse
+import os
+import random
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+# Локальная замена SSH-хоста для бенчмарков. Принимает любой логин/пароль/ключ,
+# `ps -eo ...` отвечает синтетической таблицей процессов (боты из running),
+# остальные команды выполняет `sh -c` в каталоге root — так работают чтение
+# логов, stat и пакетные скрипты `sh -s`. Задержка и отказы настраиваются:
+# latency (+ jitter) перед каждым ответом, failure_rate — доля команд, на
+# которых соединение обрывается.
+
+
+class _Interface(paramiko.ServerInterface):
+    def __init__(self, host):
+        self.host = host
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.host.handle_exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+class FakeSSHHost:
+    def __init__(self, root, port=0, latency=0.0, jitter=0.0, failure_rate=0.0, host_key=None, extra_processes=50):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.extra_processes = extra_processes
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.running = {}  # script_path -> (pid, started_at, cpu, rss_kb)
+        self.commands = 0
+        self.failures = 0
+        os.makedirs(os.path.join(root, 'logs'), exist_ok=True)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', port))
+        self._sock.listen(100)
+        self.port = self._sock.getsockname()[1]
+        self._stopped = False
+
+    def set_running(self, script_paths):
+        now = time.time()
+        self.running = {path: (10000 + i, now - random.randint(60, 86400), round(random.uniform(0, 25), 1),
+                               random.randint(20000, 200000))
+                        for i, path in enumerate(script_paths)}
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, name=f'fake-ssh-{self.port}', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._sock.close()
+
+    def _accept_loop(self):
+        while not self._stopped:
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(self.host_key)
+        try:
+            transport.start_server(server=_Interface(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+        # Команды приходят в check_channel_exec_request, но принятые каналы нужно
+        # держать: Transport ссылается на них слабо, и без ссылки канал закроется
+        # раньше, чем придёт exec. Закрытые (обработанные) каналы отпускаем.
+        channels = []
+        while transport.is_active() and not self._stopped:
+            channel = transport.accept(1)
+            channels = [c for c in channels if not c.closed]
+            if channel is not None:
+                channels.append(channel)
+        transport.close()
+
+    def _ps_output(self):
+        now = time.time()
+        # колонки как у `ps -eo pid=,etimes=,times=,rss=,args=`; cpu — средняя загрузка, %
+        lines = [f'{1 + i} {86400 + i} 0 {1000 + i} /usr/sbin/daemon-{i} --foreground'
+                 for i in range(self.extra_processes)]
+        for path, (pid, started_at, cpu, rss_kb) in self.running.items():
+            lines.append(f'{pid} {int(now - started_at)} {int((now - started_at) * cpu / 100)} {rss_kb} python3 {path}')
+        return ('\n'.join(lines) + '\n').encode()
+
+    def handle_exec(self, channel, command):
+        self.commands += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.failures += 1
+            channel.get_transport().close()  # обрыв соединения
+            return
+        try:
+            if command.startswith('ps '):
+                channel.sendall(self._ps_output())
+                code = 0
+            else:
+                code = self._run_shell(channel, command)
+            # отрицательный код — процесс убит сигналом: как в sh, 128 + номер сигнала
+            channel.send_exit_status(128 - code if code < 0 else code)
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            channel.close()
+
+    def _run_shell(self, channel, command):
+        proc = subprocess.Popen(['sh', '-c', command], cwd=self.root, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if command.startswith('sh -s'):
+            # скрипт приходит в stdin канала до EOF (shutdown_write у клиента)
+            for chunk in iter(lambda: channel.recv(65536), b''):
+                proc.stdin.write(chunk)
+        proc.stdin.close()
+        try:
+            for chunk in iter(lambda: proc.stdout.read1(65536), b''):
+                channel.sendall(chunk)
+        except OSError:
+            proc.kill()  # клиент закрыл канал (например, остановлен tail -F)
+        return proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный SSH-сервер-заглушка для бенчмарков')
+    parser.add_argument('--root', default='fake_ssh_root')
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    host = FakeSSHHost(args.root, args.port, args.latency, args.jitter, args.failure_rate).start()
+    print(f'fake ssh on 127.0.0.1:{host.port}, root {os.path.abspath(args.root)}')
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Заглушка Telegram Bot API для бенчмарков: отвечает на sendMessage,
+# editMessageText и прочие методы успешным результатом и считает вызовы.
+# Подключается через telebot.apihelper.API_URL = api.url (или TELEGRAM_API_URL
+# для менеджера, запущенного отдельно, например в режиме webhook).
+
+
+class FakeTelegramAPI:
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                parsed = urlparse(self.path)
+                method = parsed.path.rsplit('/', 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                        params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+                body = json.dumps({'ok': True, 'result': api.respond(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self._server.server_address[1]
+        self.url = f'http://127.0.0.1:{self.port}/bot{{0}}/{{1}}'
+
+    def respond(self, method, params):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            self._message_id += 1
+            message_id = int(params.get('message_id') or self._message_id)
+        if method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            return {'message_id': message_id, 'date': int(time.time()), 'text': params.get('text', ''),
+                    'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'}}
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        return True
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная заглушка Telegram Bot API')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    api = FakeTelegramAPI(args.port, args.latency).start()
+    print(f'fake Bot API: TELEGRAM_API_URL={api.url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(dict(api.calls))
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+# Нагрузочный бенчмарк менеджера:
+#   python bench/run_bench.py --local 1000 --ssh 2000 --ssh-hosts 20 --output result.json
+#   python bench/run_bench.py --output new.json --compare result.json
+# Создаёт во временном каталоге bots.db с тысячами ботов, поднимает локальные
+# SSH-заглушки (fake_ssh_server) и заглушку Telegram API, запускает ботов-пустышек
+# и меряет цикл мониторинга, отрисовку списка в Telegram, пропускную способность
+# GET /bots, чтение хвоста логов и холодный старт. Результат — JSON для сравнения версий.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+ADMIN_ID = 1
+LOG_LINE = b'2024-01-01 00:00:00 INFO processed update id=%d from chat=%d in %d ms\n'
+
+
+def summarize(durations):
+    if not durations:
+        return {'n': 0}
+    ordered = sorted(durations)
+
+    def percentile(p):
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000
+
+    return {
+        'n': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def timed_runs(func, repeats):
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Бенчмарк менеджера ботов на синтетической нагрузке')
+    parser.add_argument('--local', type=int, default=1000, help='число локальных ботов в базе')
+    parser.add_argument('--ssh', type=int, default=2000, help='число SSH-ботов в базе')
+    parser.add_argument('--ssh-hosts', type=int, default=20, help='число SSH-заглушек (хостов)')
+    parser.add_argument('--running-local', type=int, default=50, help='сколько локальных ботов реально запустить')
+    parser.add_argument('--ssh-running-ratio', type=float, default=0.8)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка SSH-заглушки на команду, сек')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='доля команд с обрывом SSH-соединения')
+    parser.add_argument('--telegram-latency', type=float, default=0.0)
+    parser.add_argument('--cycles', type=int, default=5, help='циклов мониторинга')
+    parser.add_argument('--renders', type=int, default=20, help='перелистываний списка в Telegram')
+    parser.add_argument('--web-seconds', type=float, default=10)
+    parser.add_argument('--web-concurrency', type=int, default=8)
+    parser.add_argument('--tail-repeats', type=int, default=50)
+    parser.add_argument('--log-mb', type=int, default=20, help='объём лога с ротацией для замера tail')
+    parser.add_argument('--startup-repeats', type=int, default=5, help='холодных импортов main.py')
+    parser.add_argument('--skip', default='', help='пропустить замеры через запятую: monitor,render,web,tail,startup')
+    parser.add_argument('--workdir', help='рабочий каталог (по умолчанию временный, удаляется)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='куда записать JSON (по умолчанию stdout)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    return parser.parse_args()
+
+
+def install_config():
+    # config.py с настоящим токеном не нужен: handlers берёт токен и белый список отсюда
+    config = types.ModuleType('config')
+    config.API_TOKEN = '0:bench'
+    config.WHITE_LIST_IDS = [ADMIN_ID]
+    sys.modules['config'] = config
+
+
+def seed_log(path, megabytes):
+    import log_rotate
+    writer = log_rotate.RotatingLogWriter(path, max_bytes=max(megabytes * 1024 * 1024 // 4, 65536))
+    written, i = 0, 0
+    while written < megabytes * 1024 * 1024:
+        block = b''.join(LOG_LINE % (i + j, j % 977, j % 300) for j in range(1000))
+        writer.write(block)
+        written += len(block)
+        i += 1000
+    writer.close()
+
+
+def populate(args, hosts):
+    import db
+    rng = random.Random(args.seed)
+    rows = []
+    for i in range(args.local):
+        rows.append((f'local-{i}', os.path.abspath(f'bots/local_{i}.py'), 'local', None, None, None, None,
+                     f'group-{i % 25}', None))
+    for i in range(args.ssh):
+        host = hosts[i % len(hosts)]
+        rows.append((f'ssh-{i}', f'/opt/bench/ssh_bot_{i}.py', 'ssh', '127.0.0.1', host.port, 'bench', 'bench',
+                     f'host-{i % len(hosts)}', '0 3 * * *' if rng.random() < 0.1 else None))
+    conn = db.get_connection()
+    with conn:
+        conn.executemany('INSERT INTO bots (name, script_path, type, host, port, user, password, group_name, schedule) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    running = {host.port: [] for host in hosts}
+    for i in range(args.ssh):
+        if rng.random() < args.ssh_running_ratio:
+            running[hosts[i % len(hosts)].port].append(f'/opt/bench/ssh_bot_{i}.py')
+    for host in hosts:
+        host.set_running(running[host.port])
+
+
+def start_local_bots(args):
+    import db
+    import local_utils
+    os.makedirs('bots', exist_ok=True)
+    started = []
+    for bot_row in db.get_bots():
+        if bot_row[4] != 'local':
+            continue
+        shutil.copy(os.path.join(BENCH_DIR, 'dummy_bot.py'), bot_row[2])
+        if len(started) < args.running_local:
+            ok, err = local_utils.start_local_bot(bot_row[0], bot_row[2])
+            if ok:
+                started.append(bot_row[0])
+                db.update_bot_status(bot_row[0], 'running')
+    return started
+
+
+def bench_monitor(args):
+    import main
+    from monitor import last_cycle
+    durations = []
+    for _ in range(args.cycles):
+        started = time.perf_counter()
+        main.monitor_cycle()
+        durations.append(time.perf_counter() - started)
+    return dict(summarize(durations), unknown_last=last_cycle['unknown'], hosts=last_cycle['hosts'])
+
+
+def bench_render(args, telegram):
+    import handlers
+    chat = types.SimpleNamespace(id=ADMIN_ID)
+    user = types.SimpleNamespace(id=ADMIN_ID)
+    handlers.status_cache.invalidate()
+    telegram.reset()
+    started = time.perf_counter()
+    sent = handlers.show_bots_list(types.SimpleNamespace(chat=chat, from_user=user))
+    cold = time.perf_counter() - started
+    cold_calls = telegram.total_calls()
+    message = types.SimpleNamespace(chat=chat, message_id=sent.message_id)
+    pages = max((args.local + args.ssh) // handlers.DASHBOARD_PAGE_SIZE, 1)
+    telegram.reset()
+    durations = []
+    for i in range(args.renders):
+        data = handlers.router.data('dash', handlers.DASH_ACTIONS.index('page'), (i + 1) % pages)
+        call = types.SimpleNamespace(id=str(i), data=data, message=message, from_user=user)
+        started = time.perf_counter()
+        handlers.callback_query(call)
+        durations.append(time.perf_counter() - started)
+    return {
+        'cold': dict(summarize([cold]), api_calls=cold_calls),
+        'page': summarize(durations),
+        'api_calls_per_render': telegram.total_calls() / max(args.renders, 1),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_web(args):
+    import uvicorn
+    import web_panel_api
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(web_panel_api.app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    deadline = time.monotonic() + args.web_seconds
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', '/bots')
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise http.client.HTTPException(response.status)
+                local.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.web_concurrency) as executor:
+        for _ in range(args.web_concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - started
+    server.should_exit = True
+    return {'requests': len(latencies), 'errors': errors[0], 'rps': len(latencies) / elapsed,
+            'latency': summarize(latencies)}
+
+
+def bench_tail(args, hosts):
+    import local_utils
+    import ssh_utils
+    local_script = os.path.abspath('bots/tail_bench.py')
+    seed_log(os.path.join('logs', 'tail_bench.py.log'), args.log_mb)
+    host = hosts[0]
+    ssh_script = '/opt/bench/tail_bench.py'
+    seed_log(os.path.join(host.root, 'logs', 'tail_bench.py.log'), args.log_mb)
+    local = timed_runs(lambda: local_utils.get_local_bot_log(local_script, max_bytes=3500), args.tail_repeats)
+    ssh = timed_runs(lambda: ssh_utils.get_ssh_bot_log('127.0.0.1', host.port, 'bench', 'bench', ssh_script,
+                                                       max_bytes=3500), args.tail_repeats)
+    sample = ssh_utils.get_ssh_bot_log('127.0.0.1', host.port, 'bench', 'bench', ssh_script, max_bytes=3500)
+    return {'local': summarize(local), 'ssh': summarize(ssh), 'ssh_sample_ok': sample.startswith('2024-')}
+
+
+def bench_startup(args):
+    # Холодный `import main` в отдельном процессе из пустого каталога: время,
+    # загрузились ли paramiko/FastAPI и не создал ли импорт базу
+    import bootstrap
+    config_dir = os.path.abspath('startup_config')
+    cwd = os.path.abspath('startup_cwd')
+    os.makedirs(config_dir, exist_ok=True)
+    os.makedirs(cwd, exist_ok=True)
+    with open(os.path.join(config_dir, 'config.py'), 'w') as f:
+        f.write(f"API_TOKEN = '0:bench'\nWHITE_LIST_IDS = [{ADMIN_ID}]\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([config_dir, REPO_DIR]))
+    code = ('import time; started = time.perf_counter(); import main, os, sys; '
+            'print(time.perf_counter() - started, int("paramiko" in sys.modules), '
+            'int("fastapi" in sys.modules), int(os.path.exists("bots.db")))')
+    durations, flags = [], None
+    for _ in range(args.startup_repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True,
+                                capture_output=True, text=True).stdout.split()
+        durations.append(float(output[0]))
+        flags = [bool(int(flag)) for flag in output[1:]]
+    paramiko_loaded, fastapi_loaded, db_touched = flags
+    return dict(summarize(durations), budget_ms=bootstrap.STARTUP_BUDGET * 1000, paramiko_loaded=paramiko_loaded,
+                fastapi_loaded=fastapi_loaded, db_touched_on_import=db_touched)
+
+
+def check_results(args, results):
+    # Замеры путей ошибок не публикуем: без инжектированных отказов все SSH-боты
+    # должны опрашиваться, запросы к веб-панели — проходить, лог — читаться
+    problems = []
+    monitor = results.get('monitor_cycle')
+    if monitor and monitor['unknown_last'] and not args.failure_rate:
+        problems.append(f"монитор: статус unknown у {monitor['unknown_last']} ботов")
+    web = results.get('web_bots')
+    if web and web['errors']:
+        problems.append(f"веб-панель: {web['errors']} ошибочных ответов")
+    tail = results.get('log_tail')
+    if tail and not tail['ssh_sample_ok'] and not args.failure_rate:
+        problems.append('хвост лога по SSH не прочитан')
+    return problems
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f'{prefix}.{key}' if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(previous, current):
+    old = _flatten('', previous.get('results', {}), {})
+    new = _flatten('', current.get('results', {}), {})
+    lines = []
+    for key in sorted(set(old) & set(new)):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        lines.append(f'{key:45} {old[key]:12.2f} {new[key]:12.2f} {change:+8.1f}%')
+    return '\n'.join(lines)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', '-C', REPO_DIR, 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    args = parse_args()
+    # пути из аргументов — относительно исходного каталога, до перехода в workdir
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+    skip = set(filter(None, args.skip.split(',')))
+    random.seed(args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='botmanager-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    install_config()
+
+    import db
+    db.DB_PATH = os.path.join(workdir, 'bots.db')
+    db.init_db()
+
+    from fake_ssh_server import FakeSSHHost
+    from fake_telegram_api import FakeTelegramAPI
+    import paramiko
+    host_key = paramiko.RSAKey.generate(2048)
+    hosts = [FakeSSHHost(os.path.join(workdir, 'hosts', str(i)), latency=args.latency, jitter=args.jitter,
+                         failure_rate=args.failure_rate, host_key=host_key).start()
+             for i in range(max(args.ssh_hosts, 1))]
+    telegram = FakeTelegramAPI(latency=args.telegram_latency).start()
+    from telebot import apihelper
+    apihelper.API_URL = telegram.url
+
+    populate(args, hosts)
+    started_bots = start_local_bots(args)
+    results = {}
+    import local_utils
+    import ssh_utils
+    try:
+        if 'monitor' not in skip:
+            results['monitor_cycle'] = bench_monitor(args)
+        if 'render' not in skip:
+            results['dashboard_render'] = bench_render(args, telegram)
+        if 'web' not in skip:
+            results['web_bots'] = bench_web(args)
+        if 'tail' not in skip:
+            results['log_tail'] = bench_tail(args, hosts)
+        if 'startup' not in skip:
+            results['startup'] = bench_startup(args)
+    finally:
+        for bot_id in started_bots:
+            local_utils.stop_local_bot(bot_id)
+        ssh_utils.pool.close_all()
+        for host in hosts:
+            host.stop()
+        telegram.stop()
+        if not args.workdir:
+            os.chdir(REPO_DIR)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    problems = check_results(args, results)
+    if problems:
+        sys.exit('Бенчмарк недействителен: ' + '; '.join(problems))
+
+    report = {
+        'benchmark': 'botmanager',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')},
+        'ssh_commands': sum(host.commands for host in hosts),
+        'ssh_injected_failures': sum(host.failures for host in hosts),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import time
+
+import telemetry
+
+# Явный запуск приложения вместо побочных эффектов при импорте: модули только
+# объявляют функции и обработчики, а база, инструментирование Telegram и
+# фоновые потоки поднимаются отсюда (main.py, startup веб-панели). Фазы
+# старта замеряются; если от импорта bootstrap до готовности прошло больше
+# STARTUP_BUDGET секунд, в лог уходит предупреждение с разбивкой по фазам.
+
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET', '3'))
+STARTUP_SECONDS = telemetry.gauge('botmanager_startup_seconds', 'Duration of each startup phase', ('phase',))
+
+_started_at = time.perf_counter()
+_last_mark = _started_at
+_phases = []
+_db_ready = False
+_instrumented = False
+
+
+def mark(phase):
+    # Время с предыдущей отметки записывается как фаза phase
+    global _last_mark
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    STARTUP_SECONDS.set(phase, value=now - _last_mark)
+    _last_mark = now
+
+
+def init_db():
+    global _db_ready
+    if _db_ready:
+        return
+    import db
+    db.init_db()
+    _db_ready = True
+    mark('db')
+
+
+def init_bot(bot):
+    # Метрики Bot API и обработчиков; вызывается после регистрации всех обработчиков
+    global _instrumented
+    if _instrumented:
+        return
+    telemetry.instrument_telegram(bot)
+    _instrumented = True
+    mark('telegram')
+
+
+def report():
+    total = time.perf_counter() - _started_at
+    STARTUP_SECONDS.set('total', value=total)
+    details = ', '.join(f'{phase} {seconds * 1000:.0f} мс' for phase, seconds in _phases)
+    print(f'⏱️ Старт за {total:.2f} с ({details})')
+    if total > STARTUP_BUDGET:
+        print(f'⚠️ Старт дольше бюджета {STARTUP_BUDGET:g} с — проверьте `python -X importtime main.py`')
+    return total
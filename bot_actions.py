@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db import get_bots, get_bot_by_id, get_ssh_bots, update_bot_status, update_bot_status_many
+from local_utils import start_local_bot, stop_local_bot
+from ssh_utils import start_ssh_bot, stop_ssh_bot, run_ssh_batch
+from status_cache import cache as status_cache
+import supervisor
+
+# Запуск/остановка бота по id без привязки к Telegram: используется обработчиками,
+# веб-панелью и планировщиком. Возвращают (ok, err) как local_utils/ssh_utils.
+
+
+def start_bot(bot_id, manual=True):
+    # manual=False — запуск супервизором: история перезапусков не сбрасывается
+    if manual:
+        supervisor.reset_supervision(bot_id)
+    bot_row = get_bot_by_id(bot_id)
+    if not bot_row:
+        return False, 'Бот не найден'
+    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name, schedule = bot_row
+    if bot_type == 'local':
+        ok, err = start_local_bot(bot_id, script_path)
+    else:
+        ok, err = start_ssh_bot(host, port, user, password, script_path, ssh_key_path)
+    status_cache.invalidate(bot_id)
+    if ok:
+        update_bot_status(bot_id, 'running')
+    return ok, err
+
+
+def stop_bot(bot_id):
+    supervisor.cancel_restart(bot_id)
+    bot_row = get_bot_by_id(bot_id)
+    if not bot_row:
+        return False, 'Бот не найден'
+    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name, schedule = bot_row
+    if bot_type == 'local':
+        ok, err = stop_local_bot(bot_id, script_path)
+    else:
+        ok, err = stop_ssh_bot(host, port, user, password, name, ssh_key_path)
+    status_cache.invalidate(bot_id)
+    if ok:
+        update_bot_status(bot_id, 'stopped')
+    return ok, err
+
+
+def restart_bot(bot_id):
+    ok, err = stop_bot(bot_id)
+    if not ok:
+        return ok, err
+    return start_bot(bot_id)
+
+
+BULK_ACTIONS = ('start', 'stop', 'restart')
+BULK_WORKERS = 8
+
+
+def select_bots(group_name=None, bot_type=None, ids=None):
+    # id ботов по группе, типу и/или списку id (фильтры объединяются через И)
+    selected = []
+    for bot_row in get_bots():
+        if group_name is not None and (bot_row[9] or 'Без группы') != group_name:
+            continue
+        if bot_type is not None and bot_row[4] != bot_type:
+            continue
+        if ids is not None and bot_row[0] not in ids:
+            continue
+        selected.append(bot_row[0])
+    return selected
+
+
+def _run_local(action, bot_id):
+    script_path = get_bot_by_id(bot_id)[2]
+    if action == 'start':
+        return start_local_bot(bot_id, script_path)
+    if action == 'stop':
+        return stop_local_bot(bot_id, script_path)
+    ok, err = stop_local_bot(bot_id, script_path)
+    return start_local_bot(bot_id, script_path) if ok else (ok, err)
+
+
+def bulk_action(action, bot_ids, progress=None):
+    # Групповой start/stop/restart. Разные хосты обрабатываются параллельно,
+    # команды для ботов одного SSH-хоста склеиваются в один удалённый вызов.
+    # progress(done, total, bot_id, ok, err) вызывается по мере готовности.
+    # Возвращает {bot_id: (ok, err)}.
+    if action not in BULK_ACTIONS:
+        raise ValueError(f'Неизвестное действие: {action}')
+    wanted = set(bot_ids)
+    for bot_id in wanted:
+        if action == 'stop':
+            supervisor.cancel_restart(bot_id)
+        else:
+            supervisor.reset_supervision(bot_id)
+    local_ids = [b[0] for b in get_bots() if b[0] in wanted and b[4] == 'local']
+    hosts = {}
+    for bot_row in get_ssh_bots():
+        bot_id, name, script_path, _, _, host, port, user, password, ssh_key_path = bot_row[:10]
+        if bot_id in wanted:
+            hosts.setdefault((host, port, user, password, ssh_key_path), []).append((bot_id, action, name, script_path))
+    results = {bot_id: (False, 'Бот не найден') for bot_id in wanted}
+    total = len(wanted)
+    done = [0]
+    lock = threading.Lock()
+
+    def report(batch):
+        with lock:
+            results.update(batch)
+            for bot_id, (ok, err) in batch.items():
+                done[0] += 1
+                if progress:
+                    try:
+                        progress(done[0], total, bot_id, ok, err)
+                    except Exception:
+                        pass
+
+    with ThreadPoolExecutor(max_workers=BULK_WORKERS, thread_name_prefix='bulk') as executor:
+        futures = [executor.submit(lambda bot_id=bot_id: {bot_id: _run_local(action, bot_id)}) for bot_id in local_ids]
+        futures += [executor.submit(run_ssh_batch, host, port, user, password, items, ssh_key_path)
+                    for (host, port, user, password, ssh_key_path), items in hosts.items()]
+        for future in as_completed(futures):
+            report(future.result())
+    new_status = 'stopped' if action == 'stop' else 'running'
+    update_bot_status_many([(bot_id, new_status) for bot_id, (ok, _) in results.items() if ok])
+    for bot_id in wanted:
+        status_cache.invalidate(bot_id)
+    return results
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+
+from db import IMPORT_COLUMNS, import_bots_batches, iter_bots_export
+from scheduler import parse_schedule
+
+# Импорт/экспорт ботов. Файл читается потоково: JSON-массив или NDJSON (по
+# объекту на строку) определяются по первому символу. Записи проверяются и
+# пачками по IMPORT_BATCH_SIZE уходят в db.import_bots_batches — одна
+# транзакция на весь файл. Экспорт отдаётся кусками прямо из курсора.
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 20
+IMPORT_CONFLICT_MODES = ('skip', 'upsert', 'fail')
+READ_CHUNK_SIZE = 65536
+
+
+def _iter_json_array(stream, buffer):
+    decoder = json.JSONDecoder()
+    pos = buffer.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('Некорректный JSON: файл оборван или повреждён')
+            chunk = stream.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+        buffer, pos = buffer[end:], 0
+
+
+def iter_records(stream):
+    # stream — текстовый поток; генератор словарей из JSON-массива или NDJSON
+    buffer = ''
+    while not buffer.strip():
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+    if buffer.lstrip().startswith('['):
+        yield from _iter_json_array(stream, buffer)
+        return
+    line_no = 0
+    while True:
+        lines = buffer.split('\n')
+        buffer = lines.pop()
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f'Строка {line_no}: некорректный JSON ({e.msg})')
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+def _validate(record):
+    # -> кортеж в порядке IMPORT_COLUMNS; ValueError с причиной
+    if not isinstance(record, dict):
+        raise ValueError('запись должна быть объектом')
+    name, script_path = record.get('name'), record.get('script_path')
+    if not name or not script_path:
+        raise ValueError('нужны name и script_path')
+    bot_type = record.get('type') or 'local'
+    if bot_type not in ('local', 'ssh'):
+        raise ValueError(f'неизвестный type: {bot_type}')
+    if bot_type == 'ssh' and not record.get('host'):
+        raise ValueError('для SSH-бота нужен host')
+    if record.get('schedule'):
+        parse_schedule(record['schedule'])
+    port = record.get('port')
+    values = dict(record, type=bot_type, port=int(port) if port not in (None, '') else None)
+    return tuple(values.get(column) for column in IMPORT_COLUMNS)
+
+
+def import_bots(stream, on_conflict='skip'):
+    # Возвращает сводку {'ok', 'total', 'inserted', 'updated', 'skipped', 'invalid', 'duplicates', 'errors'}.
+    # Повтор имени внутри файла — ошибка входных данных, а не конфликт с базой:
+    # применяется первая запись, повторы считаются в 'duplicates' при любом режиме.
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        raise ValueError(f'on_conflict должен быть одним из: {", ".join(IMPORT_CONFLICT_MODES)}')
+    summary = {'ok': True, 'total': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'invalid': 0, 'duplicates': 0,
+               'errors': []}
+
+    def error(counter, text):
+        summary[counter] += 1
+        if len(summary['errors']) < IMPORT_MAX_ERRORS:
+            summary['errors'].append(text)
+        if on_conflict == 'fail':
+            raise ValueError(text)
+
+    def batches():
+        seen, batch = set(), []
+        for index, record in enumerate(iter_records(stream), 1):
+            summary['total'] += 1
+            try:
+                row = _validate(record)
+            except ValueError as e:
+                error('invalid', f'Запись {index}: {e}')
+                continue
+            name = row[0]
+            if name in seen:
+                error('duplicates', f'Запись {index}: имя «{name}» повторяется в файле, запись пропущена')
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+            seen.add(name)
+            batch.append(row)
+        yield batch
+
+    try:
+        counts = import_bots_batches(batches(), on_conflict)
+    except (ValueError, sqlite3.Error) as e:
+        # транзакция откатилась целиком
+        summary.update(ok=False, inserted=0, updated=0)
+        if str(e) not in summary['errors']:
+            summary['errors'].append(str(e))
+        return summary
+    summary['inserted'] = counts['inserted']
+    summary['updated'] = counts['updated']
+    summary['skipped'] += counts['skipped']
+    return summary
+
+
+def export_bots(fmt='json'):
+    # Генератор текстовых кусков: JSON-массив или NDJSON
+    if fmt == 'ndjson':
+        for record in iter_bots_export():
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+    first = True
+    yield '['
+    for record in iter_bots_export():
+        yield ('\n  ' if first else ',\n  ') + json.dumps(record, ensure_ascii=False)
+        first = False
+    yield '\n]\n'
+
+
+def format_summary(summary):
+    if not summary['ok']:
+        text = '❌ Импорт отменён, изменения не сохранены.'
+    else:
+        text = (f"📥 Импорт: записей {summary['total']}, добавлено {summary['inserted']}, "
+                f"обновлено {summary['updated']}, пропущено {summary['skipped']}, с ошибками {summary['invalid']}")
+        if summary['duplicates']:
+            text += f", повторов имён в файле {summary['duplicates']}"
+        text += '.'
+    if summary['errors']:
+        text += '\n' + '\n'.join(f'• {e}' for e in summary['errors'])
+    return text
@@ -0,0 +1,145 @@
+import base64
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+
+# Маршрутизация нажатий inline-кнопок. callback_data — base64url от байтов
+# «версия формата, код действия, аргументы», аргументы — беззнаковые varint.
+# Строки (имена, группы, адреса) в кнопки не кладутся: их заменяет
+# короткоживущий токен, под которым значение хранится в памяти процесса.
+# Обработчик ищется по коду действия одним обращением к словарю, так что
+# разбор однозначен и не зависит от числа обработчиков. Коды действий
+# назначаются явно и не меняются: старые кнопки остаются рабочими после
+# перезапуска, пока не меняется CALLBACK_VERSION.
+
+CALLBACK_VERSION = 1
+CALLBACK_MAX_LEN = 64  # ограничение Telegram на callback_data
+CALLBACK_TOKEN_TTL = 3600
+CALLBACK_MAX_TOKENS = 10000
+
+TOKEN = object()  # тип аргумента: значение хранится в TokenStore, в кнопке — только номер
+
+
+def _pack_uint(value, out):
+    if value < 0:
+        raise ValueError(f'Аргумент кнопки должен быть неотрицательным: {value}')
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _unpack_uint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Обрезанные данные кнопки')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError('Слишком длинное число в данных кнопки')
+
+
+def encode(code, args=()):
+    out = bytearray([CALLBACK_VERSION])
+    _pack_uint(code, out)
+    for arg in args:
+        _pack_uint(arg, out)
+    data = base64.urlsafe_b64encode(bytes(out)).rstrip(b'=').decode('ascii')
+    if len(data) > CALLBACK_MAX_LEN:
+        raise ValueError(f'callback_data длиннее {CALLBACK_MAX_LEN} байт')
+    return data
+
+
+def decode(data):
+    # -> (код действия, [аргументы]); ValueError, если данные не нашего формата
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (ValueError, TypeError):
+        raise ValueError('Некорректные данные кнопки')
+    if not raw or raw[0] != CALLBACK_VERSION:
+        raise ValueError('Кнопка от другой версии менеджера')
+    code, pos = _unpack_uint(raw, 1)
+    args = []
+    while pos < len(raw):
+        value, pos = _unpack_uint(raw, pos)
+        args.append(value)
+    return code, args
+
+
+class TokenStore:
+    def __init__(self, ttl=CALLBACK_TOKEN_TTL, max_size=CALLBACK_MAX_TOKENS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._values = OrderedDict()  # token -> (value, expires_at)
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, value):
+        now = time.monotonic()
+        with self._lock:
+            token = next(self._counter)
+            self._values[token] = (value, now + self.ttl)
+            # токены выдаются по возрастанию, поэтому самые старые — в начале
+            while self._values and (len(self._values) > self.max_size or next(iter(self._values.values()))[1] < now):
+                self._values.popitem(last=False)
+        return token
+
+    def get(self, token):
+        # KeyError, если токен неизвестен или истёк
+        with self._lock:
+            value, expires_at = self._values[token]
+        if expires_at < time.monotonic():
+            raise KeyError(token)
+        return value
+
+
+class CallbackRouter:
+    def __init__(self):
+        self._routes = {}  # код -> (имя, обработчик, типы аргументов)
+        self._codes = {}  # имя -> код
+        self.tokens = TokenStore()
+
+    def route(self, code, name, *kinds):
+        # Декоратор: handler(call, *args); kinds — int или TOKEN для каждого аргумента
+        if code in self._routes or name in self._codes:
+            raise ValueError(f'Действие {name} ({code}) уже зарегистрировано')
+
+        def decorator(func):
+            handler = telemetry.timed(telemetry.HANDLER_SECONDS, telemetry.HANDLER_ERRORS, func.__name__)(func)
+            self._routes[code] = (name, handler, kinds)
+            self._codes[name] = code
+            return func
+        return decorator
+
+    def data(self, name, *args):
+        # callback_data для кнопки действия name
+        code = self._codes[name]
+        kinds = self._routes[code][2]
+        if len(args) != len(kinds):
+            raise TypeError(f'Действие {name} ожидает {len(kinds)} аргументов, передано {len(args)}')
+        return encode(code, [self.tokens.put(arg) if kind is TOKEN else int(arg) for kind, arg in zip(kinds, args)])
+
+    def resolve(self, data):
+        # -> (обработчик, аргументы); ValueError, если кнопка устарела или не наша
+        code, raw_args = decode(data)
+        route = self._routes.get(code)
+        if route is None or len(raw_args) != len(route[2]):
+            raise ValueError(f'Неизвестное действие {code}')
+        _, handler, kinds = route
+        try:
+            args = [self.tokens.get(arg) if kind is TOKEN else arg for kind, arg in zip(kinds, raw_args)]
+        except KeyError:
+            raise ValueError('Срок действия кнопки истёк')
+        return handler, args
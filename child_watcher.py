@@ -0,0 +1,95 @@
+import os
+import selectors
+import threading
+import time
+
+# Событийное отслеживание завершения локальных ботов, запущенных этим процессом.
+# На Linux 5.3+ все дочерние процессы ждёт один поток через pidfd, иначе — по
+# потоку на процесс, заблокированному в waitpid (Popen.wait).
+
+_lock = threading.Lock()
+_watched = {}  # bot_id -> Popen
+_expected = set()  # bot_id, которые менеджер останавливает сам
+_callbacks = []
+
+_selector = None
+_wake_r = _wake_w = None
+_pending = []  # (bot_id, proc, pidfd), ещё не добавленные в селектор
+
+
+def on_exit(callback):
+    # callback(bot_id, returncode, exited_at, expected)
+    _callbacks.append(callback)
+    return callback
+
+
+def is_watched(bot_id):
+    with _lock:
+        return bot_id in _watched
+
+
+def expect_exit(bot_id):
+    with _lock:
+        if bot_id in _watched:
+            _expected.add(bot_id)
+
+
+def _fire(bot_id, proc):
+    returncode = proc.wait()
+    exited_at = time.time()
+    with _lock:
+        if _watched.get(bot_id) is not proc:
+            return  # бота уже перезапустили, событие устарело
+        del _watched[bot_id]
+        expected = bot_id in _expected
+        _expected.discard(bot_id)
+    for callback in list(_callbacks):
+        try:
+            callback(bot_id, returncode, exited_at, expected)
+        except Exception:
+            pass
+
+
+def _pidfd_loop():
+    while True:
+        for key, _ in _selector.select():
+            if key.fileobj == _wake_r:
+                os.read(_wake_r, 4096)
+                continue
+            bot_id, proc = key.data
+            _selector.unregister(key.fileobj)
+            os.close(key.fileobj)
+            _fire(bot_id, proc)
+        with _lock:
+            pending = _pending[:]
+            del _pending[:]
+        for bot_id, proc, pidfd in pending:
+            _selector.register(pidfd, selectors.EVENT_READ, (bot_id, proc))
+
+
+def _start_pidfd_loop():
+    global _selector, _wake_r, _wake_w
+    _selector = selectors.DefaultSelector()
+    _wake_r, _wake_w = os.pipe()
+    _selector.register(_wake_r, selectors.EVENT_READ)
+    threading.Thread(target=_pidfd_loop, name='child-watcher', daemon=True).start()
+
+
+def watch(bot_id, proc):
+    with _lock:
+        _watched[bot_id] = proc
+        _expected.discard(bot_id)
+    pidfd = None
+    if hasattr(os, 'pidfd_open'):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            pidfd = None
+    if pidfd is None:
+        threading.Thread(target=_fire, args=(bot_id, proc), name=f'child-watcher-{bot_id}', daemon=True).start()
+        return
+    with _lock:
+        if _selector is None:
+            _start_pidfd_loop()
+        _pending.append((bot_id, proc, pidfd))
+    os.write(_wake_w, b'\0')
@@ -0,0 +1,50 @@
+import json
+import threading
+import time
+
+from db import get_conversation, save_conversation, delete_conversation, prune_conversations
+
+# Состояние многошаговых диалогов (мастер добавления бота) в SQLite вместо
+# замыканий register_next_step_handler: брошенный диалог не держит память
+# процесса, а начатый — продолжается после перезапуска менеджера. Запись
+# живёт CONVERSATION_TTL секунд с последнего шага; раз в
+# CONVERSATION_PRUNE_EVERY записей просроченные удаляются, а всего хранится
+# не больше CONVERSATION_MAX_SIZE диалогов.
+
+CONVERSATION_TTL = 1800
+CONVERSATION_MAX_SIZE = 1000
+CONVERSATION_PRUNE_EVERY = 100
+
+
+class ConversationStore:
+    def __init__(self, flow, ttl=CONVERSATION_TTL, max_size=CONVERSATION_MAX_SIZE):
+        self.flow = flow
+        self.ttl = ttl
+        self.max_size = max_size
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        # (step, data) или None, если диалога нет или он просрочен
+        row = get_conversation(chat_id, self.flow)
+        if row is None:
+            return None
+        step, data, updated_at = row
+        if time.time() - updated_at > self.ttl:
+            delete_conversation(chat_id, self.flow)
+            return None
+        return step, json.loads(data)
+
+    def set(self, chat_id, step, data):
+        save_conversation(chat_id, self.flow, step, json.dumps(data, ensure_ascii=False), time.time())
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % CONVERSATION_PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def clear(self, chat_id):
+        delete_conversation(chat_id, self.flow)
+
+    def prune(self):
+        prune_conversations(time.time() - self.ttl, self.max_size)
@@ -1,74 +1,296 @@
 import sqlite3
+import threading
+
+import telemetry
 
 DB_PATH = 'bots.db'
+DB_BUSY_TIMEOUT = 30
+
+# Одно долгоживущее соединение на поток (Telegram-поллинг, монитор, воркеры FastAPI):
+# sqlite3-соединения нельзя делить между потоками, а открывать новое на каждый
+# запрос дорого. WAL позволяет читателям не блокировать писателя.
+_local = threading.local()
+
+
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-8000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT * 1000}')
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+def _execute(sql, params=()):
+    conn = get_connection()
+    with conn:
+        return conn.execute(sql, params)
+
+
+def _fetchall(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
+
+
+def _fetchone(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+
+_NEXT_REVISION = 'SELECT COALESCE(MAX(revision), 0) + 1 FROM bot_changes'
+_BOT_COLUMNS = ('name', 'script_path', 'status', 'type', 'host', 'port', 'user', 'password', 'ssh_key_path',
+                'group_name', 'schedule')
+_SUPERVISION_COLUMNS = ('policy', 'restart_count', 'last_exit_code', 'last_exit_at', 'last_restart_at', 'crash_loop')
+
+
+def _create_revision_triggers(conn):
+    def touch(bot_id, deleted=0):
+        # UPDATE, затем INSERT отсутствующей строки: без OR REPLACE/UPSERT, ведь
+        # ON CONFLICT внешнего UPSERT распространяется и на INSERT в триггере
+        return (f'UPDATE bot_changes SET revision = ({_NEXT_REVISION}), deleted = {deleted} '
+                f'WHERE bot_id = {bot_id}; '
+                f'INSERT INTO bot_changes (bot_id, revision, deleted) '
+                f'SELECT {bot_id}, ({_NEXT_REVISION}), {deleted} '
+                f'WHERE NOT EXISTS (SELECT 1 FROM bot_changes WHERE bot_id = {bot_id});')
+
+    def changed(columns):
+        # UPDATE без фактических изменений (тот же статус) ревизию не двигает
+        return ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in columns)
+
+    bot_exists = 'EXISTS (SELECT 1 FROM bots WHERE id = NEW.bot_id)'
+    triggers = {
+        'bots_revision_insert': f'AFTER INSERT ON bots BEGIN {touch("NEW.id")} END',
+        'bots_revision_update': f'AFTER UPDATE ON bots WHEN {changed(_BOT_COLUMNS)} BEGIN {touch("NEW.id")} END',
+        'bots_revision_delete': f'AFTER DELETE ON bots BEGIN {touch("OLD.id", 1)} END',
+        'bot_supervision_revision_insert':
+            f'AFTER INSERT ON bot_supervision WHEN {bot_exists} BEGIN {touch("NEW.bot_id")} END',
+        'bot_supervision_revision_update':
+            f'AFTER UPDATE ON bot_supervision WHEN {bot_exists} AND ({changed(_SUPERVISION_COLUMNS)}) '
+            f'BEGIN {touch("NEW.bot_id")} END',
+    }
+    for name, body in triggers.items():
+        # пересоздаём, чтобы базы со старой версией триггеров получили новую
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(f'CREATE TRIGGER {name} {body}')
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL,
-        script_path TEXT NOT NULL,
-        status TEXT DEFAULT 'stopped',
-        type TEXT DEFAULT 'local',
-        host TEXT,
-        port INTEGER,
-        user TEXT,
-        password TEXT,
-        ssh_key_path TEXT,
-        group_name TEXT,
-        schedule TEXT
-    )''')
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS bots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            script_path TEXT NOT NULL,
+            status TEXT DEFAULT 'stopped',
+            type TEXT DEFAULT 'local',
+            host TEXT,
+            port INTEGER,
+            user TEXT,
+            password TEXT,
+            ssh_key_path TEXT,
+            group_name TEXT,
+            schedule TEXT
+        )''')
+        # PID и время старта запущенных менеджером локальных ботов
+        conn.execute('''CREATE TABLE IF NOT EXISTS bot_processes (
+            bot_id INTEGER PRIMARY KEY,
+            pid INTEGER NOT NULL,
+            start_time TEXT
+        )''')
+        # Политика автоперезапуска и его история (supervisor.py)
+        conn.execute('''CREATE TABLE IF NOT EXISTS bot_supervision (
+            bot_id INTEGER PRIMARY KEY,
+            policy TEXT NOT NULL DEFAULT 'never',
+            restart_count INTEGER NOT NULL DEFAULT 0,
+            last_exit_code INTEGER,
+            last_exit_at REAL,
+            last_restart_at REAL,
+            crash_loop INTEGER NOT NULL DEFAULT 0
+        )''')
+        # Журнал изменений для веб-панели: последняя ревизия каждого бота
+        # (deleted=1 — надгробие удалённого). Ревизии раздают триггеры, поэтому
+        # учитываются любые записи, в том числе из другого процесса.
+        conn.execute('''CREATE TABLE IF NOT EXISTS bot_changes (
+            bot_id INTEGER PRIMARY KEY,
+            revision INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_bot_changes_revision ON bot_changes (revision)')
+        _create_revision_triggers(conn)
+        # боты из базы, созданной до появления журнала
+        conn.execute('INSERT OR IGNORE INTO bot_changes (bot_id, revision) '
+                     f'SELECT id, ({_NEXT_REVISION}) FROM bots')
+        # Незавершённые диалоги (мастер добавления бота): переживают перезапуск
+        conn.execute('''CREATE TABLE IF NOT EXISTS conversations (
+            chat_id INTEGER NOT NULL,
+            flow TEXT NOT NULL,
+            step TEXT NOT NULL,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (chat_id, flow)
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_bots_type ON bots (type)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_bots_group_name ON bots (group_name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_bots_schedule ON bots (schedule)')
 
 def add_local_bot(name, path, group_name=None, schedule=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT INTO bots (name, script_path, type, group_name, schedule) VALUES (?, ?, ?, ?, ?)', (name, path, 'local', group_name, schedule))
-    conn.commit()
-    conn.close()
+    return _execute('INSERT INTO bots (name, script_path, type, group_name, schedule) VALUES (?, ?, ?, ?, ?)', (name, path, 'local', group_name, schedule)).lastrowid
 
 def add_ssh_bot(name, path, host, port, user, password=None, ssh_key_path=None, group_name=None, schedule=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT INTO bots (name, script_path, type, host, port, user, password, ssh_key_path, group_name, schedule) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (name, path, 'ssh', host, port, user, password, ssh_key_path, group_name, schedule))
-    conn.commit()
-    conn.close()
+    return _execute('INSERT INTO bots (name, script_path, type, host, port, user, password, ssh_key_path, group_name, schedule) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (name, path, 'ssh', host, port, user, password, ssh_key_path, group_name, schedule)).lastrowid
 
 def get_bots():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT id, name, script_path, status, type, host, port, user, ssh_key_path, group_name, schedule FROM bots')
-    bots = c.fetchall()
-    conn.close()
-    return bots
+    return _fetchall('SELECT id, name, script_path, status, type, host, port, user, ssh_key_path, group_name, schedule FROM bots')
+
+def get_ssh_bots():
+    return _fetchall("SELECT * FROM bots WHERE type = 'ssh'")
 
 def get_bot_by_id(bot_id):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM bots WHERE id = ?', (bot_id,))
-    bot = c.fetchone()
-    conn.close()
-    return bot
+    return _fetchone('SELECT * FROM bots WHERE id = ?', (bot_id,))
 
 def update_bot_status(bot_id, status):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('UPDATE bots SET status = ? WHERE id = ?', (status, bot_id))
-    conn.commit()
-    conn.close()
+    _execute('UPDATE bots SET status = ? WHERE id = ?', (status, bot_id))
+
+def update_bot_status_many(updates):
+    # updates — [(bot_id, status), ...]; все изменения цикла одной транзакцией
+    conn = get_connection()
+    with conn:
+        conn.executemany('UPDATE bots SET status = ? WHERE id = ?', [(status, bot_id) for bot_id, status in updates])
 
 def update_bot_schedule(bot_id, schedule):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('UPDATE bots SET schedule = ? WHERE id = ?', (schedule, bot_id))
-    conn.commit()
-    conn.close()
+    _execute('UPDATE bots SET schedule = ? WHERE id = ?', (schedule, bot_id))
 
 def delete_bot(bot_id):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('DELETE FROM bots WHERE id = ?', (bot_id,))
-    conn.commit()
-    conn.close() 
\ No newline at end of file
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM bots WHERE id = ?', (bot_id,))
+        conn.execute('DELETE FROM bot_processes WHERE bot_id = ?', (bot_id,))
+        conn.execute('DELETE FROM bot_supervision WHERE bot_id = ?', (bot_id,))
+
+def save_bot_process(bot_id, pid, start_time):
+    _execute('INSERT OR REPLACE INTO bot_processes (bot_id, pid, start_time) VALUES (?, ?, ?)', (bot_id, pid, start_time))
+
+def get_bot_process(bot_id):
+    return _fetchone('SELECT pid, start_time FROM bot_processes WHERE bot_id = ?', (bot_id,))
+
+def delete_bot_process(bot_id):
+    _execute('DELETE FROM bot_processes WHERE bot_id = ?', (bot_id,))
+
+IMPORT_COLUMNS = ('name', 'script_path', 'type', 'host', 'port', 'user', 'password', 'ssh_key_path', 'group_name', 'schedule')
+EXPORT_COLUMNS = ('name', 'script_path', 'type', 'host', 'port', 'user', 'ssh_key_path', 'group_name', 'schedule')
+
+def import_bots_batches(batches, on_conflict='skip'):
+    # batches — итератор списков кортежей в порядке IMPORT_COLUMNS. Всё в одной
+    # транзакции: при on_conflict='fail' первый же существующий name откатывает импорт
+    # (ValueError). 'skip' оставляет существующих ботов, 'upsert' обновляет их
+    # (пароль — только если он задан). Возвращает {'inserted', 'updated', 'skipped'}.
+    columns = ', '.join(IMPORT_COLUMNS)
+    placeholders = ', '.join('?' * len(IMPORT_COLUMNS))
+    if on_conflict == 'upsert':
+        updates = ', '.join(f'{c} = excluded.{c}' for c in IMPORT_COLUMNS if c not in ('name', 'password'))
+        sql = (f'INSERT INTO bots ({columns}) VALUES ({placeholders}) ON CONFLICT(name) DO UPDATE SET {updates}, '
+               'password = COALESCE(excluded.password, bots.password)')
+    elif on_conflict == 'skip':
+        sql = f'INSERT OR IGNORE INTO bots ({columns}) VALUES ({placeholders})'
+    else:
+        sql = f'INSERT INTO bots ({columns}) VALUES ({placeholders})'
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    conn = get_connection()
+    with conn:
+        for batch in batches:
+            if not batch:
+                continue
+            names = [row[0] for row in batch]
+            existing = {row[0] for row in conn.execute(
+                f'SELECT name FROM bots WHERE name IN ({", ".join("?" * len(names))})', names)}
+            if existing and on_conflict == 'fail':
+                raise ValueError(f'Боты уже существуют: {", ".join(sorted(existing)[:10])}')
+            conn.executemany(sql, batch)
+            counts['updated' if on_conflict == 'upsert' else 'skipped'] += len(existing)
+            counts['inserted'] += len(batch) - len(existing)
+    return counts
+
+def iter_bots_export():
+    # Строки для экспорта прямо из курсора. Отдельное соединение: генератор может
+    # дочитываться из другого потока (StreamingResponse в FastAPI).
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+    try:
+        cursor = conn.execute(f'SELECT {", ".join(EXPORT_COLUMNS)} FROM bots ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(EXPORT_COLUMNS, row))
+    finally:
+        conn.close()
+
+def get_supervision(bot_id):
+    # (policy, restart_count, last_exit_code, last_exit_at, last_restart_at, crash_loop)
+    row = _fetchone('SELECT policy, restart_count, last_exit_code, last_exit_at, last_restart_at, crash_loop '
+                    'FROM bot_supervision WHERE bot_id = ?', (bot_id,))
+    return row or ('never', 0, None, None, None, 0)
+
+def get_supervisions():
+    # {bot_id: (policy, restart_count, last_exit_code, last_exit_at, last_restart_at, crash_loop)}
+    rows = _fetchall('SELECT bot_id, policy, restart_count, last_exit_code, last_exit_at, last_restart_at, crash_loop '
+                     'FROM bot_supervision')
+    return {row[0]: row[1:] for row in rows}
+
+def set_restart_policy(bot_id, policy):
+    _execute('INSERT INTO bot_supervision (bot_id, policy) VALUES (?, ?) '
+             'ON CONFLICT(bot_id) DO UPDATE SET policy = excluded.policy, crash_loop = 0', (bot_id, policy))
+
+def record_bot_exit(bot_id, exit_code, exited_at):
+    _execute('INSERT INTO bot_supervision (bot_id, last_exit_code, last_exit_at) VALUES (?, ?, ?) '
+             'ON CONFLICT(bot_id) DO UPDATE SET last_exit_code = excluded.last_exit_code, '
+             'last_exit_at = excluded.last_exit_at', (bot_id, exit_code, exited_at))
+
+def record_bot_restart(bot_id, restarted_at):
+    _execute('UPDATE bot_supervision SET restart_count = restart_count + 1, last_restart_at = ? WHERE bot_id = ?',
+             (restarted_at, bot_id))
+
+def set_crash_loop(bot_id, crash_loop):
+    _execute('UPDATE bot_supervision SET crash_loop = ? WHERE bot_id = ?', (int(crash_loop), bot_id))
+
+def reset_restart_history(bot_id):
+    _execute('UPDATE bot_supervision SET crash_loop = 0, restart_count = 0 WHERE bot_id = ?', (bot_id,))
+
+def get_revision():
+    return _fetchone('SELECT COALESCE(MAX(revision), 0) FROM bot_changes')[0]
+
+def get_bot_changes(since, limit=500):
+    # Изменения после ревизии since по возрастанию: [(revision, bot_id, bot_row или None)],
+    # bot_row — как в get_bots(), None для удалённого бота
+    rows = _fetchall('SELECT c.revision, c.bot_id, c.deleted, b.id, b.name, b.script_path, b.status, b.type, b.host, '
+                     'b.port, b.user, b.ssh_key_path, b.group_name, b.schedule '
+                     'FROM bot_changes c LEFT JOIN bots b ON b.id = c.bot_id '
+                     'WHERE c.revision > ? ORDER BY c.revision LIMIT ?', (since, limit))
+    return [(row[0], row[1], None if row[2] or row[3] is None else row[3:]) for row in rows]
+
+def get_conversation(chat_id, flow):
+    # (step, data_json, updated_at) или None
+    return _fetchone('SELECT step, data, updated_at FROM conversations WHERE chat_id = ? AND flow = ?', (chat_id, flow))
+
+def save_conversation(chat_id, flow, step, data, updated_at):
+    _execute('INSERT OR REPLACE INTO conversations (chat_id, flow, step, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+             (chat_id, flow, step, data, updated_at))
+
+def delete_conversation(chat_id, flow):
+    _execute('DELETE FROM conversations WHERE chat_id = ? AND flow = ?', (chat_id, flow))
+
+def prune_conversations(older_than, keep):
+    # Удаляет диалоги старше older_than и всё сверх keep самых свежих
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM conversations WHERE updated_at < ?', (older_than,))
+        conn.execute('DELETE FROM conversations WHERE rowid NOT IN '
+                     '(SELECT rowid FROM conversations ORDER BY updated_at DESC LIMIT ?)', (keep,))
+
+
+# Время и ошибки каждой функции модуля — в метрики telemetry
+telemetry.instrument_module(globals(), telemetry.DB_SECONDS, telemetry.DB_ERRORS)
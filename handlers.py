@@ -1,21 +1,38 @@
 import telebot
-from telebot import types
-import json
-from db import init_db, add_local_bot, add_ssh_bot, get_bots, get_bot_by_id, update_bot_status, delete_bot, update_bot_schedule
-from local_utils import start_local_bot, stop_local_bot, is_local_bot_running, get_local_bot_log
-from ssh_utils import start_ssh_bot, stop_ssh_bot, is_ssh_bot_running, get_ssh_bot_log
+from telebot import apihelper, types
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from db import add_local_bot, add_ssh_bot, get_bots, get_bot_by_id, delete_bot, update_bot_schedule, get_supervision, set_restart_policy
+from local_utils import get_local_bot_log
+from ssh_utils import get_ssh_bot_log
+from status_cache import cache as status_cache
+from resources import format_usage
+from scheduler import parse_schedule, notify_schedule_changed, reload_schedules
+import bot_actions
+import bot_transfer
+from callbacks import CallbackRouter, TOKEN
+from conversations import ConversationStore
+import supervisor
+from notifier import Notifier
 from config import API_TOKEN, WHITE_LIST_IDS
 
+# Другой адрес Bot API: свой telegram-bot-api или заглушка из bench/ (формат http://host/bot{0}/{1})
+if os.environ.get('TELEGRAM_API_URL'):
+    apihelper.API_URL = os.environ['TELEGRAM_API_URL']
 bot = telebot.TeleBot(API_TOKEN)
+notifier = Notifier(bot.send_message)
+router = CallbackRouter()
 
-init_db()
+LOG_MESSAGE_BUDGET = 3500
 
-def notify_admins(text):
+def notify_admins(text, parse_mode='HTML', coalesce=None):
+    # Не блокирует: сообщения уходят через очередь notifier с учётом лимитов Telegram
     for admin_id in WHITE_LIST_IDS:
-        try:
-            bot.send_message(admin_id, text, parse_mode='HTML')
-        except Exception:
-            pass
+        notifier.enqueue(admin_id, text, parse_mode, coalesce)
 
 def check_access(message_or_call):
     user_id = message_or_call.from_user.id
@@ -28,15 +45,32 @@ def check_access(message_or_call):
         return False
     return True
 
+def _button(text, action, *args):
+    return types.InlineKeyboardButton(text, callback_data=router.data(action, *args))
+
+@bot.callback_query_handler(func=lambda call: True)
+def callback_query(call):
+    # Все inline-кнопки приходят сюда, обработчик выбирается по коду действия (callbacks.py)
+    if not check_access(call):
+        return
+    try:
+        handler, args = router.resolve(call.data)
+    except ValueError:
+        bot.answer_callback_query(call.id, 'Кнопка устарела, откройте меню заново')
+        bot.send_message(call.message.chat.id, 'Меню:', reply_markup=main_menu())
+        return
+    handler(call, *args)
+
 def main_menu():
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('➕ Добавить бота', callback_data='add_bot'))
-    markup.add(types.InlineKeyboardButton('📋 Все боты', callback_data='list_bots_all'))
-    markup.add(types.InlineKeyboardButton('🖥️ Локальные', callback_data='list_bots_local'))
-    markup.add(types.InlineKeyboardButton('🌐 SSH', callback_data='list_bots_ssh'))
-    markup.add(types.InlineKeyboardButton('⏰ Экспорт', callback_data='export_bots'))
-    markup.add(types.InlineKeyboardButton('📥 Импорт', callback_data='import_bots'))
-    markup.add(types.InlineKeyboardButton('ℹ️ Помощь', callback_data='help'))
+    markup.add(_button('➕ Добавить бота', 'add_bot'))
+    markup.add(_button('📋 Все боты', 'list', LIST_TYPES.index('all')))
+    markup.add(_button('🖥️ Локальные', 'list', LIST_TYPES.index('local')))
+    markup.add(_button('🌐 SSH', 'list', LIST_TYPES.index('ssh')))
+    markup.add(_button('📦 Групповые действия', 'bulk'))
+    markup.add(_button('⏰ Экспорт', 'export_bots'))
+    markup.add(_button('📥 Импорт', 'import_bots'))
+    markup.add(_button('ℹ️ Помощь', 'help'))
     return markup
 
 @bot.message_handler(commands=['start'])
@@ -45,180 +79,334 @@ def start_message(message):
         return
     bot.send_message(message.chat.id, 'Добро пожаловать! Менеджер ботов:', reply_markup=main_menu())
 
-@bot.callback_query_handler(func=lambda call: call.data == 'add_bot')
+# --- Мастер добавления бота ---
+# Шаг и введённые данные хранятся в wizard_store (SQLite), а не в замыканиях
+# register_next_step_handler: брошенный мастер истекает по TTL и не держит
+# память, а начатый продолжается после перезапуска менеджера.
+wizard_store = ConversationStore('add_bot')
+BOT_TYPES = ('local', 'ssh')
+
+def _wizard_ask(chat_id, step, data, text, reply_markup=None):
+    wizard_store.set(chat_id, step, data)
+    bot.send_message(chat_id, text, reply_markup=reply_markup)
+
+def _wizard_data(call, step):
+    # Данные мастера, если он ждёт нажатия именно этой кнопки
+    state = wizard_store.get(call.message.chat.id)
+    if state is None or state[0] != step:
+        bot.answer_callback_query(call.id, 'Мастер добавления устарел, начните заново')
+        return None
+    bot.answer_callback_query(call.id)
+    return state[1]
+
+@router.route(1, 'add_bot')
 def add_bot_callback(call):
-    if not check_access(call):
-        return
-    msg = bot.send_message(call.message.chat.id, 'Введите имя нового бота:')
-    bot.register_next_step_handler(msg, process_bot_name)
+    _wizard_ask(call.message.chat.id, 'name', {}, 'Введите имя нового бота (/cancel — отменить):')
 
-def process_bot_name(message):
-    name = message.text.strip()
-    msg = bot.send_message(message.chat.id, 'Введите название группы/устройства (например, Ноутбук, Телефон):')
-    bot.register_next_step_handler(msg, lambda m: process_bot_group(m, name))
+def process_bot_name(message, data):
+    data['name'] = message.text.strip()
+    _wizard_ask(message.chat.id, 'group', data, 'Введите название группы/устройства (например, Ноутбук, Телефон):')
 
-def process_bot_group(message, name):
-    group_name = message.text.strip()
+def process_bot_group(message, data):
+    data['group_name'] = message.text.strip()
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('Локальный', callback_data=f'type_local_{name}_{group_name}'))
-    markup.add(types.InlineKeyboardButton('SSH', callback_data=f'type_ssh_{name}_{group_name}'))
-    bot.send_message(message.chat.id, 'Выберите тип бота:', reply_markup=markup)
-
-@bot.callback_query_handler(func=lambda call: call.data.startswith('type_'))
-def process_bot_type(call):
-    data = call.data.split('_')
-    bot_type = data[1]
-    name = data[2]
-    group_name = '_'.join(data[3:])
-    if bot_type == 'local':
-        msg = bot.send_message(call.message.chat.id, 'Введите путь к скрипту бота:')
-        bot.register_next_step_handler(msg, lambda m: process_bot_path(m, name, 'local', None, None, None, None, None, group_name))
+    markup.add(_button('Локальный', 'add_type', BOT_TYPES.index('local')))
+    markup.add(_button('SSH', 'add_type', BOT_TYPES.index('ssh')))
+    _wizard_ask(message.chat.id, 'type', data, 'Выберите тип бота:', markup)
+
+@router.route(25, 'add_type', int)
+def process_bot_type(call, type_index):
+    data = _wizard_data(call, 'type')
+    if data is None:
+        return
+    data['type'] = BOT_TYPES[type_index]
+    if data['type'] == 'local':
+        _wizard_ask(call.message.chat.id, 'path', data, 'Введите путь к скрипту бота:')
     else:
-        msg = bot.send_message(call.message.chat.id, 'Введите host (IP) устройства:')
-        bot.register_next_step_handler(msg, lambda m: process_ssh_host(m, name, group_name))
+        _wizard_ask(call.message.chat.id, 'host', data, 'Введите host (IP) устройства:')
 
-def process_ssh_host(message, name, group_name):
-    host = message.text.strip()
-    msg = bot.send_message(message.chat.id, 'Введите порт (обычно 22):')
-    bot.register_next_step_handler(msg, lambda m: process_ssh_port(m, name, host, group_name))
+def process_ssh_host(message, data):
+    data['host'] = message.text.strip()
+    _wizard_ask(message.chat.id, 'port', data, 'Введите порт (обычно 22):')
 
-def process_ssh_port(message, name, host, group_name):
+def process_ssh_port(message, data):
     try:
-        port = int(message.text.strip())
-    except:
-        port = 22
-    msg = bot.send_message(message.chat.id, 'Введите логин:')
-    bot.register_next_step_handler(msg, lambda m: process_ssh_user(m, name, host, port, group_name))
-
-def process_ssh_user(message, name, host, port, group_name):
-    user = message.text.strip()
+        data['port'] = int(message.text.strip())
+    except ValueError:
+        data['port'] = 22
+    _wizard_ask(message.chat.id, 'user', data, 'Введите логин:')
+
+def process_ssh_user(message, data):
+    data['user'] = message.text.strip()
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('Пароль', callback_data=f'ssh_auth_pass_{name}_{host}_{port}_{user}_{group_name}'))
-    markup.add(types.InlineKeyboardButton('SSH-ключ', callback_data=f'ssh_auth_key_{name}_{host}_{port}_{user}_{group_name}'))
-    bot.send_message(message.chat.id, 'Выберите способ аутентификации:', reply_markup=markup)
-
-@bot.callback_query_handler(func=lambda call: call.data.startswith('ssh_auth_pass_'))
-def ssh_auth_pass_callback(call):
-    _, _, name, host, port, user, group_name = call.data.split('_', 6)
-    msg = bot.send_message(call.message.chat.id, 'Введите пароль:')
-    bot.register_next_step_handler(msg, lambda m: process_ssh_password(m, name, host, int(port), user, group_name))
-
-@bot.callback_query_handler(func=lambda call: call.data.startswith('ssh_auth_key_'))
-def ssh_auth_key_callback(call):
-    _, _, name, host, port, user, group_name = call.data.split('_', 6)
-    msg = bot.send_message(call.message.chat.id, 'Введите путь к приватному ключу (например, /home/user/.ssh/id_rsa):')
-    bot.register_next_step_handler(msg, lambda m: process_ssh_key(m, name, host, int(port), user, group_name))
-
-def process_ssh_password(message, name, host, port, user, group_name):
-    password = message.text.strip()
-    msg = bot.send_message(message.chat.id, 'Введите путь к скрипту на удалённом устройстве:')
-    bot.register_next_step_handler(msg, lambda m: process_bot_path(m, name, 'ssh', host, port, user, password, None, group_name))
-
-def process_ssh_key(message, name, host, port, user, group_name):
-    ssh_key_path = message.text.strip()
-    msg = bot.send_message(message.chat.id, 'Введите путь к скрипту на удалённом устройстве:')
-    bot.register_next_step_handler(msg, lambda m: process_bot_path(m, name, 'ssh', host, port, user, None, ssh_key_path, group_name))
-
-def process_bot_path(message, name, bot_type, host=None, port=None, user=None, password=None, ssh_key_path=None, group_name=None):
+    markup.add(_button('Пароль', 'ssh_auth', 0))
+    markup.add(_button('SSH-ключ', 'ssh_auth', 1))
+    _wizard_ask(message.chat.id, 'auth', data, 'Выберите способ аутентификации:', markup)
+
+@router.route(26, 'ssh_auth', int)
+def ssh_auth_callback(call, use_key):
+    data = _wizard_data(call, 'auth')
+    if data is None:
+        return
+    if use_key:
+        _wizard_ask(call.message.chat.id, 'ssh_key', data, 'Введите путь к приватному ключу (например, /home/user/.ssh/id_rsa):')
+    else:
+        _wizard_ask(call.message.chat.id, 'password', data, 'Введите пароль:')
+
+def process_ssh_password(message, data):
+    data['password'] = message.text.strip()
+    _wizard_ask(message.chat.id, 'path', data, 'Введите путь к скрипту на удалённом устройстве:')
+
+def process_ssh_key(message, data):
+    data['ssh_key_path'] = message.text.strip()
+    _wizard_ask(message.chat.id, 'path', data, 'Введите путь к скрипту на удалённом устройстве:')
+
+def process_bot_path(message, data):
     path = message.text.strip()
+    wizard_store.clear(message.chat.id)
+    name, group_name = data['name'], data['group_name']
     try:
-        if bot_type == 'local':
+        if data['type'] == 'local':
             add_local_bot(name, path, group_name)
         else:
-            add_ssh_bot(name, path, host, port, user, password, ssh_key_path, group_name)
+            add_ssh_bot(name, path, data['host'], data['port'], data['user'], data.get('password'),
+                        data.get('ssh_key_path'), group_name)
         bot.send_message(message.chat.id, f'✅ Бот "{name}" добавлен!')
     except Exception as e:
         bot.send_message(message.chat.id, f'❌ Ошибка: {e}')
     bot.send_message(message.chat.id, 'Меню:', reply_markup=main_menu())
 
-@bot.callback_query_handler(func=lambda call: call.data == 'list_bots')
-def show_bots_list_callback(call):
-    if not check_access(call):
+# Шаги, которые ждут текст; на шагах с кнопками (type, auth) текст не принимается
+WIZARD_STEPS = {
+    'name': process_bot_name,
+    'group': process_bot_group,
+    'host': process_ssh_host,
+    'port': process_ssh_port,
+    'user': process_ssh_user,
+    'password': process_ssh_password,
+    'ssh_key': process_ssh_key,
+    'path': process_bot_path,
+}
+
+@bot.message_handler(commands=['cancel'])
+def cancel_message(message):
+    if not check_access(message):
         return
-    show_bots_list(call.message)
-
-@bot.callback_query_handler(func=lambda call: call.data == 'list_bots_all')
-def show_all_bots_callback(call):
-    show_bots_list(call.message, filter_type='all')
+    wizard_store.clear(message.chat.id)
+    bot.send_message(message.chat.id, 'Действие отменено.', reply_markup=main_menu())
 
-@bot.callback_query_handler(func=lambda call: call.data == 'list_bots_local')
-def show_local_bots_callback(call):
-    show_bots_list(call.message, filter_type='local')
+@bot.message_handler(func=lambda message: wizard_store.get(message.chat.id) is not None)
+def wizard_message(message):
+    if not check_access(message):
+        return
+    state = wizard_store.get(message.chat.id)
+    if state is None:
+        return
+    step, data = state
+    if step not in WIZARD_STEPS:
+        bot.send_message(message.chat.id, 'Выберите вариант кнопкой выше или отправьте /cancel.')
+        return
+    WIZARD_STEPS[step](message, data)
+
+@router.route(5, 'list', int)
+def show_bots_list_callback(call, type_index):
+    show_bots_list(call.message, filter_type=LIST_TYPES[type_index])
+
+# --- Список ботов ---
+# Список — одно сообщение со страницей из DASHBOARD_PAGE_SIZE ботов. Навигация,
+# фильтры и действия правят это же сообщение через edit_message_text, статусы
+# берутся из status_cache, поэтому отрисовка стоит один-два вызова API.
+DASHBOARD_PAGE_SIZE = 8
+DASHBOARD_MAX_TRACKED = 500
+STATUS_ICONS = {'running': '🟢', 'stopped': '🔴', 'unknown': '⚪'}
+TYPE_TITLES = {'all': 'Все', 'local': 'Локальные', 'ssh': 'SSH'}
+LIST_TYPES = tuple(TYPE_TITLES)
+DASH_ACTIONS = ('noop', 'menu', 'page', 'type', 'group', 'card', 'back', 'refresh')
+
+def _dash_button(text, action, arg=0):
+    return _button(text, 'dash', DASH_ACTIONS.index(action), arg)
+
+# (chat_id, message_id) -> {'type', 'group', 'page', 'card'} для открытых списков
+_dashboards = OrderedDict()
+_dashboards_lock = threading.Lock()
+
+def _group_names():
+    return sorted({b[9] or 'Без группы' for b in get_bots()})
+
+def _remember_dashboard(message, state):
+    key = (message.chat.id, message.message_id)
+    with _dashboards_lock:
+        _dashboards[key] = state
+        _dashboards.move_to_end(key)
+        while len(_dashboards) > DASHBOARD_MAX_TRACKED:
+            _dashboards.popitem(last=False)
+
+def _dashboard_state(message):
+    with _dashboards_lock:
+        state = _dashboards.get((message.chat.id, message.message_id))
+    return dict(state) if state else None
+
+def _page_bots(state):
+    bots = [b for b in get_bots()
+            if (state['type'] == 'all' or b[4] == state['type'])
+            and (state['group'] is None or (b[9] or 'Без группы') == state['group'])]
+    bots.sort(key=lambda b: (b[9] or 'Без группы', b[1].lower()))
+    pages = max((len(bots) + DASHBOARD_PAGE_SIZE - 1) // DASHBOARD_PAGE_SIZE, 1)
+    state['page'] = min(max(state['page'], 0), pages - 1)
+    start = state['page'] * DASHBOARD_PAGE_SIZE
+    return bots, pages, bots[start:start + DASHBOARD_PAGE_SIZE]
+
+def _render_list(state):
+    bots, pages, page_bots = _page_bots(state)
+    statuses = status_cache.get_many([b[0] for b in page_bots])
+    lines = [f"📋 <b>Боты</b>: {TYPE_TITLES[state['type']]}, группа: {state['group'] or 'все'} (всего {len(bots)})"]
+    markup = types.InlineKeyboardMarkup()
+    current_group = None
+    for bot_row in page_bots:
+        bot_id, name, _, _, bot_type, *_, group_name, schedule = bot_row
+        if (group_name or 'Без группы') != current_group:
+            current_group = group_name or 'Без группы'
+            lines.append(f'\n📦 <b>{current_group}</b>')
+        real_status = statuses[bot_id]['status']
+        icon = STATUS_ICONS.get(real_status, '⚪')
+        lines.append(f'{icon} {name} · {bot_type}' + (' · ⏰' if schedule else ''))
+        if real_status == 'running':
+            toggle = _button('⏹️', 'confirm_stop', bot_id)
+        else:
+            toggle = _button('▶️', 'start', bot_id)
+        markup.row(_dash_button(f'{icon} {name}', 'card', bot_id), toggle, _button('📄', 'logs', bot_id))
+    if not bots:
+        lines.append('\nБоты не найдены.')
+    page = state['page']
+    markup.row(_dash_button('◀️', 'page', page - 1) if page > 0 else _dash_button('◀️', 'noop'),
+               _dash_button(f'{page + 1}/{pages}', 'refresh'),
+               _dash_button('▶️', 'page', page + 1) if page + 1 < pages else _dash_button('▶️', 'noop'))
+    markup.row(*[_dash_button(('✅ ' if state['type'] == t else '') + title, 'type', LIST_TYPES.index(t))
+                 for t, title in TYPE_TITLES.items()])
+    markup.row(_dash_button(f"📦 {state['group'] or 'Все группы'} ▸", 'group'),
+               _dash_button('🔄', 'refresh'),
+               _dash_button('🏠 Меню', 'menu'))
+    return '\n'.join(lines), markup
+
+def _render_card(state):
+    bot_row = get_bot_by_id(state['card'])
+    if not bot_row:
+        state['card'] = None
+        return _render_list(state)
+    bot_id, name, script_path, _, bot_type, host, port, user, _, _, group_name, schedule = bot_row
+    real_status = status_cache.get_status(bot_id)
+    text = f"🤖 <b>{name}</b>\nПуть: <code>{script_path}</code>\nСтатус: <b>{real_status}</b>\nТип: <b>{bot_type}</b>"
+    if bot_type == 'ssh':
+        text += f"\nХост: <code>{user}@{host}:{port}</code>"
+    text += f"\nГруппа: {group_name or 'Без группы'}"
+    if real_status == 'running':
+        text += format_usage(bot_id)
+    if schedule:
+        text += f"\n⏰ <b>Расписание:</b> {schedule}"
+    policy, restart_count, last_exit_code, _, _, crash_loop = get_supervision(bot_id)
+    if policy != 'never' or restart_count:
+        text += f"\n♻️ Автоперезапуск: <b>{policy}</b>, перезапусков: {restart_count}"
+        if last_exit_code is not None:
+            text += f", последний код выхода: {last_exit_code}"
+    if crash_loop:
+        text += "\n🔁 <b>Цикл падений</b> — автоперезапуск остановлен до ручного запуска"
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button('📄 Логи', 'logs', bot_id))
+    markup.add(_button('⏰ Расписание', 'schedule', bot_id))
+    markup.add(_button(f'♻️ Автоперезапуск: {policy}', 'policy', bot_id))
+    if real_status != 'running':
+        markup.add(_button('▶️ Запустить', 'start', bot_id))
+    else:
+        markup.add(_button('⏹️ Остановить', 'confirm_stop', bot_id))
+        markup.add(_button('🔄 Перезапустить', 'confirm_restart', bot_id))
+    markup.add(_button('🗑️ Удалить', 'confirm_delete', bot_id))
+    markup.add(_dash_button('⬅️ К списку', 'back'))
+    return text, markup
 
-@bot.callback_query_handler(func=lambda call: call.data == 'list_bots_ssh')
-def show_ssh_bots_callback(call):
-    show_bots_list(call.message, filter_type='ssh')
+def _render_dashboard(state):
+    return _render_card(state) if state.get('card') else _render_list(state)
 
 def show_bots_list(message, filter_type='all'):
-    if not check_access(message):
+    # Новое сообщение со списком (из меню или после текстового ввода)
+    state = {'type': filter_type, 'group': None, 'page': 0, 'card': None}
+    text, markup = _render_dashboard(state)
+    sent = bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')
+    _remember_dashboard(sent, state)
+    return sent
+
+def refresh_bots_list(message, state=None):
+    # Перерисовать список в том же сообщении; если сообщение не список — отправить новый
+    state = state or _dashboard_state(message)
+    if state is None:
+        show_bots_list(message)
         return
-    bots = get_bots()
-    if not bots:
-        bot.send_message(message.chat.id, 'Боты не добавлены.', reply_markup=main_menu())
+    text, markup = _render_dashboard(state)
+    try:
+        bot.edit_message_text(text, message.chat.id, message.message_id, reply_markup=markup, parse_mode='HTML')
+    except Exception:
+        pass  # например, «message is not modified», если ничего не изменилось
+    _remember_dashboard(message, state)
+
+@router.route(6, 'dash', int, int)
+def dashboard_callback(call, action_index, arg):
+    state = _dashboard_state(call.message) or {'type': 'all', 'group': None, 'page': 0, 'card': None}
+    action = DASH_ACTIONS[action_index] if action_index < len(DASH_ACTIONS) else 'noop'
+    if action == 'noop':
+        bot.answer_callback_query(call.id)
         return
-    # Группировка по group_name
-    groups = {}
-    for bot_row in bots:
-        bot_id, name, script_path, status, bot_type, host, port, user, ssh_key_path, group_name, schedule = bot_row
-        if filter_type != 'all' and bot_type != filter_type:
-            continue
-        group = group_name or 'Без группы'
-        if group not in groups:
-            groups[group] = []
-        groups[group].append(bot_row)
-    for group, group_bots in groups.items():
-        bot.send_message(message.chat.id, f'📦 <b>{group}</b>', parse_mode='HTML')
-        for bot_row in group_bots:
-            bot_id, name, script_path, status, bot_type, host, port, user, ssh_key_path, group_name, schedule = bot_row
-            if bot_type == 'local':
-                real_status = 'running' if is_local_bot_running(script_path) else 'stopped'
-            else:
-                full_row = get_bot_by_id(bot_id)
-                _, _, _, _, _, _, _, _, password, ssh_key_path, _, schedule = full_row
-                real_status = 'running' if is_ssh_bot_running(host, port, user, password, script_path, ssh_key_path) else 'stopped'
-            text = f"🤖 <b>{name}</b>\nПуть: <code>{script_path}</code>\nСтатус: <b>{real_status}</b>\nТип: <b>{bot_type}</b>"
-            if schedule:
-                text += f"\n⏰ <b>Расписание:</b> {schedule}"
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton('📄 Логи', callback_data=f'logs_{bot_id}'))
-            markup.add(types.InlineKeyboardButton('⏰ Расписание', callback_data=f'schedule_{bot_id}'))
-            if real_status == 'stopped':
-                markup.add(types.InlineKeyboardButton('▶️ Запустить', callback_data=f'start_{bot_id}'))
-            else:
-                markup.add(types.InlineKeyboardButton('⏹️ Остановить', callback_data=f'confirm_stop_{bot_id}'))
-                markup.add(types.InlineKeyboardButton('🔄 Перезапустить', callback_data=f'confirm_restart_{bot_id}'))
-            markup.add(types.InlineKeyboardButton('🗑️ Удалить', callback_data=f'confirm_delete_{bot_id}'))
-            bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')
-    bot.send_message(message.chat.id, 'Меню:', reply_markup=main_menu())
-
-@bot.callback_query_handler(func=lambda call: call.data.startswith('logs_'))
-def logs_callback(call):
-    bot_id = int(call.data.split('_')[1])
+    if action == 'menu':
+        with _dashboards_lock:
+            _dashboards.pop((call.message.chat.id, call.message.message_id), None)
+        bot.edit_message_text('Меню:', call.message.chat.id, call.message.message_id, reply_markup=main_menu())
+        bot.answer_callback_query(call.id)
+        return
+    if action == 'page':
+        state['page'] = arg
+    elif action == 'type' and arg < len(LIST_TYPES):
+        state.update(type=LIST_TYPES[arg], page=0)
+    elif action == 'group':
+        groups = [None] + _group_names()
+        index = groups.index(state['group']) + 1 if state['group'] in groups else 0
+        state.update(group=groups[index % len(groups)], page=0)
+    elif action == 'card':
+        state['card'] = arg
+    elif action == 'back':
+        state['card'] = None
+    elif action == 'refresh':
+        bot_ids = [state['card']] if state['card'] else [b[0] for b in _page_bots(state)[2]]
+        for bot_id in bot_ids:
+            status_cache.invalidate(bot_id)
+    refresh_bots_list(call.message, state)
+    bot.answer_callback_query(call.id)
+
+@router.route(7, 'logs', int)
+def logs_callback(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
     if not bot_row:
         bot.send_message(call.message.chat.id, '❌ Бот не найден')
         return
-    _, name, script_path, _, bot_type, host, port, user, password, ssh_key_path, _ = bot_row
+    _, name, script_path, _, bot_type, host, port, user, password, ssh_key_path, _, _ = bot_row
+    # Лог читается с конца в пределах бюджета, чтобы сообщение уложилось в 4096 символов Telegram
     if bot_type == 'local':
-        log_text = get_local_bot_log(script_path)
+        log_text = get_local_bot_log(script_path, max_bytes=LOG_MESSAGE_BUDGET)
     else:
-        log_text = get_ssh_bot_log(host, port, user, password, script_path, ssh_key_path)
+        log_text = get_ssh_bot_log(host, port, user, password, script_path, ssh_key_path, max_bytes=LOG_MESSAGE_BUDGET)
     if not log_text:
         log_text = 'Лог пуст.'
-    # Ограничим длину сообщения Telegram (4096 символов)
-    if len(log_text) > 4000:
-        log_text = log_text[-4000:]
     bot.send_message(call.message.chat.id, f'📄 Логи бота <b>{name}</b>:\n<pre>{log_text}</pre>', parse_mode='HTML')
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('schedule_'))
-def schedule_callback(call):
-    bot_id = int(call.data.split('_')[1])
+@router.route(8, 'schedule', int)
+def schedule_callback(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
     if not bot_row:
         bot.send_message(call.message.chat.id, '❌ Бот не найден')
         return
     _, name, *_ , schedule = bot_row
-    msg = f'Текущее расписание для <b>{name}</b>: {schedule or "не задано"}\n\nВведите новое расписание в формате HH:MM (например, 09:00),\nили отправьте "удалить", чтобы убрать расписание.'
+    msg = (f'Текущее расписание для <b>{name}</b>: {schedule or "не задано"}\n\n'
+           'Введите новое расписание: время HH:MM (например, 09:00) или cron-выражение (например, 0 */6 * * *).\n'
+           'Перед правилом можно указать действие start, stop или restart (по умолчанию start),\n'
+           'несколько правил разделяются «;», например: <code>09:00; stop 23:30</code>.\n'
+           'Отправьте "удалить", чтобы убрать расписание.')
     bot.send_message(call.message.chat.id, msg, parse_mode='HTML')
     bot.register_next_step_handler_by_chat_id(call.message.chat.id, lambda m: process_schedule_input(m, bot_id))
 
@@ -226,177 +414,251 @@ def process_schedule_input(message, bot_id):
     text = message.text.strip()
     if text.lower() == 'удалить':
         update_bot_schedule(bot_id, None)
+        notify_schedule_changed(bot_id, None)
         bot.send_message(message.chat.id, 'Расписание удалено.')
     else:
-        # простая валидация HH:MM
-        import re
-        if re.match(r'^\d{2}:\d{2}$', text):
+        try:
+            valid = bool(parse_schedule(text))
+        except ValueError:
+            valid = False
+        if valid:
             update_bot_schedule(bot_id, text)
+            notify_schedule_changed(bot_id, text)
             bot.send_message(message.chat.id, f'Расписание установлено: {text}')
         else:
-            bot.send_message(message.chat.id, 'Некорректный формат. Введите время в формате HH:MM или "удалить".')
+            bot.send_message(message.chat.id, 'Некорректный формат. Введите время HH:MM, cron-выражение или "удалить".')
             bot.register_next_step_handler_by_chat_id(message.chat.id, lambda m: process_schedule_input(m, bot_id))
     show_bots_list(message)
 
+@router.route(9, 'policy', int)
+def restart_policy_callback(call, bot_id):
+    # Переключение политики по кругу: never → on-failure → always
+    policies = supervisor.RESTART_POLICIES
+    policy = policies[(policies.index(get_supervision(bot_id)[0]) + 1) % len(policies)]
+    set_restart_policy(bot_id, policy)
+    supervisor.reset_supervision(bot_id)
+    bot.answer_callback_query(call.id, f'Автоперезапуск: {policy}')
+    refresh_bots_list(call.message)
+
 # --- Подтверждения ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_stop_'))
-def confirm_stop_callback(call):
-    bot_id = int(call.data.split('_')[2])
+@router.route(10, 'confirm_stop', int)
+def confirm_stop_callback(call, bot_id):
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('✅ Да, остановить', callback_data=f'stop_{bot_id}'))
-    markup.add(types.InlineKeyboardButton('❌ Нет', callback_data='cancel'))
+    markup.add(_button('✅ Да, остановить', 'stop', bot_id))
+    markup.add(_button('❌ Нет', 'cancel'))
     bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_delete_'))
-def confirm_delete_callback(call):
-    bot_id = int(call.data.split('_')[2])
+@router.route(11, 'confirm_delete', int)
+def confirm_delete_callback(call, bot_id):
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('✅ Да, удалить', callback_data=f'delete_{bot_id}'))
-    markup.add(types.InlineKeyboardButton('❌ Нет', callback_data='cancel'))
+    markup.add(_button('✅ Да, удалить', 'delete', bot_id))
+    markup.add(_button('❌ Нет', 'cancel'))
     bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_restart_'))
-def confirm_restart_callback(call):
-    bot_id = int(call.data.split('_')[2])
+@router.route(12, 'confirm_restart', int)
+def confirm_restart_callback(call, bot_id):
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton('✅ Да, перезапустить', callback_data=f'restart_{bot_id}'))
-    markup.add(types.InlineKeyboardButton('❌ Нет', callback_data='cancel'))
+    markup.add(_button('✅ Да, перезапустить', 'restart', bot_id))
+    markup.add(_button('❌ Нет', 'cancel'))
     bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
 
-@bot.callback_query_handler(func=lambda call: call.data == 'cancel')
+@router.route(13, 'cancel')
 def cancel_callback(call):
-    bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
+    if _dashboard_state(call.message):
+        refresh_bots_list(call.message)
+    else:
+        bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
     bot.answer_callback_query(call.id, 'Действие отменено')
 
 # --- Перезапуск ---
-@bot.callback_query_handler(func=lambda call: call.data.startswith('restart_'))
-def restart_bot_callback(call):
-    bot_id = int(call.data.split('_')[1])
-    stop_bot(call.message, bot_id)
-    start_bot(call.message, bot_id)
-    bot.answer_callback_query(call.id, 'Бот перезапущен!')
+@router.route(14, 'restart', int)
+def restart_bot_callback(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
-    if bot_row:
-        _, name, *_ = bot_row
+    if not bot_row:
+        bot.answer_callback_query(call.id, '❌ Бот не найден')
+        return
+    _, name, *_ = bot_row
+    ok, err = bot_actions.restart_bot(bot_id)
+    if ok:
+        bot.answer_callback_query(call.id, 'Бот перезапущен!')
         notify_admins(f'🔄 <b>Бот "{name}"</b> перезапущен пользователем <code>{call.from_user.id}</code>')
+    else:
+        bot.answer_callback_query(call.id, f'❌ Ошибка перезапуска: {err}', show_alert=True)
+    refresh_bots_list(call.message)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('start_'))
-def start_bot_callback(call):
-    if not check_access(call):
-        return
-    bot_id = int(call.data.split('_')[1])
-    start_bot(call.message, bot_id)
+@router.route(15, 'start', int)
+def start_bot_callback(call, bot_id):
+    start_bot(call, bot_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('stop_'))
-def stop_bot_callback(call):
-    if not check_access(call):
-        return
-    bot_id = int(call.data.split('_')[1])
-    stop_bot(call.message, bot_id)
+@router.route(16, 'stop', int)
+def stop_bot_callback(call, bot_id):
+    stop_bot(call, bot_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('delete_'))
-def delete_bot_callback(call):
-    if not check_access(call):
-        return
-    bot_id = int(call.data.split('_')[1])
-    delete_bot_handler(call.message, bot_id)
+@router.route(17, 'delete', int)
+def delete_bot_callback(call, bot_id):
+    delete_bot_handler(call, bot_id)
 
-def start_bot(message, bot_id):
-    if not check_access(message):
-        return
+# Действия отвечают всплывающим уведомлением и перерисовывают список на месте
+def start_bot(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
     if not bot_row:
-        bot.send_message(message.chat.id, '❌ Бот не найден')
+        bot.answer_callback_query(call.id, '❌ Бот не найден')
         return
-    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name = bot_row
+    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name, schedule = bot_row
     if status == 'running':
-        bot.send_message(message.chat.id, f'Бот "{name}" уже запущен!')
+        bot.answer_callback_query(call.id, f'Бот "{name}" уже запущен!')
+        refresh_bots_list(call.message)
         return
-    if bot_type == 'local':
-        ok, err = start_local_bot(script_path)
-    else:
-        ok, err = start_ssh_bot(host, port, user, password, script_path, ssh_key_path)
+    ok, err = bot_actions.start_bot(bot_id)
     if ok:
-        update_bot_status(bot_id, 'running')
-        bot.send_message(message.chat.id, f'▶️ Бот "{name}" запущен!')
-        notify_admins(f'▶️ <b>Бот "{name}"</b> запущен пользователем <code>{message.from_user.id}</code>')
+        bot.answer_callback_query(call.id, f'▶️ Бот "{name}" запущен!')
+        notify_admins(f'▶️ <b>Бот "{name}"</b> запущен пользователем <code>{call.from_user.id}</code>')
     else:
-        bot.send_message(message.chat.id, f'❌ Ошибка запуска: {err}')
-    show_bots_list(message)
+        bot.answer_callback_query(call.id, f'❌ Ошибка запуска: {err}', show_alert=True)
+    refresh_bots_list(call.message)
 
-def stop_bot(message, bot_id):
-    if not check_access(message):
-        return
+def stop_bot(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
     if not bot_row:
-        bot.send_message(message.chat.id, '❌ Бот не найден')
+        bot.answer_callback_query(call.id, '❌ Бот не найден')
         return
-    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name = bot_row
+    _, name, script_path, status, bot_type, host, port, user, password, ssh_key_path, group_name, schedule = bot_row
     if status == 'stopped':
-        bot.send_message(message.chat.id, f'Бот "{name}" уже остановлен!')
+        bot.answer_callback_query(call.id, f'Бот "{name}" уже остановлен!')
+        refresh_bots_list(call.message)
         return
-    if bot_type == 'local':
-        ok, err = stop_local_bot(name)
-    else:
-        ok, err = stop_ssh_bot(host, port, user, password, name, ssh_key_path)
+    ok, err = bot_actions.stop_bot(bot_id)
     if ok:
-        update_bot_status(bot_id, 'stopped')
-        bot.send_message(message.chat.id, f'⏹️ Бот "{name}" остановлен!')
-        notify_admins(f'⏹️ <b>Бот "{name}"</b> остановлен пользователем <code>{message.from_user.id}</code>')
+        bot.answer_callback_query(call.id, f'⏹️ Бот "{name}" остановлен!')
+        notify_admins(f'⏹️ <b>Бот "{name}"</b> остановлен пользователем <code>{call.from_user.id}</code>')
     else:
-        bot.send_message(message.chat.id, f'❌ Ошибка остановки: {err}')
-    show_bots_list(message)
+        bot.answer_callback_query(call.id, f'❌ Ошибка остановки: {err}', show_alert=True)
+    refresh_bots_list(call.message)
 
-def delete_bot_handler(message, bot_id):
-    if not check_access(message):
-        return
+def delete_bot_handler(call, bot_id):
     bot_row = get_bot_by_id(bot_id)
     if not bot_row:
-        bot.send_message(message.chat.id, '❌ Бот не найден')
+        bot.answer_callback_query(call.id, '❌ Бот не найден')
         return
     _, name, *_ = bot_row
     delete_bot(bot_id)
-    bot.send_message(message.chat.id, f'🗑️ Бот "{name}" удалён!')
-    show_bots_list(message)
-
-@bot.callback_query_handler(func=lambda call: call.data == 'export_bots')
+    status_cache.invalidate(bot_id)
+    notify_schedule_changed(bot_id, None)
+    bot.answer_callback_query(call.id, f'🗑️ Бот "{name}" удалён!')
+    refresh_bots_list(call.message)
+
+# --- Групповые действия ---
+BULK_ACTION_LABELS = {'start': '▶️ Запуск', 'stop': '⏹️ Остановка', 'restart': '🔄 Перезапуск'}
+BULK_ACTIONS = tuple(BULK_ACTION_LABELS)
+BULK_PROGRESS_INTERVAL = 1.0
+
+def _bulk_scope(scope):
+    # (заголовок, список id) для области ('all', None) / ('type', 'local'|'ssh') / ('group', имя)
+    kind, value = scope
+    if kind == 'all':
+        return 'все боты', bot_actions.select_bots()
+    if kind == 'type':
+        return f'все {"локальные" if value == "local" else "SSH"} боты', bot_actions.select_bots(bot_type=value)
+    return f'группа «{value}»', bot_actions.select_bots(group_name=value)
+
+@router.route(18, 'bulk')
+def bulk_menu_callback(call):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button('📋 Все боты', 'bulk_scope', ('all', None)))
+    markup.add(_button('🖥️ Все локальные', 'bulk_scope', ('type', 'local')))
+    markup.add(_button('🌐 Все SSH', 'bulk_scope', ('type', 'ssh')))
+    for group in _group_names():
+        markup.add(_button(f'📦 {group}', 'bulk_scope', ('group', group)))
+    bot.send_message(call.message.chat.id, 'Выберите ботов для группового действия:', reply_markup=markup)
+
+@router.route(19, 'bulk_scope', TOKEN)
+def bulk_scope_callback(call, scope):
+    title, bot_ids = _bulk_scope(scope)
+    markup = types.InlineKeyboardMarkup()
+    for index, label in enumerate(BULK_ACTION_LABELS.values()):
+        markup.add(_button(label, 'bulk_run', index, scope))
+    markup.add(_button('❌ Отмена', 'cancel'))
+    bot.edit_message_text(f'Групповое действие: {title} ({len(bot_ids)} шт.)', call.message.chat.id,
+                          call.message.message_id, reply_markup=markup)
+
+@router.route(20, 'bulk_run', int, TOKEN)
+def bulk_run_callback(call, action_index, scope):
+    action = BULK_ACTIONS[action_index]
+    title, bot_ids = _bulk_scope(scope)
+    label = BULK_ACTION_LABELS[action]
+    chat_id, message_id = call.message.chat.id, call.message.message_id
+    # отвечаем сразу: групповое действие идёт долго, а ход виден в сообщении
+    bot.answer_callback_query(call.id)
+    if not bot_ids:
+        bot.edit_message_text(f'{label}: {title} — ботов нет.', chat_id, message_id)
+        return
+    bot.edit_message_text(f'⏳ {label}: {title}, 0/{len(bot_ids)}', chat_id, message_id)
+    last_edit = [time.monotonic()]
+
+    # Прогресс — правкой одного сообщения, не чаще раза в BULK_PROGRESS_INTERVAL
+    def progress(done, total, bot_id, ok, err):
+        if done < total and time.monotonic() - last_edit[0] < BULK_PROGRESS_INTERVAL:
+            return
+        last_edit[0] = time.monotonic()
+        bot.edit_message_text(f'⏳ {label}: {title}, {done}/{total}', chat_id, message_id)
+
+    results = bot_actions.bulk_action(action, bot_ids, progress)
+    names = {b[0]: b[1] for b in get_bots()}
+    succeeded = sum(1 for ok, _ in results.values() if ok)
+    lines = [f'{"✅" if ok else "❌"} {names.get(bot_id, bot_id)}' + ('' if ok else f': {err}')
+             for bot_id, (ok, err) in sorted(results.items())]
+    text = f'{label}: {title} — успешно {succeeded}/{len(results)}\n\n' + '\n'.join(lines)
+    bot.edit_message_text(text[:4000], chat_id, message_id, reply_markup=main_menu())
+    notify_admins(f'📦 <b>{label}</b>: {title} — {succeeded}/{len(results)}, пользователь <code>{call.from_user.id}</code>')
+
+@router.route(21, 'export_bots')
 def export_bots_callback(call):
-    bots = get_bots()
-    bots_data = []
-    for b in bots:
-        bots_data.append({
-            'name': b[1], 'script_path': b[2], 'type': b[4], 'host': b[5], 'port': b[6], 'user': b[7],
-            'ssh_key_path': b[8], 'group_name': b[9], 'schedule': b[10]
-        })
-    with open('bots_export.json', 'w', encoding='utf-8') as f:
-        json.dump(bots_data, f, ensure_ascii=False, indent=2)
-    with open('bots_export.json', 'rb') as f:
-        bot.send_document(call.message.chat.id, f, caption='Экспорт всех ботов (JSON)')
-
-@bot.callback_query_handler(func=lambda call: call.data == 'import_bots')
+    # Экспорт пишется потоково во временный файл, а не собирается в памяти
+    with tempfile.NamedTemporaryFile('w+b', suffix='.json') as f:
+        for chunk in bot_transfer.export_bots():
+            f.write(chunk.encode('utf-8'))
+        f.seek(0)
+        bot.send_document(call.message.chat.id, f, caption='Экспорт всех ботов (JSON)',
+                          visible_file_name='bots_export.json')
+
+IMPORT_MODE_LABELS = {
+    'skip': '⏭️ Пропускать существующих',
+    'upsert': '♻️ Обновлять существующих',
+    'fail': '⛔ Отменить при совпадении',
+}
+
+@router.route(22, 'import_bots')
 def import_bots_callback(call):
-    bot.send_message(call.message.chat.id, 'Отправьте файл JSON для импорта ботов.')
-    bot.register_next_step_handler_by_chat_id(call.message.chat.id, process_import_file)
-
-def process_import_file(message):
+    markup = types.InlineKeyboardMarkup()
+    for index, mode in enumerate(bot_transfer.IMPORT_CONFLICT_MODES):
+        markup.add(_button(IMPORT_MODE_LABELS[mode], 'import_mode', index))
+    markup.add(_button('❌ Отмена', 'cancel'))
+    bot.send_message(call.message.chat.id, 'Что делать с ботами, имена которых уже есть в базе?', reply_markup=markup)
+
+@router.route(23, 'import_mode', int)
+def import_mode_callback(call, mode_index):
+    mode = bot_transfer.IMPORT_CONFLICT_MODES[mode_index]
+    bot.answer_callback_query(call.id)
+    bot.send_message(call.message.chat.id, 'Отправьте файл JSON (массив) или NDJSON (по объекту на строку).')
+    bot.register_next_step_handler_by_chat_id(call.message.chat.id, process_import_file, mode)
+
+def process_import_file(message, on_conflict='skip'):
     if not message.document:
-        bot.send_message(message.chat.id, 'Пришлите файл в формате JSON.')
+        bot.send_message(message.chat.id, 'Пришлите файл в формате JSON или NDJSON.')
         return
-    file_info = bot.get_file(message.document.file_id)
-    downloaded_file = bot.download_file(file_info.file_path)
     try:
-        bots_data = json.loads(downloaded_file.decode('utf-8'))
-        for b in bots_data:
-            if b.get('type') == 'local':
-                add_local_bot(b['name'], b['script_path'], b.get('group_name'), b.get('schedule'))
-            else:
-                add_ssh_bot(b['name'], b['script_path'], b.get('host'), b.get('port'), b.get('user'), None, b.get('ssh_key_path'), b.get('group_name'), b.get('schedule'))
-        bot.send_message(message.chat.id, f'Импортировано {len(bots_data)} ботов.')
+        file_info = bot.get_file(message.document.file_id)
+        data = bot.download_file(file_info.file_path)
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig')
+        summary = bot_transfer.import_bots(stream, on_conflict)
+        if summary['ok']:
+            reload_schedules()
+        bot.send_message(message.chat.id, bot_transfer.format_summary(summary))
     except Exception as e:
         bot.send_message(message.chat.id, f'Ошибка импорта: {e}')
     show_bots_list(message)
 
-@bot.callback_query_handler(func=lambda call: call.data == 'help')
+@router.route(24, 'help')
 def help_callback(call):
     help_text = (
         'ℹ️ <b>Справка по менеджеру ботов</b>\n\n'
@@ -409,6 +671,8 @@ def help_callback(call):
         '• <b>⏹️ Остановить</b> — остановить бота (с подтверждением).\n'
         '• <b>🔄 Перезапустить</b> — перезапустить бота (с подтверждением).\n'
         '• <b>🗑️ Удалить</b> — удалить бота (с подтверждением).\n'
+        '• <b>♻️ Автоперезапуск</b> — never / on-failure / always; при частых падениях бот помечается как «цикл падений».\n'
+        '• <b>📦 Групповые действия</b> — запуск, остановка или перезапуск всех ботов группы или типа сразу.\n'
         '\n'
         '<b>Группы</b> — позволяют удобно разделять ботов по устройствам или задачам.\n'
         '\n'
@@ -418,4 +682,5 @@ def help_callback(call):
         '\n'
         'Если появились вопросы или нужна помощь — обратись к администратору.'
     )
-    bot.send_message(call.message.chat.id, help_text, parse_mode='HTML') 
\ No newline at end of file
+    bot.send_message(call.message.chat.id, help_text, parse_mode='HTML') 
+
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Фоновые задания веб-панели: запуск и остановка ботов, групповые действия.
+# Работа идёт в пуле из JOB_WORKERS потоков, а API сразу отвечает id задания;
+# статус — GET /jobs/{id}. Повторный запрос того же действия, пока задание
+# не завершилось, возвращает уже идущее задание. Задание дольше JOB_TIMEOUT
+# показывается как 'timeout' (поток не прерывается: SSH-вызовы ограничены
+# своими таймаутами, и по завершении статус обновится). Завершённые задания
+# хранятся JOB_TTL секунд, но не больше JOB_MAX_KEPT штук.
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', '120'))
+JOB_TTL = 3600
+JOB_MAX_KEPT = 1000
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> задание, в порядке создания
+        self._active = {}  # ключ действия -> id незавершённого задания
+
+    def submit(self, action, key, func, *args, timeout=JOB_TIMEOUT):
+        # func(*args) -> результат (JSON-совместимый); исключение — задание failed
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return self._snapshot(self._jobs[job_id])
+            self._prune()
+            job = {'id': uuid.uuid4().hex, 'action': action, 'status': 'queued', 'result': None, 'error': None,
+                   'created_at': time.time(), 'started_at': None, 'finished_at': None, 'timeout': timeout}
+            self._jobs[job['id']] = job
+            self._active[key] = job['id']
+            snapshot = self._snapshot(job)
+        self._executor.submit(self._run, job, key, func, args)
+        return snapshot
+
+    def _run(self, job, key, func, args):
+        with self._lock:
+            job.update(status='running', started_at=time.time())
+        try:
+            result = func(*args)
+        except Exception as e:
+            update = {'status': 'failed', 'error': str(e)}
+        else:
+            update = {'status': 'succeeded', 'result': result}
+        with self._lock:
+            job.update(update, finished_at=time.time())
+            if self._active.get(key) == job['id']:
+                del self._active[key]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    @staticmethod
+    def _snapshot(job):
+        snapshot = dict(job)
+        if job['status'] == 'running' and time.time() - job['started_at'] > job['timeout']:
+            snapshot['status'] = 'timeout'
+        return snapshot
+
+    def _prune(self):
+        # под self._lock: выбрасываем старые завершённые задания
+        expired = time.time() - JOB_TTL
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished_at'] is not None]
+        for job_id in finished:
+            if self._jobs[job_id]['finished_at'] < expired or len(self._jobs) > JOB_MAX_KEPT:
+                del self._jobs[job_id]
+
+
+jobs = JobManager()
@@ -1,49 +1,319 @@
 import subprocess
+import signal
 import sys
 import os
+import time
+import gzip
+import threading
+from collections import deque
 
+import child_watcher
+import log_rotate
+from db import save_bot_process, get_bot_process, delete_bot_process
 
-def start_local_bot(script_path):
+STOP_TIMEOUT = 5
+TAIL_BLOCK_SIZE = 8192
+FOLLOW_CHUNK_SIZE = 65536
+FOLLOW_INITIAL_BYTES = 4096
+FOLLOW_POLL_INTERVAL = 0.5
+FOLLOW_HEARTBEAT = 15
+
+_HAS_PROC = os.path.isdir('/proc/self')
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+LOG_ROTATE_SCRIPT = os.path.abspath(log_rotate.__file__)
+
+# Popen запущенных в этом процессе ботов: нужны, чтобы забирать код выхода (не оставлять зомби)
+_children = {}
+
+
+def _read_proc_stat(pid):
+    # (состояние, время старта в тиках с загрузки) из /proc/<pid>/stat или None
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # имя процесса может содержать пробелы и скобки — разбираем после последней ')'
+    fields = data[data.rindex(b')') + 2:].split()
+    return fields[0].decode(), fields[19].decode()
+
+
+def _process_start_time(pid):
+    if _HAS_PROC:
+        stat = _read_proc_stat(pid)
+        return stat[1] if stat else None
+    return None
+
+
+def _pid_alive(pid, start_time=None):
+    if _HAS_PROC:
+        stat = _read_proc_stat(pid)
+        if stat is None:
+            return False
+        state, started = stat
+        # время старта защищает от переиспользования PID после перезагрузки/рестарта
+        return state != 'Z' and (not start_time or started == start_time)
+    if os.name == 'nt':  # Windows
+        result = subprocess.check_output(['tasklist', '/FI', f'PID eq {pid}', '/NH']).decode(errors='ignore')
+        return str(pid) in result.split()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def start_local_bot(bot_id, script_path):
     try:
         # Лог сохраняется в logs/<имя_бота>.log
         script_name = os.path.basename(script_path)
         log_dir = 'logs'
         os.makedirs(log_dir, exist_ok=True)
         log_path = os.path.join(log_dir, f'{script_name}.log')
-        with open(log_path, 'a'):
-            pass  # создать файл, если не существует
-        p = subprocess.Popen([sys.executable, script_path], stdout=open(log_path, 'a'), stderr=subprocess.STDOUT)
+        if os.name == 'nt':
+            group_kwargs = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            # отдельная сессия: PID бота == ID его группы процессов
+            group_kwargs = {'start_new_session': True}
+        # stdout/stderr бота идут через log_rotate (ротация и сжатие сегментов).
+        # Ротатор живёт в своей сессии и завершается сам по EOF, когда бот умирает.
+        rotator = subprocess.Popen([sys.executable, LOG_ROTATE_SCRIPT, log_path, str(log_rotate.LOG_MAX_BYTES),
+                                    str(log_rotate.LOG_MAX_AGE), str(log_rotate.LOG_BACKUP_COUNT)],
+                                   stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   **group_kwargs)
+        try:
+            p = subprocess.Popen([sys.executable, script_path], stdout=rotator.stdin, stderr=subprocess.STDOUT, **group_kwargs)
+        except Exception:
+            rotator.stdin.close()
+            rotator.wait()
+            raise
+        rotator.stdin.close()
+        threading.Thread(target=rotator.wait, daemon=True).start()
+        _children[bot_id] = p
+        save_bot_process(bot_id, p.pid, _process_start_time(p.pid))
+        child_watcher.watch(bot_id, p)
         return True, None
     except Exception as e:
         return False, str(e)
 
 
-def stop_local_bot(name):
+@child_watcher.on_exit
+def _forget_child(bot_id, returncode, exited_at, expected):
+    proc = _children.get(bot_id)
+    if proc is not None and proc.returncode is not None:
+        _children.pop(bot_id, None)
+        delete_bot_process(bot_id)
+
+
+def _wait_exit(pid, start_time, proc, timeout):
+    if proc is not None:
+        try:
+            proc.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not _pid_alive(pid, start_time):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def stop_local_bot(bot_id, script_path=None):
     try:
-        os.system(f'pkill -f "{name}"')
+        record = get_bot_process(bot_id)
+        proc = _children.pop(bot_id, None)
+        if not record:
+            return _stop_unrecorded(script_path)
+        pid, start_time = record
+        if _pid_alive(pid, start_time):
+            child_watcher.expect_exit(bot_id)
+            if os.name == 'nt':
+                subprocess.call(['taskkill', '/PID', str(pid), '/T', '/F'])
+            else:
+                os.killpg(pid, signal.SIGTERM)
+                if not _wait_exit(pid, start_time, proc, STOP_TIMEOUT):
+                    os.killpg(pid, signal.SIGKILL)
+                    _wait_exit(pid, start_time, proc, STOP_TIMEOUT)
+        delete_bot_process(bot_id)
         return True, None
     except Exception as e:
         return False, str(e)
 
 
-def is_local_bot_running(script_path):
-    script_name = os.path.basename(script_path)
+def _stop_unrecorded(script_path):
+    # Бот запущен до появления bot_processes (PID не записан) — останавливаем,
+    # как раньше, по пути скрипта в командной строке
+    if not script_path or os.name == 'nt':
+        return False, 'PID бота неизвестен: остановите процесс вручную'
+    code = subprocess.call(['pkill', '-f', script_path])
+    if code not in (0, 1):  # 1 — подходящих процессов нет, бот уже не работает
+        return False, f'pkill завершился с кодом {code}'
+    return True, None
+
+
+def is_local_bot_running(bot_id):
+    proc = _children.get(bot_id)
+    if proc is not None and proc.poll() is not None:
+        _children.pop(bot_id, None)
+        return False
+    record = get_bot_process(bot_id)
+    if not record:
+        return False
+    pid, start_time = record
     try:
-        if os.name == 'nt':  # Windows
-            result = subprocess.check_output(['tasklist'], shell=True).decode()
-            return script_name in result
-        else:  # Unix/Linux/Termux
-            result = subprocess.check_output(['ps', 'aux']).decode()
-            return script_name in result
+        return _pid_alive(pid, start_time)
     except Exception:
         return False
 
 
-def get_local_bot_log(script_path, lines=20):
+def get_local_bot_usage(bot_id):
+    # Потреблённое процессором время (сек) и RSS (КБ) процесса бота из /proc, или None
+    record = get_bot_process(bot_id)
+    if not _HAS_PROC or not record or not _pid_alive(*record):
+        return None
+    pid = record[0]
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read()
+        with open(f'/proc/{pid}/status', 'rb') as f:
+            status = f.read()
+    except OSError:
+        return None
+    fields = data[data.rindex(b')') + 2:].split()
+    cpu_time = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS  # utime + stime
+    rss_kb = 0
+    for line in status.splitlines():
+        if line.startswith(b'VmRSS:'):
+            rss_kb = int(line.split()[1])
+            break
+    return {'pid': pid, 'cpu_time': cpu_time, 'rss_kb': rss_kb}
+
+
+def _tail_bytes(path, lines, max_bytes=None):
+    # Последние lines строк файла: читаем блоками с конца, пока не наберётся
+    # нужное число переводов строки (или max_bytes байт), весь файл не читается.
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        chunks = []
+        newlines = size = 0
+        while pos > 0 and newlines <= lines and not (max_bytes and size > max_bytes):
+            block = min(TAIL_BLOCK_SIZE, pos)
+            pos -= block
+            f.seek(pos)
+            chunk = f.read(block)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+            size += block
+    data = b''.join(reversed(chunks))
+    return b''.join(data.splitlines(keepends=True)[-lines:])
+
+
+def tail_file(path, lines=20, max_bytes=None):
+    return _trim_to_budget(_tail_bytes(path, lines, max_bytes), max_bytes).decode('utf-8', errors='ignore')
+
+
+def _trim_to_budget(data, max_bytes):
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+    data = data[-max_bytes:]
+    # начинаем с целой строки, а если строка одна — с целого UTF-8 символа
+    newline = data.find(b'\n')
+    if 0 <= newline < len(data) - 1:
+        return data[newline + 1:]
+    while data and data[0] & 0xC0 == 0x80:
+        data = data[1:]
+    return data
+
+
+def tail_log(log_path, lines=20, max_bytes=None):
+    # Как tail_file, но если в текущем сегменте мало строк, дочитывает
+    # предыдущие (в том числе сжатые) сегменты ротации.
+    collected = []
+    remaining = lines
+    size = 0
+    for segment in log_rotate.segment_paths(log_path):
+        if segment.endswith('.gz'):
+            with gzip.open(segment, 'rb') as f:
+                chunk = list(deque(f, maxlen=remaining))
+        else:
+            chunk = _tail_bytes(segment, remaining, max_bytes).splitlines(keepends=True)
+        collected = chunk + collected
+        remaining -= len(chunk)
+        size += sum(len(line) for line in chunk)
+        if remaining <= 0 or (max_bytes and size >= max_bytes):
+            break
+    data = b''.join(collected)
+    return _trim_to_budget(data, max_bytes).decode('utf-8', errors='ignore')
+
+
+def get_local_bot_log(script_path, lines=20, max_bytes=None):
     script_name = os.path.basename(script_path)
     log_path = os.path.join('logs', f'{script_name}.log')
-    if not os.path.exists(log_path):
+    if not log_rotate.segment_paths(log_path):
         return 'Лог-файл не найден.'
-    with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-        log_lines = f.readlines()
-    return ''.join(log_lines[-lines:]) if log_lines else 'Лог пуст.' 
\ No newline at end of file
+    log_text = tail_log(log_path, lines, max_bytes)
+    return log_text if log_text else 'Лог пуст.'
+
+
+def follow_local_log(script_path, offset=None):
+    # Генератор (offset, bytes) новых данных лога начиная с offset. Пустой chunk —
+    # heartbeat, чтобы сервер замечал отключившихся клиентов. Следующий блок
+    # читается только когда потребитель забрал предыдущий (back-pressure).
+    script_name = os.path.basename(script_path)
+    log_path = os.path.join('logs', f'{script_name}.log')
+    f = None
+    inode = None
+    idle = 0.0
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(log_path, 'rb')
+                except FileNotFoundError:
+                    yield offset or 0, b''
+                    time.sleep(FOLLOW_HEARTBEAT)
+                    continue
+                st = os.fstat(f.fileno())
+                inode = st.st_ino
+                if offset is None:
+                    offset = max(st.st_size - FOLLOW_INITIAL_BYTES, 0)
+            try:
+                st = os.stat(log_path)
+            except FileNotFoundError:
+                st = None
+            rotated = st is not None and st.st_ino != inode
+            if rotated:
+                # лог ротирован: сначала дочитываем старый сегмент до конца —
+                # строки, записанные в него после прошлого опроса, не теряются
+                f.seek(offset)
+                data = f.read(FOLLOW_CHUNK_SIZE)
+                if data:
+                    offset += len(data)
+                    idle = 0.0
+                    yield offset, data
+                    continue
+            if rotated or (st is not None and st.st_size < offset):
+                # лог ротирован или обрезан — читаем новый файл с начала
+                f.close()
+                f = None
+                offset = 0
+                continue
+            f.seek(offset)
+            data = f.read(FOLLOW_CHUNK_SIZE)
+            if data:
+                offset += len(data)
+                idle = 0.0
+                yield offset, data
+                continue
+            if idle >= FOLLOW_HEARTBEAT:
+                idle = 0.0
+                yield offset, b''
+            time.sleep(FOLLOW_POLL_INTERVAL)
+            idle += FOLLOW_POLL_INTERVAL
+    finally:
+        if f is not None:
+            f.close()
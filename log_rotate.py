@@ -0,0 +1,129 @@
+import gzip
+import os
+import shutil
+import sys
+import threading
+import time
+
+# Ротация логов ботов. Запускается как отдельный процесс, читающий stdout бота
+# из pipe:  python3 log_rotate.py <log_path> [max_bytes] [max_age] [backup_count]
+# Текущий сегмент — <log_path>, ротированные — <log_path>.1.gz (самый новый),
+# <log_path>.2.gz, ... Сжатие идёт в фоновом потоке. Модуль использует только
+# стандартную библиотеку: на SSH-хосты он копируется как есть.
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_MAX_AGE = 24 * 3600
+LOG_BACKUP_COUNT = 5
+READ_CHUNK_SIZE = 65536
+
+
+def segment_paths(path, backup_count=LOG_BACKUP_COUNT):
+    # Существующие сегменты лога, от самого нового к самому старому
+    segments = [path] if os.path.exists(path) else []
+    for i in range(1, backup_count + 1):
+        for candidate in (f'{path}.{i}', f'{path}.{i}.gz'):
+            if os.path.exists(candidate):
+                segments.append(candidate)
+                break
+    return segments
+
+
+def _compress(source):
+    target = f'{source}.gz'
+    with open(source, 'rb') as src, gzip.open(f'{target}.tmp', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(f'{target}.tmp', target)
+    os.remove(source)
+
+
+class RotatingLogWriter:
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, max_age=LOG_MAX_AGE, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self._compressor = None
+        self._open()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _should_rotate(self, incoming):
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size + incoming > self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self._opened_at > self.max_age
+
+    def _shift(self):
+        oldest = self.backup_count
+        for name in (f'{self.path}.{oldest}', f'{self.path}.{oldest}.gz'):
+            if os.path.exists(name):
+                os.remove(name)
+        for i in range(oldest - 1, 0, -1):
+            for suffix in ('', '.gz'):
+                source = f'{self.path}.{i}{suffix}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.path}.{i + 1}{suffix}')
+
+    def rotate(self):
+        self._file.close()
+        if self._compressor is not None:
+            self._compressor.join()
+        if self.backup_count:
+            self._shift()
+            os.replace(self.path, f'{self.path}.1')
+            self._compressor = threading.Thread(target=_compress, args=(f'{self.path}.1',), daemon=True)
+            self._compressor.start()
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def write(self, data):
+        if self._should_rotate(len(data)):
+            # режем сегменты по границе строки, чтобы не разрывать строки и UTF-8 символы
+            newline = data.rfind(b'\n')
+            if newline >= 0:
+                self._write(data[:newline + 1])
+                data = data[newline + 1:]
+                self.rotate()
+            elif self.max_bytes and self._size > 2 * self.max_bytes:
+                self.rotate()
+        if data:
+            self._write(data)
+
+    def close(self):
+        self._file.close()
+        if self._compressor is not None:
+            self._compressor.join()
+
+
+def main(argv):
+    path = argv[1]
+    max_bytes = int(argv[2]) if len(argv) > 2 else LOG_MAX_BYTES
+    max_age = int(argv[3]) if len(argv) > 3 else LOG_MAX_AGE
+    backup_count = int(argv[4]) if len(argv) > 4 else LOG_BACKUP_COUNT
+    writer = RotatingLogWriter(path, max_bytes, max_age, backup_count)
+    stdin = sys.stdin.buffer
+    try:
+        while True:
+            data = stdin.read1(READ_CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
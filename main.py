@@ -1,65 +1,166 @@
-import telebot
-from telebot import types
-import sqlite3
-import subprocess
+import bootstrap  # первым: от него отсчитывается время старта
 import sys
 import os
 
-from handlers import bot
-from db import get_bots, update_bot_status
-from local_utils import is_local_bot_running, start_local_bot, stop_local_bot
-from ssh_utils import is_ssh_bot_running, start_ssh_bot, stop_ssh_bot
-from config import WHITE_LIST_IDS
+from handlers import bot, notify_admins
+from db import get_bots, get_bot_by_id, get_ssh_bots, update_bot_status, update_bot_status_many
+import child_watcher
+import bot_actions
+from monitor import probe_bots, record_cycle
+from scheduler import init_scheduler
+import supervisor
+from status_cache import cache as status_cache
+from resources import sampler as resource_sampler
 import threading
 import time
+import telemetry
+import webhook
 from datetime import datetime
 
+@child_watcher.on_exit
+def on_local_bot_exit(bot_id, returncode, exited_at, expected):
+    if expected:
+        return
+    status_cache.put(bot_id, {'status': 'stopped', 'exit_code': returncode})
+    bot_row = get_bot_by_id(bot_id)
+    if not bot_row or bot_row[3] != 'running':
+        return
+    update_bot_status(bot_id, 'stopped')
+    exited = datetime.fromtimestamp(exited_at).strftime('%H:%M:%S')
+    note = restart_note(bot_id, returncode)
+    notify_admins(f'❗️ Бот "{bot_row[1]}" неожиданно завершил работу! (код выхода {returncode}, {exited}){note}', parse_mode=None,
+                  coalesce=('stopped:локально', STOPPED_DIGEST_TITLE.format(host='локально', count='{count}'),
+                            f'• "{bot_row[1]}" (код выхода {returncode}, {exited}){note}'))
+
+STOPPED_DIGEST_TITLE = '❗️ Неожиданно завершили работу ботов ({host}): {count}'
+
+SUPERVISOR_DIGEST_TITLES = {
+    'restarted': '♻️ Автоматически перезапущено ботов: {count}',
+    'restart-failed': '❌ Не удалось автоматически перезапустить ботов: {count}',
+    'crash-loop': '🔁 Боты в цикле падений, автоперезапуск остановлен: {count}',
+}
+
+def restart_note(bot_id, exit_code):
+    # Передаёт падение супервизору; возвращает пояснение для уведомления
+    action, delay = supervisor.handle_exit(bot_id, exit_code)
+    if action == 'restart':
+        return f' — перезапуск через {delay:.0f} с'
+    if action == 'crash-loop':
+        return ' — цикл падений, автоперезапуск остановлен'
+    return ''
+
+def on_supervisor_event(bot_id, event, text):
+    notify_admins(text, parse_mode=None, coalesce=(f'supervisor:{event}', SUPERVISOR_DIGEST_TITLES[event], f'• {text}'))
+
+SCHEDULE_MESSAGES = {
+    'start': '⏰ Бот "{name}" запущен по расписанию ({spec})',
+    'stop': '⏰ Бот "{name}" остановлен по расписанию ({spec})',
+    'restart': '⏰ Бот "{name}" перезапущен по расписанию ({spec})',
+}
+
+def run_scheduled_job(bot_id, action, spec):
+    bot_row = get_bot_by_id(bot_id)
+    if not bot_row:
+        return
+    name = bot_row[1]
+    status = status_cache.get_status(bot_id)
+    if action == 'start' and status == 'running' or action == 'stop' and status == 'stopped':
+        return
+    if action == 'start':
+        ok, err = bot_actions.start_bot(bot_id)
+    elif action == 'stop':
+        ok, err = bot_actions.stop_bot(bot_id)
+    else:
+        ok, err = bot_actions.restart_bot(bot_id)
+    if ok:
+        # задания с одним расписанием срабатывают вместе — одна сводка вместо сообщения на бота
+        notify_admins(SCHEDULE_MESSAGES[action].format(name=name, spec=spec), parse_mode=None,
+                      coalesce=(f'schedule:{action}:{spec}', SCHEDULE_DIGEST_TITLES[action].format(spec=spec, count='{count}'), f'• "{name}"'))
+    else:
+        notify_admins(f'❌ Ошибка задания по расписанию для "{name}" ({spec}): {err}', parse_mode=None)
+
+SCHEDULE_DIGEST_TITLES = {
+    'start': '⏰ По расписанию ({spec}) запущено ботов: {count}',
+    'stop': '⏰ По расписанию ({spec}) остановлено ботов: {count}',
+    'restart': '⏰ По расписанию ({spec}) перезапущено ботов: {count}',
+}
+
+MONITOR_INTERVAL = 60
+
+def monitor_cycle():
+    started_at, started = time.time(), time.monotonic()
+    bots = get_bots()
+    ssh_bots = get_ssh_bots()
+    # SSH-хосты опрашиваются параллельно, медленные получают статус 'unknown'.
+    # За локальными дочерними процессами следит child_watcher, опрос нужен
+    # только для ботов, подхваченных после рестарта менеджера.
+    statuses = probe_bots(bots, ssh_bots)
+    record_cycle(started_at, time.monotonic() - started, statuses, ssh_bots)
+    status_cache.update(statuses)
+    # Опрос идёт до MONITOR_CYCLE_DEADLINE секунд: бота могли за это время
+    # остановить вручную или по расписанию. Сравниваем с текущими статусами,
+    # а не со снимком до опроса, иначе ручная остановка выглядит как падение.
+    current = {bot_row[0]: bot_row[3] for bot_row in get_bots()}
+    status_updates = []
+    for bot_row in bots:
+        bot_id, name, script_path, _, bot_type, host, port, user, ssh_key_path, group_name, schedule = bot_row
+        status = current.get(bot_id)
+        real_status = statuses.get(bot_id, {}).get('status', 'unknown')
+        if real_status == 'unknown' or status is None:
+            continue
+        real_running = real_status == 'running'
+        if status == 'running' and not real_running:
+            # падения ботов одного хоста склеиваются в одну сводку
+            place = host or 'локально'
+            # сразу, а не в общей транзакции: перезапуск супервизором выставит 'running'
+            update_bot_status(bot_id, 'stopped')
+            note = restart_note(bot_id, None)
+            notify_admins(f'❗️ Бот "{name}" неожиданно завершил работу!{note}', parse_mode=None,
+                          coalesce=(f'stopped:{place}', STOPPED_DIGEST_TITLE.format(host=place, count='{count}'), f'• "{name}"{note}'))
+        if status == 'stopped' and real_running:
+            status_updates.append((bot_id, 'running'))
+    # все изменения статусов за цикл — одной транзакцией
+    if status_updates:
+        update_bot_status_many(status_updates)
+    return statuses
+
 def monitor_bots():
     while True:
-        bots = get_bots()
-        for bot_row in bots:
-            bot_id, name, script_path, status, bot_type, host, port, user, ssh_key_path, group_name, schedule = bot_row
-            # Проверка живости (как раньше)
-            if bot_type == 'local':
-                real_running = is_local_bot_running(script_path)
-            else:
-                full_row = bot_row if len(bot_row) > 11 else None
-                if not full_row:
-                    continue
-                _, _, _, _, _, _, _, _, password, ssh_key_path, _, schedule = full_row
-                real_running = is_ssh_bot_running(host, port, user, password, script_path, ssh_key_path)
-            if status == 'running' and not real_running:
-                for admin_id in WHITE_LIST_IDS:
-                    try:
-                        bot.send_message(admin_id, f'❗️ Бот "{name}" неожиданно завершил работу!')
-                    except Exception:
-                        pass
-                update_bot_status(bot_id, 'stopped')
-            if status == 'stopped' and real_running:
-                update_bot_status(bot_id, 'running')
-            # --- Планировщик ---
-            if schedule:
-                now = datetime.now().strftime('%H:%M')
-                if now == schedule:
-                    if not real_running:
-                        # запуск по расписанию
-                        if bot_type == 'local':
-                            start_local_bot(script_path)
-                        else:
-                            full_row = bot_row if len(bot_row) > 11 else None
-                            if not full_row:
-                                continue
-                            _, _, _, _, _, _, _, _, password, ssh_key_path, _, schedule = full_row
-                            start_ssh_bot(host, port, user, password, script_path, ssh_key_path)
-                        update_bot_status(bot_id, 'running')
-                        for admin_id in WHITE_LIST_IDS:
-                            try:
-                                bot.send_message(admin_id, f'⏰ Бот "{name}" запущен по расписанию ({schedule})')
-                            except Exception:
-                                pass
-        time.sleep(60)
+        started = time.monotonic()
+        try:
+            monitor_cycle()
+        except Exception as e:
+            # ошибка одного цикла (база, SSH) не должна останавливать мониторинг
+            print(f'Ошибка цикла мониторинга: {e}')
+        time.sleep(max(MONITOR_INTERVAL - (time.monotonic() - started), 0))
+
+def start_background():
+    # Монитор, супервизор, планировщик и сэмплер ресурсов. Вызывается и при
+    # long polling, и при старте веб-панели в режиме webhook.
+    supervisor.init_supervisor(lambda bot_id: bot_actions.start_bot(bot_id, manual=False), on_supervisor_event)
+    threading.Thread(target=monitor_bots, daemon=True).start()
+    init_scheduler(run_scheduled_job).start()
+    resource_sampler.start()
+    bootstrap.mark('background')
+
+webhook.init_webhook(bot, start_background)
 
 if __name__ == '__main__':
+    bootstrap.mark('imports')
+    if webhook.enabled():
+        # Один процесс: веб-панель принимает обновления Telegram и сама запускает
+        # фоновые задачи (см. startup в web_panel_api)
+        import uvicorn
+        print(f'✅ Режим webhook: {webhook.webhook_url()}')
+        uvicorn.run('web_panel_api:app', host='0.0.0.0', port=int(os.environ.get('PORT', '8000')))
+        sys.exit()
+    bootstrap.init_db()
+    bootstrap.init_bot(bot)
+    start_background()
+    # Без веб-панели метрики можно отдавать отдельным экспортёром: METRICS_PORT=9108
+    if os.environ.get('METRICS_PORT'):
+        telemetry.start_exporter(int(os.environ['METRICS_PORT']))
+    bootstrap.report()
     print('✅ Telegram-бот-менеджер успешно запущен! Ожидаю команды в Telegram...')
-    threading.Thread(target=monitor_bots, daemon=True).start()
-    bot.polling(none_stop=True) 
\ No newline at end of file
+    bot.remove_webhook()
+    bot.polling(none_stop=True)
@@ -0,0 +1,160 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import child_watcher
+import telemetry
+from local_utils import is_local_bot_running
+from ssh_utils import probe_ssh_host
+
+# Параллельная проверка живости ботов: SSH-хосты опрашиваются пулом потоков,
+# на каждый хост — не больше HOST_MAX_CONCURRENCY запросов, недоступные хосты
+# отсекаются circuit breaker'ом, а цикл ограничен дедлайном: всё, что не успело,
+# получает статус 'unknown'.
+
+MONITOR_WORKERS = 16
+MONITOR_CYCLE_DEADLINE = 20
+MONITOR_COMMAND_TIMEOUT = 15
+HOST_MAX_CONCURRENCY = 2
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 120
+
+_executor = ThreadPoolExecutor(max_workers=MONITOR_WORKERS, thread_name_prefix='monitor')
+_lock = threading.Lock()
+_host_semaphores = {}
+_breakers = {}
+_in_flight = set()
+
+# Последний цикл мониторинга: длительность, число ботов/хостов, сколько не успело.
+# Обновляет record_cycle из main.monitor_cycle, а не probe_bots: разовые проверки
+# кэша статусов не должны подменять длительность цикла.
+last_cycle = {'started_at': None, 'duration': None, 'bots': 0, 'hosts': 0, 'unknown': 0}
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        # После cooldown пропускаем одну пробную попытку (half-open)
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def _host_state(host):
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+            _host_semaphores[host] = threading.BoundedSemaphore(HOST_MAX_CONCURRENCY)
+        return _breakers[host], _host_semaphores[host]
+
+
+def get_breaker_states():
+    with _lock:
+        return {host: breaker.state for host, breaker in _breakers.items()}
+
+
+def _probe_host(key, items, deadline):
+    host, port, user, password, ssh_key_path = key
+    breaker, semaphore = _host_state(host)
+    try:
+        if not semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            return None
+        try:
+            timeout = max(min(MONITOR_COMMAND_TIMEOUT, deadline - time.monotonic()), 1)
+            probe = probe_ssh_host(host, port, user, password, [path for _, path in items], ssh_key_path, timeout=timeout)
+        finally:
+            semaphore.release()
+    except Exception as e:
+        breaker.record_failure()
+        return {bot_id: {'status': 'unknown', 'error': str(e)} for bot_id, _ in items}
+    finally:
+        with _lock:
+            _in_flight.discard(key)
+    if time.monotonic() > deadline:
+        # ответ пришёл уже после дедлайна цикла — для breaker'а это тоже отказ
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    sampled_at = time.time()
+    return {bot_id: dict(probe[path], status='running' if probe[path]['running'] else 'stopped', sampled_at=sampled_at)
+            for bot_id, path in items}
+
+
+def probe_bots(bots, ssh_bots, deadline=MONITOR_CYCLE_DEADLINE):
+    # bots — строки get_bots(), ssh_bots — полные строки get_ssh_bots().
+    # Возвращает {bot_id: {'status': 'running'|'stopped'|'unknown', ...}}.
+    end = time.monotonic() + deadline
+    result = {}
+    for bot_row in bots:
+        bot_id, bot_type = bot_row[0], bot_row[4]
+        if bot_type == 'local':
+            running = child_watcher.is_watched(bot_id) or is_local_bot_running(bot_id)
+            result[bot_id] = {'status': 'running' if running else 'stopped'}
+    hosts = {}
+    for bot_row in ssh_bots:
+        bot_id, _, script_path, _, _, host, port, user, password, ssh_key_path = bot_row[:10]
+        hosts.setdefault((host, port, user, password, ssh_key_path), []).append((bot_id, script_path))
+    futures = {}
+    for key, items in hosts.items():
+        breaker, _ = _host_state(key[0])
+        with _lock:
+            busy = key in _in_flight
+            if not busy:
+                _in_flight.add(key)
+        if busy or not breaker.allow():
+            # хост ещё отвечает на прошлый цикл или отключён breaker'ом
+            if not busy:
+                with _lock:
+                    _in_flight.discard(key)
+            for bot_id, _ in items:
+                result[bot_id] = {'status': 'unknown', 'error': 'host unavailable'}
+            continue
+        futures[_executor.submit(_probe_host, key, items, end)] = items
+    done, _ = wait(futures, timeout=max(end - time.monotonic(), 0))
+    for future, items in futures.items():
+        probe = future.result() if future in done else None
+        for bot_id, _ in items:
+            result[bot_id] = probe[bot_id] if probe else {'status': 'unknown', 'error': 'timeout'}
+    return result
+
+
+def record_cycle(started_at, duration, statuses, ssh_bots):
+    last_cycle.update({
+        'started_at': started_at,
+        'duration': duration,
+        'bots': len(statuses),
+        'hosts': len({tuple(bot_row[5:10]) for bot_row in ssh_bots}),
+        'unknown': sum(1 for info in statuses.values() if info['status'] == 'unknown'),
+    })
+    telemetry.MONITOR_CYCLE_SECONDS.observe(value=duration)
+    telemetry.MONITOR_UNKNOWN.set(value=last_cycle['unknown'])
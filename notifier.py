@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+
+# Очередь исходящих сообщений Telegram с отдельным потоком-отправителем.
+# Вызывающие только ставят сообщение в очередь и не блокируются. Отправка
+# ограничена token bucket'ами (общий лимит бота и лимит на чат), на 429
+# отправитель выжидает retry_after. Однотипные события (например, падение
+# нескольких ботов одного хоста) в пределах окна склеиваются в одну сводку.
+
+NOTIFY_GLOBAL_RATE = 25.0  # сообщений в секунду на бота (лимит Telegram ~30)
+NOTIFY_GLOBAL_BURST = 25
+NOTIFY_CHAT_RATE = 1.0  # сообщений в секунду в один чат
+NOTIFY_CHAT_BURST = 1
+NOTIFY_COALESCE_WINDOW = 3.0
+NOTIFY_MAX_QUEUE = 1000
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_RETRY_DELAY = 2.0
+NOTIFY_DIGEST_MAX_LINES = 30
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        # Через сколько секунд будет доступен токен (0 — уже доступен)
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+def _retry_after(error):
+    # retry_after из ответа Telegram (ApiTelegramException.result_json) или None
+    result = getattr(error, 'result_json', None)
+    if isinstance(result, dict) and result.get('error_code') == 429:
+        return float(result.get('parameters', {}).get('retry_after', 1))
+    return None
+
+
+class Notifier:
+    def __init__(self, send, global_rate=NOTIFY_GLOBAL_RATE, chat_rate=NOTIFY_CHAT_RATE,
+                 coalesce_window=NOTIFY_COALESCE_WINDOW, max_queue=NOTIFY_MAX_QUEUE):
+        # send(chat_id, text, parse_mode=...) — например, bot.send_message
+        self._send = send
+        self._global = TokenBucket(global_rate, NOTIFY_GLOBAL_BURST)
+        self._chat_rate = chat_rate
+        self._chats = {}  # chat_id -> TokenBucket
+        self.coalesce_window = coalesce_window
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._pending = deque()  # [chat_id, text, parse_mode, attempts]
+        self._digests = {}  # (chat_id, key) -> сводка, копящаяся до deadline
+        self._paused_until = 0.0
+        self._thread = None
+        self.sent = 0
+        self.dropped = 0
+
+    def enqueue(self, chat_id, text, parse_mode=None, coalesce=None):
+        # coalesce=(key, title, line): события с одинаковым key в пределах окна
+        # уходят одним сообщением «title.format(count=n)» со строками line;
+        # одиночное событие отправляется как text.
+        with self._cond:
+            if coalesce is None:
+                self._push([chat_id, text, parse_mode, 0])
+            else:
+                key, title, line = coalesce
+                digest = self._digests.get((chat_id, key))
+                if digest is None:
+                    self._digests[(chat_id, key)] = {
+                        'deadline': time.monotonic() + self.coalesce_window, 'text': text,
+                        'title': title, 'lines': [line], 'parse_mode': parse_mode}
+                else:
+                    digest['lines'].append(line)
+            self._cond.notify()
+        self._ensure_started()
+
+    def _push(self, item):
+        if len(self._pending) >= self.max_queue:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(item)
+
+    def _flush_digests(self, now):
+        for (chat_id, key), digest in list(self._digests.items()):
+            if digest['deadline'] > now:
+                continue
+            del self._digests[(chat_id, key)]
+            lines = digest['lines']
+            if len(lines) == 1:
+                text = digest['text']
+            else:
+                shown = lines[:NOTIFY_DIGEST_MAX_LINES]
+                if len(lines) > len(shown):
+                    shown.append(f'… и ещё {len(lines) - len(shown)}')
+                text = digest['title'].format(count=len(lines)) + '\n' + '\n'.join(shown)
+            self._push([chat_id, text, digest['parse_mode'], 0])
+
+    def _next_ready(self, now):
+        # Первое сообщение, которое можно отправить сейчас, с сохранением порядка
+        # внутри чата; иначе (None, сколько ждать)
+        wait = self._paused_until - now
+        if wait > 0:
+            return None, wait
+        wait = self._global.wait_time(now)
+        if wait > 0:
+            return None, wait
+        blocked = set()
+        wait = None
+        for item in self._pending:
+            chat_id = item[0]
+            if chat_id in blocked:
+                continue
+            bucket = self._chats.setdefault(chat_id, TokenBucket(self._chat_rate, NOTIFY_CHAT_BURST))
+            chat_wait = bucket.wait_time(now)
+            if chat_wait == 0:
+                self._pending.remove(item)
+                self._global.take(now)
+                bucket.take(now)
+                return item, 0
+            blocked.add(chat_id)
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    self._flush_digests(now)
+                    item, wait = self._next_ready(now)
+                    if item is not None:
+                        break
+                    if self._digests:
+                        digest_wait = min(d['deadline'] for d in self._digests.values()) - now
+                        wait = digest_wait if wait is None else min(wait, digest_wait)
+                    self._cond.wait(max(wait, 0.01) if wait is not None else None)
+            self._deliver(item)
+
+    def _deliver(self, item):
+        chat_id, text, parse_mode, attempts = item
+        try:
+            self._send(chat_id, text, parse_mode=parse_mode)
+            self.sent += 1
+            return
+        except Exception as e:
+            retry_after = _retry_after(e)
+            error_code = getattr(e, 'error_code', None)
+        with self._cond:
+            if retry_after is not None:
+                # Flood control: пауза для всей очереди, сообщение — обратно в начало
+                self._paused_until = time.monotonic() + retry_after
+                self._pending.appendleft(item)
+            elif error_code is None and attempts < NOTIFY_MAX_RETRIES:
+                # сетевая ошибка — повторить позже; ошибки API (403, 400) не повторяются
+                item[3] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + NOTIFY_RETRY_DELAY)
+                self._pending.appendleft(item)
+            else:
+                self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='notifier', daemon=True)
+                self._thread.start()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._pending) + sum(len(d['lines']) for d in self._digests.values())
@@ -0,0 +1,221 @@
+import threading
+import time
+from array import array
+
+from db import get_bots
+from local_utils import get_local_bot_usage
+from status_cache import cache as status_cache
+
+# Потребление CPU/памяти ботами. Локальные боты читаются из /proc раз в
+# RESOURCE_SAMPLE_INTERVAL, для SSH-ботов берутся %CPU и RSS из общего снимка
+# `ps` хоста, который монитор кладёт в status_cache. Сырые точки лежат в
+# кольцевом буфере фиксированного размера на массивах, для длинных окон
+# копятся агрегаты по RESOURCE_ROLLUP_STEP секунд.
+
+RESOURCE_SAMPLE_INTERVAL = 15
+RESOURCE_RAW_CAPACITY = 240  # час при опросе раз в 15 секунд
+RESOURCE_ROLLUP_STEP = 300
+RESOURCE_ROLLUP_CAPACITY = 288  # сутки пятиминутных агрегатов
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+
+class RingBuffer:
+    # Кольцевой буфер из нескольких числовых колонок (array('d')) одинаковой длины
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.fields = fields
+        self._columns = [array('d', bytes(8 * capacity)) for _ in fields]
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, *values):
+        for column, value in zip(self._columns, values):
+            column[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _row(self, index):
+        return tuple(column[index] for column in self._columns)
+
+    def first(self):
+        return self._row((self._head - self._count) % self.capacity) if self._count else None
+
+    def last(self):
+        return self._row((self._head - 1) % self.capacity) if self._count else None
+
+    def items(self, since=None):
+        # Точки от старых к новым; первая колонка — время
+        start = (self._head - self._count) % self.capacity
+        result = []
+        for i in range(self._count):
+            index = (start + i) % self.capacity
+            if since is None or self._columns[0][index] >= since:
+                result.append(self._row(index))
+        return result
+
+
+class BotSeries:
+    def __init__(self):
+        self.raw = RingBuffer(RESOURCE_RAW_CAPACITY, ('time', 'cpu', 'rss_kb'))
+        self.rollups = RingBuffer(RESOURCE_ROLLUP_CAPACITY, ('time', 'cpu_avg', 'cpu_max', 'rss_avg', 'rss_max'))
+        self._bucket = None  # [начало, сумма cpu, max cpu, сумма rss, max rss, n]
+
+    def add(self, t, cpu, rss_kb):
+        self.raw.append(t, cpu, rss_kb)
+        start = t - t % RESOURCE_ROLLUP_STEP
+        if self._bucket is not None and self._bucket[0] != start:
+            self._flush()
+        if self._bucket is None:
+            self._bucket = [start, 0.0, 0.0, 0.0, 0.0, 0]
+        bucket = self._bucket
+        bucket[1] += cpu
+        bucket[2] = max(bucket[2], cpu)
+        bucket[3] += rss_kb
+        bucket[4] = max(bucket[4], rss_kb)
+        bucket[5] += 1
+
+    def _flush(self):
+        start, cpu_sum, cpu_max, rss_sum, rss_max, n = self._bucket
+        self.rollups.append(start, cpu_sum / n, cpu_max, rss_sum / n, rss_max)
+        self._bucket = None
+
+
+class ResourceSampler:
+    def __init__(self, interval=RESOURCE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._series = {}  # bot_id -> BotSeries
+        self._cpu_prev = {}  # bot_id -> (pid, cpu_time, monotonic) для локальных
+        self._ssh_prev = {}  # bot_id -> (pid, started_at, cpu_time, sampled_at) последнего снимка SSH
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, bot_id, t, cpu, rss_kb):
+        with self._lock:
+            series = self._series.get(bot_id)
+            if series is None:
+                series = self._series[bot_id] = BotSeries()
+            series.add(t, cpu, rss_kb)
+
+    def _sample_local(self, bot_id):
+        usage = get_local_bot_usage(bot_id)
+        if usage is None:
+            self._cpu_prev.pop(bot_id, None)
+            return
+        now = time.monotonic()
+        previous = self._cpu_prev.get(bot_id)
+        self._cpu_prev[bot_id] = (usage['pid'], usage['cpu_time'], now)
+        if previous is None or previous[0] != usage['pid'] or now <= previous[2]:
+            return  # для %CPU нужны две точки одного процесса
+        cpu = 100.0 * (usage['cpu_time'] - previous[1]) / (now - previous[2])
+        self.record(bot_id, time.time(), max(cpu, 0.0), usage['rss_kb'])
+
+    def _sample_ssh(self, bot_ids):
+        # без собственных SSH-запросов: данные последнего снимка ps из кэша статусов;
+        # боты без свежей записи пропускаем, а не опрашиваем
+        # %CPU — как у локальных: разница накопленного cpu_time двух снимков
+        # одного процесса (pid и время старта; etimes целое, отсюда допуск)
+        for bot_id, info in status_cache.peek_many(bot_ids).items():
+            sampled_at = info.get('sampled_at')
+            if info.get('status') != 'running' or info.get('cpu_time') is None or not sampled_at:
+                self._ssh_prev.pop(bot_id, None)
+                continue
+            previous = self._ssh_prev.get(bot_id)
+            if previous is not None and previous[3] == sampled_at:
+                continue
+            self._ssh_prev[bot_id] = (info['pid'], info['started_at'], info['cpu_time'], sampled_at)
+            if (previous is None or previous[0] != info['pid'] or abs(previous[1] - info['started_at']) > 2
+                    or sampled_at <= previous[3]):
+                continue
+            cpu = 100.0 * (info['cpu_time'] - previous[2]) / (sampled_at - previous[3])
+            self.record(bot_id, sampled_at, max(cpu, 0.0), info['rss_kb'])
+
+    def sample_once(self):
+        bots = get_bots()
+        for bot_row in bots:
+            if bot_row[4] == 'local':
+                self._sample_local(bot_row[0])
+        ssh_ids = [bot_row[0] for bot_row in bots if bot_row[4] == 'ssh']
+        if ssh_ids:
+            self._sample_ssh(ssh_ids)
+        known = {bot_row[0] for bot_row in bots}
+        with self._lock:
+            for bot_id in [b for b in self._series if b not in known]:
+                del self._series[bot_id]
+
+    def _loop(self):
+        while True:
+            try:
+                self.sample_once()
+            except Exception:
+                pass
+            time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='resources', daemon=True)
+            self._thread.start()
+        return self
+
+    def get_metrics(self, bot_id, window=3600):
+        # Текущее значение, сводка за окно и точки: сырые, если окно ими покрыто, иначе агрегаты
+        since = time.time() - window
+        with self._lock:
+            series = self._series.get(bot_id)
+            if series is None:
+                return {'current': None, 'summary': None, 'resolution': None, 'points': []}
+            raw = series.raw.items(since)
+            covered = len(series.raw) < series.raw.capacity or series.raw.first()[0] <= since
+            rollups = None if covered else series.rollups.items(since)
+            current = series.raw.last()
+        if rollups is None:
+            resolution = 'raw'
+            points = [{'time': t, 'cpu': cpu, 'rss_kb': rss} for t, cpu, rss in raw]
+            cpu_values = [cpu for _, cpu, _ in raw]
+            rss_values = [rss for _, _, rss in raw]
+            summary_source = (cpu_values, cpu_values, rss_values, rss_values)
+        else:
+            resolution = f'{RESOURCE_ROLLUP_STEP}s'
+            points = [{'time': t, 'cpu': cpu_avg, 'cpu_max': cpu_max, 'rss_kb': rss_avg, 'rss_max_kb': rss_max}
+                      for t, cpu_avg, cpu_max, rss_avg, rss_max in rollups]
+            summary_source = ([p['cpu'] for p in points], [p['cpu_max'] for p in points],
+                              [p['rss_kb'] for p in points], [p['rss_max_kb'] for p in points])
+        cpu_avg, cpu_max, rss_avg, rss_max = summary_source
+        summary = None
+        if points:
+            summary = {'cpu_avg': sum(cpu_avg) / len(cpu_avg), 'cpu_max': max(cpu_max),
+                       'rss_avg_kb': sum(rss_avg) / len(rss_avg), 'rss_max_kb': max(rss_max)}
+        return {
+            'current': {'time': current[0], 'cpu': current[1], 'rss_kb': current[2]} if current else None,
+            'summary': summary,
+            'resolution': resolution,
+            'points': points,
+        }
+
+
+def sparkline(values, width=16):
+    if not values:
+        return ''
+    step = max(len(values) / width, 1)
+    values = [max(values[int(i * step):int((i + 1) * step)] or [0]) for i in range(min(width, len(values)))]
+    top = max(values) or 1
+    return ''.join(SPARK_CHARS[min(int(v / top * (len(SPARK_CHARS) - 1)), len(SPARK_CHARS) - 1)] for v in values)
+
+
+def format_usage(bot_id, window=3600):
+    # Строки для карточки бота в Telegram; пустая строка, если данных ещё нет
+    metrics = sampler.get_metrics(bot_id, window)
+    current, summary = metrics['current'], metrics['summary']
+    if not current:
+        return ''
+    text = f"\n📊 CPU: <b>{current['cpu']:.1f}%</b> · RAM: <b>{current['rss_kb'] / 1024:.1f} МБ</b>"
+    if summary:
+        text += (f"\nЗа {window // 60} мин: CPU ср. {summary['cpu_avg']:.1f}%, макс {summary['cpu_max']:.1f}%; "
+                 f"RAM макс {summary['rss_max_kb'] / 1024:.1f} МБ")
+        text += f"\n<code>{sparkline([p['cpu'] for p in metrics['points']])}</code>"
+    return text
+
+
+sampler = ResourceSampler()
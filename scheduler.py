@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from db import get_bots, get_revision
+
+# Планировщик запусков/остановок ботов. Колонка schedule содержит одно или
+# несколько правил через ';': «[start|stop|restart] <HH:MM или cron из 5 полей>»,
+# например «09:00», «stop 23:30», «restart 0 */6 * * *; stop 0 3 * * 1-5».
+# Ближайшие срабатывания лежат в куче; поток спит до первого из них, поэтому
+# работа на тик зависит только от числа наступивших заданий.
+
+SCHEDULE_ACTIONS = ('start', 'stop', 'restart')
+SCHEDULER_WORKERS = 4
+SCHEDULER_MAX_SLEEP = 60
+SCHEDULER_RELOAD_INTERVAL = 300
+# Расписания, заданные в другом процессе (веб-панель), подхватываются по
+# ревизии базы: её проверка — один запрос раз в SCHEDULER_REVISION_POLL секунд
+SCHEDULER_REVISION_POLL = 5
+
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f'Некорректный шаг: {field}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = high
+        if start < low or end > high or start > end:
+            raise ValueError(f'Значение вне диапазона {low}-{high}: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpr:
+    def __init__(self, text):
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f'Ожидалось 5 полей cron: {text}')
+        self.text = text
+        minutes, hours, days, months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, _FIELD_RANGES))
+        self.minutes, self.hours, self.days, self.months = minutes, hours, days, months
+        # cron: 0 и 7 — воскресенье; у datetime воскресенье — 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok  # как в cron: если заданы оба поля — ИЛИ
+
+    def next_after(self, moment):
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        return None
+
+
+def parse_schedule(text):
+    # -> [(action, CronExpr), ...]; ValueError при ошибке формата
+    rules = []
+    for entry in (text or '').split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        action, _, rest = entry.partition(' ')
+        if action.lower() in SCHEDULE_ACTIONS:
+            action, spec = action.lower(), rest.strip()
+        else:
+            action, spec = 'start', entry
+        if ':' in spec and ' ' not in spec:
+            hour, minute = spec.split(':', 1)
+            if not (hour.isdigit() and minute.isdigit()):
+                raise ValueError(f'Некорректное время: {spec}')
+            spec = f'{int(minute)} {int(hour)} * * *'
+        expr = CronExpr(spec)
+        if expr.next_after(datetime.now()) is None:
+            raise ValueError(f'Расписание никогда не сработает: {spec}')
+        rules.append((action, expr))
+    return rules
+
+
+class Scheduler:
+    def __init__(self, run_job, workers=SCHEDULER_WORKERS):
+        # run_job(bot_id, action, spec) вызывается в пуле потоков
+        self._run_job = run_job
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scheduler')
+        self._cond = threading.Condition()
+        self._heap = []  # (fire_at, seq, bot_id, version, action, expr)
+        self._seq = itertools.count()
+        self._schedules = {}  # bot_id -> (текст, version)
+        self._versions = {}  # bot_id -> последняя выданная version (не сбрасывается)
+        self._thread = None
+
+    def set_schedule(self, bot_id, schedule):
+        # Инкрементальное обновление: старые записи кучи отбрасываются лениво по version
+        try:
+            rules = parse_schedule(schedule)
+        except ValueError:
+            rules = []
+        now = datetime.now()
+        with self._cond:
+            previous = self._schedules.get(bot_id)
+            if previous and previous[0] == schedule:
+                return
+            version = self._versions.get(bot_id, -1) + 1
+            self._versions[bot_id] = version
+            if schedule:
+                self._schedules[bot_id] = (schedule, version)
+            else:
+                self._schedules.pop(bot_id, None)
+            for action, expr in rules:
+                self._push(bot_id, version, action, expr, now)
+            self._cond.notify()
+
+    def remove(self, bot_id):
+        self.set_schedule(bot_id, None)
+
+    def reload(self):
+        # Сверка с базой (например, после изменений из веб-панели в другом процессе)
+        bots = get_bots()
+        known = {bot_row[0] for bot_row in bots}
+        for bot_row in bots:
+            self.set_schedule(bot_row[0], bot_row[10])
+        with self._cond:
+            removed = [bot_id for bot_id in self._schedules if bot_id not in known]
+        for bot_id in removed:
+            self.remove(bot_id)
+
+    def _push(self, bot_id, version, action, expr, after):
+        fire_at = expr.next_after(after)
+        if fire_at is not None:
+            heapq.heappush(self._heap, (fire_at, next(self._seq), bot_id, version, action, expr))
+
+    def _is_current(self, bot_id, version):
+        current = self._schedules.get(bot_id)
+        return current is not None and current[1] == version
+
+    def next_runs(self, bot_id):
+        with self._cond:
+            return sorted((fire_at, action, expr.text) for fire_at, _, b, version, action, expr in self._heap
+                          if b == bot_id and self._is_current(b, version))
+
+    def _loop(self):
+        last_reload = time.monotonic()
+        revision = self._revision()
+        while True:
+            due = []
+            with self._cond:
+                while self._heap and not self._is_current(self._heap[0][2], self._heap[0][3]):
+                    heapq.heappop(self._heap)
+                now = datetime.now()
+                if self._heap and self._heap[0][0] <= now:
+                    while self._heap and self._heap[0][0] <= now:
+                        fire_at, _, bot_id, version, action, expr = heapq.heappop(self._heap)
+                        if self._is_current(bot_id, version):
+                            due.append((bot_id, action, expr.text))
+                            # после сна или скачка часов пропущенные запуски
+                            # схлопываются в один: следующий — после now
+                            self._push(bot_id, version, action, expr, max(fire_at, now))
+                else:
+                    delay = (self._heap[0][0] - now).total_seconds() if self._heap else SCHEDULER_MAX_SLEEP
+                    self._cond.wait(min(delay, SCHEDULER_MAX_SLEEP, SCHEDULER_REVISION_POLL))
+            for bot_id, action, spec in due:
+                self._executor.submit(self._run_job, bot_id, action, spec)
+            current = self._revision()
+            if current != revision or time.monotonic() - last_reload > SCHEDULER_RELOAD_INTERVAL:
+                revision = current
+                last_reload = time.monotonic()
+                try:
+                    self.reload()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _revision():
+        try:
+            return get_revision()
+        except Exception:
+            return None
+
+    def start(self):
+        self.reload()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+
+scheduler = None
+
+
+def init_scheduler(run_job):
+    global scheduler
+    scheduler = Scheduler(run_job)
+    return scheduler
+
+
+def notify_schedule_changed(bot_id, schedule):
+    # Вызывается после update_bot_schedule; без запущенного планировщика — no-op
+    if scheduler is not None:
+        scheduler.set_schedule(bot_id, schedule)
+
+
+def reload_schedules():
+    if scheduler is not None:
+        scheduler.reload()
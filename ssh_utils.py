@@ -1,66 +1,489 @@
-import paramiko
 import os
+import socket
+import threading
+import time
+
+import log_rotate
+import telemetry
+
+# Настройки пула SSH-соединений
+SSH_CONNECT_TIMEOUT = 10
+SSH_COMMAND_TIMEOUT = 30
+SSH_KEEPALIVE_INTERVAL = 30
+SSH_IDLE_TIMEOUT = 300
+SSH_MAX_CONNECTIONS_PER_HOST = 4
+FOLLOW_CHUNK_SIZE = 65536
+FOLLOW_INITIAL_BYTES = 4096
+FOLLOW_HEARTBEAT = 15
+REMOTE_LOG_ROTATE = 'logs/.log_rotate.py'
+
+# paramiko (с cryptography) импортируется долго, а при одних локальных ботах
+# не нужен вовсе — модуль загружается при первом SSH-подключении
+paramiko = None
+
+
+def _load_paramiko():
+    global paramiko
+    if paramiko is None:
+        import paramiko as module
+        paramiko = module
+    return paramiko
+
+
+class SSHConnectionPool:
+    """Пул keepalive-соединений, ключ — (host, port, user, password, ssh_key_path).
+
+    Соединения переиспользуются между вызовами: на каждую команду открывается
+    только новый канал в уже авторизованном транспорте. Мёртвые соединения
+    пересоздаются, простаивающие закрываются, на один хост открывается не более
+    max_per_host соединений.
+    """
+
+    def __init__(self, max_per_host=SSH_MAX_CONNECTIONS_PER_HOST, idle_timeout=SSH_IDLE_TIMEOUT,
+                 keepalive=SSH_KEEPALIVE_INTERVAL, connect_timeout=SSH_CONNECT_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self._cond = threading.Condition()
+        self._idle = {}  # key -> [(client, last_used), ...]
+        self._open = {}  # (host, port) -> число открытых соединений
+        self._channels = {}  # client -> долгоживущие каналы (tail -F) на этом соединении
+
+    @staticmethod
+    def _host_key(key):
+        return key[0], key[1]
+
+    @staticmethod
+    def _is_healthy(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def _connect(self, key):
+        host, port, user, password, ssh_key_path = key
+        _load_paramiko()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        kwargs = dict(port=port, username=user, timeout=self.connect_timeout,
+                      banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout)
+        try:
+            with telemetry.SSH_CONNECT_SECONDS.time(host):
+                if ssh_key_path:
+                    client.connect(host, key_filename=ssh_key_path, **kwargs)
+                else:
+                    client.connect(host, password=password, **kwargs)
+        except Exception:
+            telemetry.SSH_CONNECT_ERRORS.inc(host)
+            raise
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    def _has_channels_locked(self, client):
+        # Соединение с открытым долгоживущим каналом нельзя закрывать: оборвётся стрим
+        channels = [channel for channel in self._channels.get(client, ()) if not channel.closed]
+        if channels:
+            self._channels[client] = channels
+            return True
+        self._channels.pop(client, None)
+        return False
+
+    def _close_locked(self, key, client):
+        self._channels.pop(client, None)
+        try:
+            client.close()
+        except Exception:
+            pass
+        host_key = self._host_key(key)
+        self._open[host_key] = max(self._open.get(host_key, 1) - 1, 0)
+        self._cond.notify_all()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            alive = []
+            for client, last_used in idle:
+                if self._is_healthy(client) and self._has_channels_locked(client):
+                    alive.append((client, now))
+                elif now - last_used > self.idle_timeout or not self._is_healthy(client):
+                    self._close_locked(key, client)
+                else:
+                    alive.append((client, last_used))
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+
+    def _steal_idle_slot_locked(self, host_key):
+        # Лимит хоста занят простаивающими соединениями с другими учётными данными
+        for key, idle in self._idle.items():
+            if self._host_key(key) != host_key:
+                continue
+            for i, (client, _) in enumerate(idle):
+                if not self._has_channels_locked(client):
+                    del idle[i]
+                    self._close_locked(key, client)
+                    return True
+        return False
+
+    def acquire(self, key, timeout=None):
+        timeout = self.connect_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        host_key = self._host_key(key)
+        with self._cond:
+            while True:
+                self._evict_idle_locked()
+                idle = self._idle.get(key)
+                while idle:
+                    client, _ = idle.pop()
+                    if self._is_healthy(client):
+                        return client, True
+                    self._close_locked(key, client)
+                if self._open.get(host_key, 0) < self.max_per_host or self._steal_idle_slot_locked(host_key):
+                    self._open[host_key] = self._open.get(host_key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f'Нет свободных SSH-соединений к {host_key[0]}:{host_key[1]}')
+                self._cond.wait(remaining)
+        try:
+            return self._connect(key), False
+        except Exception:
+            with self._cond:
+                self._open[host_key] = max(self._open.get(host_key, 1) - 1, 0)
+                self._cond.notify_all()
+            raise
+
+    def release(self, key, client, broken=False):
+        with self._cond:
+            # сбой одной команды не рвёт соединение, на котором идут стримы
+            if broken and self._is_healthy(client) and self._has_channels_locked(client):
+                broken = False
+            if broken or not self._is_healthy(client):
+                self._close_locked(key, client)
+                return
+            self._idle.setdefault(key, []).append((client, time.monotonic()))
+            self._cond.notify_all()
+
+    def run(self, key, command, timeout=SSH_COMMAND_TIMEOUT, input=None):
+        # Возвращает (код выхода, stdout). Если переиспользованное соединение
+        # оказалось мёртвым, один раз переподключаемся.
+        for attempt in range(2):
+            client, reused = self.acquire(key)
+            try:
+                stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                if input is not None:
+                    stdin.write(input)
+                    stdin.channel.shutdown_write()
+                output = stdout.read().decode(errors='ignore')
+                exit_status = stdout.channel.recv_exit_status()
+            except socket.timeout:
+                self.release(key, client, broken=True)
+                raise
+            except (paramiko.SSHException, EOFError, OSError):
+                self.release(key, client, broken=True)
+                if reused and attempt == 0:
+                    continue
+                raise
+            self.release(key, client)
+            return exit_status, output
+
+    def open_channel(self, key, command):
+        # Долгоживущий канал (например, tail -F). Соединение сразу возвращается
+        # в пул: каналы мультиплексируются в одном транспорте и не занимают слот,
+        # но пока канал открыт, пул не закрывает и не отдаёт это соединение.
+        for attempt in range(2):
+            client, reused = self.acquire(key)
+            try:
+                channel = client.get_transport().open_session()
+                channel.exec_command(command)
+            except (paramiko.SSHException, EOFError, OSError):
+                self.release(key, client, broken=True)
+                if reused and attempt == 0:
+                    continue
+                raise
+            with self._cond:
+                self._channels.setdefault(client, []).append(channel)
+            self.release(key, client)
+            return channel
+
+    def close_all(self):
+        # соединения с открытыми стримами остаются до закрытия их каналов
+        with self._cond:
+            for key, idle in list(self._idle.items()):
+                busy = []
+                for client, last_used in idle:
+                    if self._has_channels_locked(client):
+                        busy.append((client, last_used))
+                    else:
+                        self._close_locked(key, client)
+                if busy:
+                    self._idle[key] = busy
+                else:
+                    del self._idle[key]
+
+
+pool = SSHConnectionPool()
+
+
+def _pool_key(host, port, user, password, ssh_key_path):
+    return host, int(port or 22), user, password, ssh_key_path
+
+
+_rotator_uploaded = set()
+_PLAIN_LOG_MARKER = '__plain_log'
+
+def _ensure_remote_rotator(key):
+    # log_rotate.py передаётся скриптом через stdin `sh -s`, как в run_ssh_batch:
+    # SFTP на хосте не нужен. Неудача запуску не мешает — _start_command тогда
+    # пишет лог без ротации, а загрузка повторится при следующем старте.
+    if key in _rotator_uploaded:
+        return
+    with open(log_rotate.__file__, encoding='utf-8') as f:
+        source = f.read().rstrip('\n')
+    script = (f"mkdir -p logs && cat > {REMOTE_LOG_ROTATE}.tmp << '__LOG_ROTATE_EOF'\n{source}\n__LOG_ROTATE_EOF\n"
+              f"mv {REMOTE_LOG_ROTATE}.tmp {REMOTE_LOG_ROTATE}\n")
+    try:
+        code, _ = pool.run(key, 'sh -s', input=script)
+    except Exception as e:
+        print(f'Не удалось загрузить ротатор логов на {key[0]}: {e}')
+        return
+    if code == 0:
+        _rotator_uploaded.add(key)
+
+
+def _check_rotator(key, output):
+    # хост запустил бота без ротатора (файл удалён, нет python3) — загрузим заново
+    if _PLAIN_LOG_MARKER in output:
+        _rotator_uploaded.discard(key)
+
+
+def _start_command(script_path):
+    # запуск с логом: вывод бота идёт через ротатор, история не затирается;
+    # без ротатора на хосте — простое дописывание в лог
+    script_name = os.path.basename(script_path)
+    log_path = f'logs/{script_name}.log'
+    rotate_args = f'{log_rotate.LOG_MAX_BYTES} {log_rotate.LOG_MAX_AGE} {log_rotate.LOG_BACKUP_COUNT}'
+    return (f'mkdir -p logs && if [ -f {REMOTE_LOG_ROTATE} ] && command -v python3 > /dev/null; then '
+            f'(nohup python3 {script_path} < /dev/null 2>&1 | '
+            f'nohup python3 {REMOTE_LOG_ROTATE} {log_path} {rotate_args} > /dev/null 2>&1 &); '
+            f'else (nohup python3 {script_path} < /dev/null >> {log_path} 2>&1 &); echo {_PLAIN_LOG_MARKER}; fi')
+
+def _stop_command(name):
+    return f'pkill -f "{name}"'
 
 def start_ssh_bot(host, port, user, password, script_path, ssh_key_path=None):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        if ssh_key_path:
-            ssh.connect(host, port=port, username=user, key_filename=ssh_key_path)
-        else:
-            ssh.connect(host, port=port, username=user, password=password)
-        script_name = os.path.basename(script_path)
-        log_path = f'logs/{script_name}.log'
-        # запуск с логом
-        ssh.exec_command(f'mkdir -p logs && nohup python3 {script_path} > {log_path} 2>&1 &')
-        ssh.close()
+        key = _pool_key(host, port, user, password, ssh_key_path)
+        _ensure_remote_rotator(key)
+        _, output = pool.run(key, _start_command(script_path))
+        _check_rotator(key, output)
         return True, None
     except Exception as e:
         return False, str(e)
 
 def stop_ssh_bot(host, port, user, password, name, ssh_key_path=None):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        if ssh_key_path:
-            ssh.connect(host, port=port, username=user, key_filename=ssh_key_path)
-        else:
-            ssh.connect(host, port=port, username=user, password=password)
-        ssh.exec_command(f'pkill -f "{name}"')
-        ssh.close()
+        pool.run(_pool_key(host, port, user, password, ssh_key_path), _stop_command(name))
         return True, None
     except Exception as e:
         return False, str(e)
 
-def is_ssh_bot_running(host, port, user, password, script_path, ssh_key_path=None):
+def run_ssh_batch(host, port, user, password, items, ssh_key_path=None):
+    # Групповое действие над ботами одного хоста одной командой.
+    # items — [(bot_id, action, name, script_path)], action: start/stop/restart.
+    # Возвращает {bot_id: (ok, err)}.
+    key = _pool_key(host, port, user, password, ssh_key_path)
+    try:
+        if any(action != 'stop' for _, action, _, _ in items):
+            _ensure_remote_rotator(key)
+        parts = []
+        for bot_id, action, name, script_path in items:
+            if action == 'start':
+                command = _start_command(script_path)
+            elif action == 'stop':
+                command = f'{_stop_command(name)}; true'
+            else:
+                command = f'{_stop_command(name)}; sleep 1; {_start_command(script_path)}'
+            parts.append(f'if {{ {command}; }}; then echo "__ok {bot_id}"; else echo "__fail {bot_id}"; fi')
+        # скрипт передаётся через stdin: иначе имена ботов попали бы в командную
+        # строку самого shell и pkill -f убил бы его вместе с ботами
+        _, output = pool.run(key, 'sh -s', input='\n'.join(parts) + '\n')
+    except Exception as e:
+        return {bot_id: (False, str(e)) for bot_id, _, _, _ in items}
+    _check_rotator(key, output)
+    results = {}
+    for line in output.splitlines():
+        marker, _, bot_id = line.partition(' ')
+        if marker in ('__ok', '__fail') and bot_id.isdigit():
+            results[int(bot_id)] = (marker == '__ok', None if marker == '__ok' else 'Команда завершилась с ошибкой')
+    for bot_id, _, _, _ in items:
+        results.setdefault(bot_id, (False, 'Нет ответа от хоста'))
+    return results
+
+def _matches_script(args, script_path):
     script_name = os.path.basename(script_path)
+    for token in args.split():
+        if token == script_path or os.path.basename(token) == script_name:
+            return True
+    return False
+
+def probe_ssh_host(host, port, user, password, script_paths, ssh_key_path=None, timeout=SSH_COMMAND_TIMEOUT):
+    # Один снимок таблицы процессов на хост вместо `ps aux | grep` на каждого бота.
+    # Возвращает {script_path: {'running', 'pid', 'started_at', 'cpu_time', 'rss_kb'}}.
+    # cpu_time — накопленное процессорное время в секундах (не pcpu: тот усреднён
+    # за всю жизнь процесса); загрузку считает resources по разнице снимков.
+    _, output = pool.run(_pool_key(host, port, user, password, ssh_key_path),
+                         'ps -eo pid=,etimes=,times=,rss=,args=', timeout=timeout)
+    now = time.time()
+    processes = []
+    for line in output.splitlines():
+        parts = line.split(None, 4)
+        if len(parts) < 5:
+            continue
+        try:
+            pid, etimes, cpu_time, rss = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])
+        except ValueError:
+            continue
+        processes.append((pid, now - etimes, cpu_time, rss, parts[4]))
+    result = {}
+    for script_path in script_paths:
+        info = {'running': False, 'pid': None, 'started_at': None, 'cpu_time': None, 'rss_kb': None}
+        for pid, started_at, cpu_time, rss, args in processes:
+            if _matches_script(args, script_path):
+                info = {'running': True, 'pid': pid, 'started_at': started_at, 'cpu_time': cpu_time, 'rss_kb': rss}
+                break
+        result[script_path] = info
+    return result
+
+def probe_ssh_bots(bots):
+    # bots — полные строки SSH-ботов (как из get_ssh_bots). Группируем по хосту и
+    # учётным данным, чтобы на каждый хост был ровно один запрос.
+    hosts = {}
+    for bot_row in bots:
+        bot_id, _, script_path, _, _, host, port, user, password, ssh_key_path = bot_row[:10]
+        hosts.setdefault((host, port, user, password, ssh_key_path), []).append((bot_id, script_path))
+    result = {}
+    for (host, port, user, password, ssh_key_path), items in hosts.items():
+        try:
+            probe = probe_ssh_host(host, port, user, password, [path for _, path in items], ssh_key_path)
+        except Exception as e:
+            for bot_id, _ in items:
+                result[bot_id] = {'running': False, 'error': str(e)}
+            continue
+        for bot_id, script_path in items:
+            result[bot_id] = probe[script_path]
+    return result
+
+def is_ssh_bot_running(host, port, user, password, script_path, ssh_key_path=None):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        if ssh_key_path:
-            ssh.connect(host, port=port, username=user, key_filename=ssh_key_path)
-        else:
-            ssh.connect(host, port=port, username=user, password=password)
-        stdin, stdout, stderr = ssh.exec_command(f'ps aux | grep {script_name} | grep -v grep')
-        output = stdout.read().decode()
-        ssh.close()
-        return script_name in output
+        return probe_ssh_host(host, port, user, password, [script_path], ssh_key_path)[script_path]['running']
     except Exception:
         return False
 
-def get_ssh_bot_log(host, port, user, password, script_path, ssh_key_path=None, lines=20):
+def get_ssh_bot_log(host, port, user, password, script_path, ssh_key_path=None, lines=20, max_bytes=None):
     script_name = os.path.basename(script_path)
     log_path = f'logs/{script_name}.log'
+    # если в текущем сегменте мало строк, добираем из предыдущего (возможно сжатого)
+    command = (f'(n=$(tail -n {lines} {log_path} 2>/dev/null | wc -l); '
+               f'if [ "$n" -lt {lines} ]; then (zcat {log_path}.1.gz 2>/dev/null || cat {log_path}.1 2>/dev/null) '
+               f'| tail -n $(({lines} - n)); fi; tail -n {lines} {log_path} 2>/dev/null)')
+    if max_bytes:
+        command += f' | tail -c {max_bytes}'
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        if ssh_key_path:
-            ssh.connect(host, port=port, username=user, key_filename=ssh_key_path)
-        else:
-            ssh.connect(host, port=port, username=user, password=password)
-        stdin, stdout, stderr = ssh.exec_command(f'tail -n {lines} {log_path}')
-        output = stdout.read().decode()
-        ssh.close()
+        _, output = pool.run(_pool_key(host, port, user, password, ssh_key_path), command)
+        if max_bytes and len(output.encode()) >= max_bytes and '\n' in output[:-1]:
+            # tail -c мог обрезать первую строку посередине
+            output = output.split('\n', 1)[1]
         return output if output else 'Лог пуст или не найден.'
     except Exception:
-        return 'Лог-файл не найден или ошибка подключения.' 
\ No newline at end of file
+        return 'Лог-файл не найден или ошибка подключения.'
+
+_TAIL_NOTICE = b'tail: '
+_TAIL_ROTATED = (b'has been replaced', b'truncated', b'has appeared')
+
+
+def _split_tail_notices(buffer, at_line_start, log_path):
+    # buffer — вывод `tail -F ... 2>&1`. Возвращает ([(сброс смещения?, данные)],
+    # хвост, который нужно дождаться целиком: возможная незаконченная строка tail).
+    segments = []
+    start = pos = 0
+    while True:
+        index = buffer.find(_TAIL_NOTICE, pos)
+        if index == -1:
+            break
+        pos = index + 1
+        if not (index == 0 and at_line_start or index > 0 and buffer[index - 1] == 0x0A):
+            continue
+        end = buffer.find(b'\n', index)
+        if end == -1:
+            segments.append((False, buffer[start:index]))
+            return segments, buffer[index:]
+        line = buffer[index:end + 1]
+        if log_path in line:
+            segments.append((False, buffer[start:index]))
+            segments.append((any(marker in line for marker in _TAIL_ROTATED), b''))
+            start = end + 1
+        pos = end + 1
+    # строка в конце может оказаться началом сообщения tail — придерживаем её
+    newline = buffer.rfind(b'\n', start)
+    line_start = newline + 1 if newline != -1 else start
+    tail = buffer[line_start:]
+    if (newline != -1 or start > 0 or at_line_start) and tail and _TAIL_NOTICE.startswith(tail):
+        segments.append((False, buffer[start:line_start]))
+        return segments, tail
+    segments.append((False, buffer[start:]))
+    return segments, b''
+
+
+def _follow_channel(channel, offset, log_path):
+    # stderr tail идёт в тот же поток (2>&1), поэтому сообщение о ротации
+    # («has been replaced», «file truncated») приходит ровно между данными
+    # старого и нового файла: с него смещение считается в новом файле с нуля
+    # и снова совпадает с позицией для `tail -c +N` при переподключении.
+    log_path = log_path.encode()
+    pending = b''
+    at_line_start = True
+    channel.settimeout(FOLLOW_HEARTBEAT)
+    try:
+        while True:
+            try:
+                data = channel.recv(FOLLOW_CHUNK_SIZE)
+            except socket.timeout:
+                yield offset, b''
+                continue
+            if not data:
+                return
+            buffer = pending + data
+            segments, pending = _split_tail_notices(buffer, at_line_start, log_path)
+            if len(pending) > FOLLOW_CHUNK_SIZE:
+                # строка лога, похожая на сообщение tail, — это просто данные
+                segments, pending = segments + [(False, pending)], b''
+            # придержанный хвост всегда начинается с начала строки
+            at_line_start = bool(pending) or buffer.endswith(b'\n')
+            for rotated, chunk in segments:
+                if rotated:
+                    offset = 0
+                if chunk:
+                    offset += len(chunk)
+                    yield offset, chunk
+    finally:
+        channel.close()
+
+def follow_ssh_log(host, port, user, password, script_path, ssh_key_path=None, offset=None):
+    # Генератор (offset, bytes) по одному долгоживущему каналу `tail -F`.
+    # Пустой chunk — heartbeat. Следующий блок читается из канала только после
+    # того, как потребитель забрал предыдущий; окно SSH ограничивает буфер.
+    # Канал открывается сразу, чтобы ошибки подключения были видны до начала стрима.
+    script_name = os.path.basename(script_path)
+    log_path = f'logs/{script_name}.log'
+    key = _pool_key(host, port, user, password, ssh_key_path)
+    if offset is None:
+        _, output = pool.run(key, f'stat -c %s {log_path} 2>/dev/null || echo 0')
+        size = int(output.strip() or 0)
+        offset = max(size - FOLLOW_INITIAL_BYTES, 0)
+    channel = pool.open_channel(key, f'tail -c +{offset + 1} -F {log_path} 2>&1')
+    return _follow_channel(channel, offset, log_path)
+
+
+# Время и ошибки каждой функции модуля — в метрики telemetry
+telemetry.instrument_module(globals(), telemetry.SSH_CALL_SECONDS, telemetry.SSH_CALL_ERRORS)
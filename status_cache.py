@@ -0,0 +1,100 @@
+import threading
+import time
+
+from db import get_bots, get_ssh_bots
+from monitor import probe_bots
+
+# Общий кэш реальных статусов ботов. Заполняется монитором, читается списком
+# ботов в Telegram и веб-панелью. Записи старше TTL в режиме
+# stale-while-revalidate отдаются сразу и обновляются в фоне; отсутствующие
+# (или сброшенные после запуска/остановки) записи проверяются синхронно,
+# но только для этих ботов.
+
+STATUS_CACHE_TTL = 90
+STATUS_CACHE_MAX_STALE = 600
+STATUS_CACHE_SWR = True
+
+
+class StatusCache:
+    def __init__(self, ttl=STATUS_CACHE_TTL, max_stale=STATUS_CACHE_MAX_STALE, stale_while_revalidate=STATUS_CACHE_SWR):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.stale_while_revalidate = stale_while_revalidate
+        self._entries = {}  # bot_id -> (info, stored_at)
+        self._lock = threading.Lock()
+        self._revalidating = set()
+
+    def put(self, bot_id, info):
+        with self._lock:
+            self._entries[bot_id] = (info, time.monotonic())
+
+    def update(self, statuses):
+        now = time.monotonic()
+        with self._lock:
+            for bot_id, info in statuses.items():
+                self._entries[bot_id] = (info, now)
+
+    def invalidate(self, bot_id=None):
+        with self._lock:
+            if bot_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(bot_id, None)
+
+    def _probe(self, bot_ids):
+        bots = [b for b in get_bots() if b[0] in bot_ids]
+        ssh_bots = [b for b in get_ssh_bots() if b[0] in bot_ids]
+        statuses = probe_bots(bots, ssh_bots)
+        self.update(statuses)
+        return statuses
+
+    def _revalidate(self, bot_ids):
+        try:
+            self._probe(bot_ids)
+        finally:
+            with self._lock:
+                self._revalidating.difference_update(bot_ids)
+
+    def get_many(self, bot_ids):
+        # {bot_id: info}; info['status'] — 'running' | 'stopped' | 'unknown'
+        now = time.monotonic()
+        result, missing, stale = {}, set(), set()
+        with self._lock:
+            for bot_id in bot_ids:
+                entry = self._entries.get(bot_id)
+                if entry is None:
+                    missing.add(bot_id)
+                    continue
+                info, stored_at = entry
+                age = now - stored_at
+                if age <= self.ttl:
+                    result[bot_id] = info
+                elif self.stale_while_revalidate and age <= self.max_stale:
+                    result[bot_id] = info
+                    if bot_id not in self._revalidating:
+                        stale.add(bot_id)
+                else:
+                    missing.add(bot_id)
+            self._revalidating.update(stale)
+        if stale:
+            threading.Thread(target=self._revalidate, args=(stale,), daemon=True).start()
+        if missing:
+            probed = self._probe(missing)
+            for bot_id in missing:
+                result[bot_id] = probed.get(bot_id, {'status': 'unknown'})
+        return result
+
+    def peek_many(self, bot_ids):
+        # Только свежие записи (не старше TTL), без опроса хостов и фонового
+        # обновления; боты без свежей записи в ответ не попадают
+        now = time.monotonic()
+        with self._lock:
+            entries = {bot_id: self._entries.get(bot_id) for bot_id in bot_ids}
+        return {bot_id: entry[0] for bot_id, entry in entries.items()
+                if entry is not None and now - entry[1] <= self.ttl}
+
+    def get_status(self, bot_id):
+        return self.get_many([bot_id])[bot_id]['status']
+
+
+cache = StatusCache()
@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from collections import deque
+
+from db import get_bot_by_id, get_supervision, record_bot_exit, record_bot_restart, reset_restart_history, set_crash_loop
+
+# Автоперезапуск упавших ботов. Политика хранится в bot_supervision:
+#   never      — не перезапускать (по умолчанию);
+#   on-failure — перезапускать, если код выхода ненулевой или неизвестен (SSH);
+#   always     — перезапускать при любом неожиданном завершении.
+# Задержка растёт экспоненциально (с джиттером), а если за RESTART_WINDOW
+# случилось RESTART_MAX_IN_WINDOW перезапусков, бот помечается как crash-loop
+# и больше не перезапускается до ручного запуска или смены политики.
+
+RESTART_POLICIES = ('never', 'on-failure', 'always')
+RESTART_BACKOFF_BASE = 1.0
+RESTART_BACKOFF_MAX = 300
+RESTART_WINDOW = 600
+RESTART_MAX_IN_WINDOW = 5
+RESTART_STABLE_AFTER = 120  # после стольких секунд работы backoff сбрасывается
+
+
+def backoff_delay(failures):
+    # «equal jitter»: половина задержки фиксирована, половина случайна
+    delay = min(RESTART_BACKOFF_BASE * 2 ** failures, RESTART_BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Supervisor:
+    def __init__(self, start, notify):
+        # start(bot_id) -> (ok, err) — запуск без сброса истории перезапусков;
+        # notify(bot_id, event, text) — уведомление админам
+        self._start = start
+        self._notify = notify
+        self._lock = threading.Lock()
+        self._pending = {}  # bot_id -> threading.Timer
+        self._restarts = {}  # bot_id -> deque(monotonic) перезапусков в окне
+        self._failures = {}  # bot_id -> подряд идущие падения (для backoff)
+        self._started_at = {}  # bot_id -> monotonic последнего перезапуска
+
+    def handle_exit(self, bot_id, exit_code):
+        # Вызывается при неожиданном завершении бота (exit_code=None — неизвестен).
+        # Возвращает ('none'|'pending'|'restart'|'crash-loop', задержка или None).
+        record_bot_exit(bot_id, exit_code, time.time())
+        policy, restart_count, _, _, _, crash_loop = get_supervision(bot_id)
+        if not restart_count:
+            # историю сбросил ручной запуск — возможно, из другого процесса (веб-панель)
+            with self._lock:
+                self._restarts.pop(bot_id, None)
+                self._failures.pop(bot_id, None)
+        if policy == 'never' or policy == 'on-failure' and exit_code == 0:
+            return 'none', None
+        if crash_loop:
+            return 'crash-loop', None
+        now = time.monotonic()
+        with self._lock:
+            if bot_id in self._pending:
+                return 'pending', None
+            restarts = self._restarts.setdefault(bot_id, deque())
+            while restarts and now - restarts[0] > RESTART_WINDOW:
+                restarts.popleft()
+            if len(restarts) >= RESTART_MAX_IN_WINDOW:
+                crash_loop = True
+            else:
+                if now - self._started_at.get(bot_id, now) > RESTART_STABLE_AFTER:
+                    self._failures[bot_id] = 0
+                delay = backoff_delay(self._failures.get(bot_id, 0))
+                timer = threading.Timer(delay, self._restart, args=(bot_id,))
+                timer.daemon = True
+                self._pending[bot_id] = timer
+                timer.start()
+        if crash_loop:
+            set_crash_loop(bot_id, True)
+            return 'crash-loop', None
+        return 'restart', delay
+
+    def _restart(self, bot_id):
+        with self._lock:
+            if self._pending.pop(bot_id, None) is None:
+                return  # отменён ручной остановкой
+            self._restarts.setdefault(bot_id, deque()).append(time.monotonic())
+            self._failures[bot_id] = self._failures.get(bot_id, 0) + 1
+            self._started_at[bot_id] = time.monotonic()
+            attempt = self._failures[bot_id]
+        bot_row = get_bot_by_id(bot_id)
+        if not bot_row or get_supervision(bot_id)[0] == 'never':
+            return
+        ok, err = self._start(bot_id)
+        record_bot_restart(bot_id, time.time())
+        if ok:
+            self._notify(bot_id, 'restarted', f'♻️ Бот "{bot_row[1]}" автоматически перезапущен (попытка {attempt})')
+            return
+        # неудачный запуск — тоже падение: следующая попытка с большей задержкой
+        action, delay = self.handle_exit(bot_id, None)
+        if action == 'crash-loop':
+            self._notify(bot_id, 'crash-loop', f'🔁 Бот "{bot_row[1]}" в цикле падений, автоперезапуск остановлен: {err}')
+        elif action == 'restart':
+            self._notify(bot_id, 'restart-failed',
+                         f'❌ Автоперезапуск бота "{bot_row[1]}" не удался: {err}. Повтор через {delay:.0f} с')
+
+    def cancel(self, bot_id):
+        with self._lock:
+            timer = self._pending.pop(bot_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def reset(self, bot_id):
+        # Ручной запуск: отменяем отложенный перезапуск и забываем историю в памяти
+        self.cancel(bot_id)
+        with self._lock:
+            self._restarts.pop(bot_id, None)
+            self._failures.pop(bot_id, None)
+
+    def pending(self):
+        with self._lock:
+            return set(self._pending)
+
+
+supervisor = None
+
+
+def init_supervisor(start, notify):
+    global supervisor
+    supervisor = Supervisor(start, notify)
+    return supervisor
+
+
+def handle_exit(bot_id, exit_code):
+    # Без запущенного супервизора (например, в веб-панели) — ничего не делаем
+    if supervisor is None:
+        return 'none', None
+    return supervisor.handle_exit(bot_id, exit_code)
+
+
+def reset_supervision(bot_id):
+    # Ручной запуск или смена политики. Метка crash-loop и счётчик перезапусков
+    # в базе сбрасываются в любом процессе: супервизор менеджера увидит это
+    # при следующем падении; состояние в памяти — только у своего супервизора.
+    reset_restart_history(bot_id)
+    if supervisor is not None:
+        supervisor.reset(bot_id)
+
+
+def cancel_restart(bot_id):
+    # Ручная остановка или удаление
+    if supervisor is not None:
+        supervisor.cancel(bot_id)
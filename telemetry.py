@@ -0,0 +1,226 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+# Внутренние метрики менеджера в текстовом формате Prometheus/OpenMetrics:
+# счётчики и гистограммы задержек SSH, SQLite, цикла мониторинга, Telegram API
+# и обработчиков. Только стандартная библиотека; наблюдение — это поиск
+# корзины и пара сложений под локом метрики.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        # как prometheus_client для формата 0.0.4: тип объявляется на имени с _total
+        name = f'{self.name}_total'
+        lines = [f'# HELP {name} {self.help}', f'# TYPE {name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label_values -> [счётчики по корзинам..., +Inf, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, [('le', bound)])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    # with histogram.time('label'): ... — наблюдает длительность блока
+    def __init__(self, histogram, label_values):
+        self._histogram = histogram
+        self._label_values = label_values
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(*self._label_values, value=time.perf_counter() - self._started)
+
+
+_metrics = []
+
+
+def counter(name, help_text, labels=()):
+    _metrics.append(Counter(name, help_text, labels))
+    return _metrics[-1]
+
+
+def gauge(name, help_text, labels=()):
+    _metrics.append(Gauge(name, help_text, labels))
+    return _metrics[-1]
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    _metrics.append(Histogram(name, help_text, labels, buckets))
+    return _metrics[-1]
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def timed(seconds, errors, *label_values):
+    # Декоратор: длительность вызова в гистограмму seconds, исключения — в счётчик errors
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc(*label_values)
+                raise
+            finally:
+                seconds.observe(*label_values, value=time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def instrument_module(namespace, seconds, errors):
+    # Оборачивает публичные функции модуля (globals()) с меткой — именем функции.
+    # Вызывается в конце модуля, до того как другие модули импортируют его имена.
+    # Генераторы пропускаются: обёртка замерила бы только создание генератора.
+    module_name = namespace['__name__']
+    for name, func in list(namespace.items()):
+        if (callable(func) and not name.startswith('_') and not isinstance(func, type)
+                and not inspect.isgeneratorfunction(func)
+                and getattr(func, '__module__', None) == module_name):
+            namespace[name] = timed(seconds, errors, name)(func)
+
+
+# --- Метрики менеджера ---
+SSH_CALL_SECONDS = histogram('botmanager_ssh_call_seconds', 'Duration of ssh_utils calls', ('function',))
+SSH_CALL_ERRORS = counter('botmanager_ssh_call_errors', 'ssh_utils calls that raised', ('function',))
+SSH_CONNECT_SECONDS = histogram('botmanager_ssh_connect_seconds', 'SSH connection setup latency', ('host',))
+SSH_CONNECT_ERRORS = counter('botmanager_ssh_connect_errors', 'Failed SSH connection attempts', ('host',))
+DB_SECONDS = histogram('botmanager_db_call_seconds', 'Duration of db.py calls', ('function',))
+DB_ERRORS = counter('botmanager_db_call_errors', 'db.py calls that raised', ('function',))
+MONITOR_CYCLE_SECONDS = histogram('botmanager_monitor_cycle_seconds', 'Duration of a monitor probe cycle',
+                                  buckets=(0.1, 0.5, 1, 2, 5, 10, 20, 30, 60))
+MONITOR_UNKNOWN = gauge('botmanager_monitor_unknown_bots', 'Bots left unknown in the last monitor cycle')
+TELEGRAM_SECONDS = histogram('botmanager_telegram_api_seconds', 'Telegram Bot API request latency', ('method',))
+TELEGRAM_ERRORS = counter('botmanager_telegram_api_errors', 'Failed Telegram Bot API requests', ('method',))
+HANDLER_SECONDS = histogram('botmanager_handler_seconds', 'Telegram handler execution time', ('handler',))
+HANDLER_ERRORS = counter('botmanager_handler_errors', 'Telegram handlers that raised', ('handler',))
+
+
+def instrument_telegram(bot):
+    # Задержка каждого запроса к Bot API (через apihelper._make_request)
+    # и время выполнения зарегистрированных обработчиков
+    from telebot import apihelper
+    make_request = apihelper._make_request
+    if not getattr(make_request, '_instrumented', False):
+        @functools.wraps(make_request)
+        def wrapper(token, method_name, *args, **kwargs):
+            with TELEGRAM_SECONDS.time(method_name):
+                try:
+                    return make_request(token, method_name, *args, **kwargs)
+                except Exception:
+                    TELEGRAM_ERRORS.inc(method_name)
+                    raise
+        wrapper._instrumented = True
+        apihelper._make_request = wrapper
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            func = handler['function']
+            if not getattr(func, '_instrumented', False):
+                handler['function'] = timed(HANDLER_SECONDS, HANDLER_ERRORS, func.__name__)(func)
+                handler['function']._instrumented = True
+
+
+def start_exporter(port, host='0.0.0.0'):
+    # Отдельный HTTP-экспортёр /metrics, когда веб-панель не запущена.
+    # http.server импортируется здесь: без экспортёра он только замедлял бы старт
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class ExporterHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), ExporterHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True).start()
+    return server
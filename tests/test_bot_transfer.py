@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot_transfer
+import db
+
+
+def _json_array(records):
+    return io.StringIO('[\n' + ',\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n]\n')
+
+
+def _ndjson(records):
+    return io.StringIO(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+
+
+class IterRecordsTest(unittest.TestCase):
+    RECORDS = [{'name': f'бот {i}', 'script_path': f'/srv/bot{i}.py', 'note': 'x' * i} for i in range(30)]
+
+    def test_formats(self):
+        # маленький буфер чтения: записи и многобайтовые символы рвутся между кусками
+        for chunk_size in (1, 7, 65536):
+            for fmt, make in (('json', _json_array), ('ndjson', _ndjson)):
+                with self.subTest(chunk_size=chunk_size, fmt=fmt):
+                    with mock.patch.object(bot_transfer, 'READ_CHUNK_SIZE', chunk_size):
+                        self.assertEqual(list(bot_transfer.iter_records(make(self.RECORDS))), self.RECORDS)
+
+    def test_layouts(self):
+        cases = [
+            ('', []),
+            ('  \n\n', []),
+            ('[]', []),
+            ('  [ {"a": 1} , {"b": [2, 3]} ]', [{'a': 1}, {'b': [2, 3]}]),
+            ('{"a": 1}\n\n{"b": 2}', [{'a': 1}, {'b': 2}]),
+            ('{"a": 1}\r\n{"b": 2}\r\n', [{'a': 1}, {'b': 2}]),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(list(bot_transfer.iter_records(io.StringIO(text))), expected)
+
+    def test_broken(self):
+        for text, message in (('[{"a": 1}, {"b"', 'оборван'), ('{"a": 1}\n{"b": }\n', 'Строка 2')):
+            with self.subTest(text=text):
+                with self.assertRaisesRegex(ValueError, message):
+                    list(bot_transfer.iter_records(io.StringIO(text)))
+
+
+class ImportBotsTest(unittest.TestCase):
+    def setUp(self):
+        self._old_path = db.DB_PATH
+        self._dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = os.path.join(self._dir.name, 'bots.db')
+        db.init_db()
+        db.add_ssh_bot('old', '/srv/old.py', 'host', 22, 'user', password='secret')
+
+    def tearDown(self):
+        db.get_connection().close()
+        db.DB_PATH = self._old_path
+        self._dir.cleanup()
+
+    def _bots(self):
+        return {row[1]: row for row in db.get_bots()}
+
+    def _import(self, records, on_conflict):
+        return bot_transfer.import_bots(_ndjson(records), on_conflict)
+
+    def test_conflict_modes(self):
+        records = [{'name': 'old', 'script_path': '/srv/new.py', 'type': 'ssh', 'host': 'other', 'port': '2222'},
+                   {'name': 'new', 'script_path': '/srv/new.py'}]
+        cases = [
+            ('skip', {'inserted': 1, 'updated': 0, 'skipped': 1}, '/srv/old.py'),
+            ('upsert', {'inserted': 1, 'updated': 1, 'skipped': 0}, '/srv/new.py'),
+        ]
+        for on_conflict, counts, old_path in cases:
+            with self.subTest(on_conflict=on_conflict):
+                summary = self._import(records, on_conflict)
+                self.assertTrue(summary['ok'])
+                self.assertEqual({key: summary[key] for key in counts}, counts)
+                bots = self._bots()
+                self.assertEqual(bots['old'][2], old_path)
+                self.assertEqual(bots['new'][4], 'local')
+                db.delete_bot(bots['new'][0])
+        # пароль не выгружается при экспорте, поэтому upsert без пароля его сохраняет
+        self.assertEqual(db.get_bot_by_id(self._bots()['old'][0])[8], 'secret')
+        self.assertEqual(self._bots()['old'][6], 2222)
+
+    def test_fail_rolls_back(self):
+        summary = self._import([{'name': 'new', 'script_path': '/srv/new.py'},
+                                {'name': 'old', 'script_path': '/srv/x.py'}], 'fail')
+        self.assertFalse(summary['ok'])
+        self.assertEqual((summary['inserted'], summary['updated']), (0, 0))
+        self.assertIn('old', summary['errors'][0])
+        self.assertEqual(set(self._bots()), {'old'})
+
+    def test_invalid_records(self):
+        # первая строка NDJSON не может начинаться с '[' — файл был бы принят за JSON-массив
+        records = [{'name': 'a'}, ['not', 'an', 'object'], {'name': 'b', 'script_path': 'b.py', 'type': 'docker'},
+                   {'name': 'c', 'script_path': 'c.py', 'type': 'ssh'},
+                   {'name': 'd', 'script_path': 'd.py', 'schedule': '0 0 31 2 *'},
+                   {'name': 'ok', 'script_path': 'ok.py'}]
+        summary = self._import(records, 'skip')
+        self.assertTrue(summary['ok'])
+        self.assertEqual((summary['total'], summary['invalid'], summary['inserted']), (6, 5, 1))
+        self.assertEqual([e.split(':')[0] for e in summary['errors']], [f'Запись {i}' for i in range(1, 6)])
+        self.assertIn('ok', self._bots())
+        summary = self._import(records, 'fail')
+        self.assertFalse(summary['ok'])
+        self.assertEqual(summary['errors'], ['Запись 1: нужны name и script_path'])
+
+    def test_duplicates_in_file(self):
+        # повтор имени в файле — отдельная ошибка, а не «обновлено»/«пропущено»
+        records = [{'name': 'dup', 'script_path': 'first.py'}, {'name': 'old', 'script_path': 'x.py'},
+                   {'name': 'dup', 'script_path': 'second.py'}]
+        for on_conflict in ('skip', 'upsert'):
+            with self.subTest(on_conflict=on_conflict):
+                summary = self._import(records, on_conflict)
+                self.assertTrue(summary['ok'])
+                self.assertEqual(summary['duplicates'], 1)
+                self.assertEqual(summary['updated'] + summary['skipped'], 1)
+                self.assertIn('Запись 3', summary['errors'][0])
+                self.assertEqual(self._bots()['dup'][2], 'first.py')
+                self.assertIn('повторов имён в файле 1', bot_transfer.format_summary(summary))
+                db.delete_bot(self._bots()['dup'][0])
+        summary = self._import([records[0], records[2]], 'fail')
+        self.assertFalse(summary['ok'])
+        self.assertNotIn('dup', self._bots())
+
+    def test_batches(self):
+        records = [{'name': f'bot{i}', 'script_path': f'{i}.py'} for i in range(7)] + [{'name': 'old', 'script_path': 'x'}]
+        with mock.patch.object(bot_transfer, 'IMPORT_BATCH_SIZE', 3):
+            summary = bot_transfer.import_bots(_json_array(records), 'upsert')
+        self.assertEqual((summary['total'], summary['inserted'], summary['updated']), (8, 7, 1))
+        self.assertEqual(len(self._bots()), 8)
+
+    def test_export_round_trip(self):
+        for fmt in ('json', 'ndjson'):
+            with self.subTest(fmt=fmt):
+                exported = ''.join(bot_transfer.export_bots(fmt))
+                self.assertNotIn('secret', exported)
+                db.delete_bot(self._bots()['old'][0])
+                summary = bot_transfer.import_bots(io.StringIO(exported), 'fail')
+                self.assertEqual((summary['ok'], summary['inserted']), (True, 1))
+                self.assertEqual(self._bots()['old'][2:10], ('/srv/old.py', 'stopped', 'ssh', 'host', 22, 'user', None, None))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            bot_transfer.import_bots(io.StringIO(''), 'replace')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import base64
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from callbacks import CALLBACK_MAX_LEN, CALLBACK_VERSION, TOKEN, CallbackRouter, TokenStore, decode, encode
+
+
+def _raw(data):
+    return base64.urlsafe_b64encode(bytes(data)).rstrip(b'=').decode('ascii')
+
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        for code, args in [(0, []), (1, [0]), (127, [128]), (128, [127, 16383, 16384]),
+                           (300, [2 ** 32, 2 ** 63 - 1]), (5, [0] * 20)]:
+            with self.subTest(code=code, args=args):
+                data = encode(code, args)
+                self.assertLessEqual(len(data), CALLBACK_MAX_LEN)
+                self.assertNotIn('=', data)
+                self.assertEqual(decode(data), (code, args))
+
+    def test_varint_bytes(self):
+        # 1 байт версии, затем каждое число — 7 бит на байт, старший бит — «дальше есть ещё»
+        self.assertEqual(base64.urlsafe_b64decode(encode(1, [300]) + '=='), bytes([CALLBACK_VERSION, 1, 0xAC, 0x02]))
+
+    def test_max_len(self):
+        # 48 байт -> ровно 64 символа base64, 49 байт -> 66
+        self.assertEqual(len(encode(1, [1] * 46)), CALLBACK_MAX_LEN)
+        with self.assertRaises(ValueError):
+            encode(1, [1] * 47)
+
+    def test_negative(self):
+        with self.assertRaises(ValueError):
+            encode(1, [-1])
+        with self.assertRaises(ValueError):
+            encode(-1)
+
+    def test_decode_invalid(self):
+        cases = [
+            '',  # пусто
+            'start_5',  # кнопка старого формата
+            'привет',  # не base64
+            _raw([CALLBACK_VERSION + 1, 1]),  # другая версия формата
+            _raw([CALLBACK_VERSION]),  # нет кода действия
+            _raw([CALLBACK_VERSION, 1, 0x80]),  # обрезанное число
+            _raw([CALLBACK_VERSION, 1] + [0xFF] * 10 + [0x01]),  # число длиннее 64 бит
+        ]
+        for data in cases:
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    decode(data)
+
+
+class TokenStoreTest(unittest.TestCase):
+    def test_put_get(self):
+        store = TokenStore()
+        first, second = store.put('Ноутбук'), store.put(('host', 22))
+        self.assertNotEqual(first, second)
+        self.assertEqual(store.get(first), 'Ноутбук')
+        self.assertEqual(store.get(second), ('host', 22))
+
+    def test_max_size(self):
+        store = TokenStore(max_size=2)
+        tokens = [store.put(value) for value in 'abc']
+        with self.assertRaises(KeyError):
+            store.get(tokens[0])
+        self.assertEqual([store.get(token) for token in tokens[1:]], ['b', 'c'])
+
+    def test_expired(self):
+        store = TokenStore(ttl=-1)
+        token = store.put('a')
+        with self.assertRaises(KeyError):
+            store.get(token)
+
+
+class CallbackRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = CallbackRouter()
+        self.calls = []
+
+        @self.router.route(1, 'start', int)
+        def start(call, bot_id):
+            self.calls.append(('start', call, bot_id))
+
+        @self.router.route(200, 'group', TOKEN, int)
+        def group(call, name, page):
+            self.calls.append(('group', call, name, page))
+
+    def test_resolve(self):
+        handler, args = self.router.resolve(self.router.data('start', 42))
+        handler('call', *args)
+        long_name = 'Очень длинное имя группы ' * 10
+        data = self.router.data('group', long_name, 3)
+        self.assertLessEqual(len(data), CALLBACK_MAX_LEN)
+        handler, args = self.router.resolve(data)
+        handler('call', *args)
+        self.assertEqual(self.calls, [('start', 'call', 42), ('group', 'call', long_name, 3)])
+
+    def test_unknown_or_stale(self):
+        for data in (encode(2, [1]), encode(1, []), encode(1, [1, 2])):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    self.router.resolve(data)
+
+    def test_expired_token(self):
+        self.router.tokens = TokenStore(ttl=-1)
+        with self.assertRaises(ValueError):
+            self.router.resolve(self.router.data('group', 'g', 0))
+
+    def test_wrong_arity(self):
+        with self.assertRaises(TypeError):
+            self.router.data('start')
+
+    def test_duplicate_route(self):
+        for code, name in ((1, 'other'), (2, 'start')):
+            with self.subTest(code=code, name=name):
+                with self.assertRaises(ValueError):
+                    self.router.route(code, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
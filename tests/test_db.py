@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+class RevisionTriggersTest(unittest.TestCase):
+    def setUp(self):
+        self._old_path = db.DB_PATH
+        self._dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = os.path.join(self._dir.name, 'bots.db')
+        db.init_db()
+        self.bot_id = db.add_local_bot('bot', 'bot.py')
+
+    def tearDown(self):
+        db.get_connection().close()
+        db.DB_PATH = self._old_path
+        self._dir.cleanup()
+
+    def test_supervision_upsert_twice(self):
+        db.set_restart_policy(self.bot_id, 'always')
+        before = db.get_revision()
+        db.set_restart_policy(self.bot_id, 'on-failure')
+        db.record_bot_exit(self.bot_id, 1, 1.0)
+        db.record_bot_exit(self.bot_id, 2, 2.0)
+        self.assertEqual(db.get_supervision(self.bot_id)[:3], ('on-failure', 0, 2))
+        self.assertGreater(db.get_revision(), before)
+
+    def test_import_upsert_twice(self):
+        row = ('bot', 'other.py', 'local', None, None, None, None, None, 'g', None)
+        db.import_bots_batches([[row]], on_conflict='upsert')
+        db.import_bots_batches([[row]], on_conflict='upsert')
+        changes = db.get_bot_changes(0)
+        self.assertEqual([bot_id for _, bot_id, _ in changes], [self.bot_id])
+
+    def test_init_db_replaces_old_triggers(self):
+        # база с триггером прежней версии (INSERT OR REPLACE)
+        conn = db.get_connection()
+        with conn:
+            conn.execute('DROP TRIGGER bot_supervision_revision_update')
+            conn.execute('CREATE TRIGGER bot_supervision_revision_update AFTER UPDATE ON bot_supervision BEGIN '
+                         'INSERT OR REPLACE INTO bot_changes (bot_id, revision) VALUES (NEW.bot_id, 1); END')
+        db.init_db()
+        db.set_restart_policy(self.bot_id, 'always')
+        db.set_restart_policy(self.bot_id, 'never')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from scheduler import CronExpr, Scheduler, parse_schedule
+
+
+class CronExprTest(unittest.TestCase):
+    # 2024-01-01 — понедельник
+    CASES = [
+        # (выражение, после, ожидаемое следующее срабатывание)
+        ('0 9 * * *', datetime(2024, 1, 1, 8, 59), datetime(2024, 1, 1, 9, 0)),
+        ('0 9 * * *', datetime(2024, 1, 1, 9, 0), datetime(2024, 1, 2, 9, 0)),
+        ('*/15 * * * *', datetime(2024, 1, 1, 10, 1), datetime(2024, 1, 1, 10, 15)),
+        ('*/15 * * * *', datetime(2024, 1, 1, 10, 45), datetime(2024, 1, 1, 11, 0)),
+        ('5/20 * * * *', datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 10, 45)),
+        ('0 */6 * * *', datetime(2024, 1, 1, 7, 0), datetime(2024, 1, 1, 12, 0)),
+        ('0 9-17/4 * * *', datetime(2024, 1, 1, 14, 0), datetime(2024, 1, 1, 17, 0)),
+        ('30 8 * * 1-5', datetime(2024, 1, 5, 9, 0), datetime(2024, 1, 8, 8, 30)),
+        ('0 0 * * 1,3', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 3, 0, 0)),
+        # воскресенье — и 0, и 7
+        ('0 12 * * 0', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 7, 12, 0)),
+        ('0 12 * * 7', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 7, 12, 0)),
+        ('0 12 * * 5-7', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 5, 12, 0)),
+        # заданы и день месяца, и день недели — срабатывает по любому (ИЛИ)
+        ('0 0 15 * 5', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 5, 0, 0)),
+        ('0 0 3 * 5', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 3, 0, 0)),
+        # один из них '*' — только второй (И)
+        ('0 0 13 * *', datetime(2024, 1, 1, 0, 0), datetime(2024, 1, 13, 0, 0)),
+        ('0 0 * 2 5', datetime(2024, 1, 1, 0, 0), datetime(2024, 2, 2, 0, 0)),
+        ('0 0 29 2 *', datetime(2024, 3, 1, 0, 0), datetime(2028, 2, 29, 0, 0)),
+        ('0 0 1 */3 *', datetime(2024, 2, 10, 0, 0), datetime(2024, 4, 1, 0, 0)),
+        ('0 0 31 * *', datetime(2024, 4, 1, 0, 0), datetime(2024, 5, 31, 0, 0)),
+    ]
+
+    def test_next_after(self):
+        for text, after, expected in self.CASES:
+            with self.subTest(text=text, after=after):
+                self.assertEqual(CronExpr(text).next_after(after), expected)
+
+    def test_next_after_ignores_seconds(self):
+        self.assertEqual(CronExpr('* * * * *').next_after(datetime(2024, 1, 1, 10, 0, 59, 999)),
+                         datetime(2024, 1, 1, 10, 1))
+
+    def test_never_fires(self):
+        self.assertIsNone(CronExpr('0 0 30 2 *').next_after(datetime(2024, 1, 1)))
+
+    def test_invalid(self):
+        for text in ('* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *', '* * * * 8',
+                     '*/0 * * * *', '5-1 * * * *', 'a * * * *'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    CronExpr(text)
+
+
+class ParseScheduleTest(unittest.TestCase):
+    CASES = [
+        ('09:00', [('start', '0 9 * * *')]),
+        ('stop 23:30', [('stop', '30 23 * * *')]),
+        ('RESTART 0 */6 * * *', [('restart', '0 */6 * * *')]),
+        ('restart 0 */6 * * *; stop 0 3 * * 1-5', [('restart', '0 */6 * * *'), ('stop', '0 3 * * 1-5')]),
+        ('  ; 7:05 ;', [('start', '5 7 * * *')]),
+        ('', []),
+        (None, []),
+    ]
+
+    def test_parse(self):
+        for text, expected in self.CASES:
+            with self.subTest(text=text):
+                self.assertEqual([(action, expr.text) for action, expr in parse_schedule(text)], expected)
+
+    def test_invalid(self):
+        for text in ('9:xx', '25:00', 'start', 'stop 0 0 31 2 *', '09:00; 0 0 30 2 *'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_schedule(text)
+
+
+class SchedulerCatchUpTest(unittest.TestCase):
+    def setUp(self):
+        self._old_path = db.DB_PATH
+        self._dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = os.path.join(self._dir.name, 'bots.db')
+        db.init_db()
+
+    def tearDown(self):
+        db.get_connection().close()
+        db.DB_PATH = self._old_path
+        self._dir.cleanup()
+
+    def test_missed_runs_collapse_into_one(self):
+        # после скачка часов на 5 часов вперёд ежечасное задание срабатывает один раз, а не 5
+        calls = []
+        fired = threading.Event()
+
+        def run_job(bot_id, action, spec):
+            calls.append((bot_id, action, spec))
+            fired.set()
+
+        scheduler = Scheduler(run_job, workers=1)
+        scheduler.set_schedule(1, 'restart 0 * * * *')
+        fire_at, *rest = scheduler._heap[0]
+        scheduler._heap[0] = (fire_at - timedelta(hours=5), *rest)
+        threading.Thread(target=scheduler._loop, daemon=True).start()
+        self.assertTrue(fired.wait(5))
+        fired.clear()
+        self.assertFalse(fired.wait(0.5))
+        self.assertEqual(calls, [(1, 'restart', '0 * * * *')])
+        (next_run, action, spec), = scheduler.next_runs(1)
+        self.assertGreater(next_run, datetime.now())
+
+
+if __name__ == '__main__':
+    unittest.main()
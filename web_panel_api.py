@@ -1,12 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import bootstrap  # первым: от него отсчитывается время старта
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from db import get_bots, get_bot_by_id, add_local_bot, add_ssh_bot, delete_bot, update_bot_status, update_bot_schedule
-from local_utils import start_local_bot, stop_local_bot, get_local_bot_log
-from ssh_utils import start_ssh_bot, stop_ssh_bot, get_ssh_bot_log
-import uvicorn
+from typing import List
+import asyncio
+import codecs
+import functools
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db import get_bots, get_bot_by_id, add_local_bot, add_ssh_bot, delete_bot, update_bot_schedule, get_supervisions, set_restart_policy, get_revision, get_bot_changes
+from local_utils import get_local_bot_log, follow_local_log
+from ssh_utils import get_ssh_bot_log, follow_ssh_log
+from status_cache import cache as status_cache
+from resources import sampler as resource_sampler
+from scheduler import parse_schedule, notify_schedule_changed, reload_schedules
+import bot_actions
+import bot_transfer
+from jobs import jobs
+import supervisor
+import telemetry
+import webhook
 
 app = FastAPI()
 
+@app.on_event('startup')
+def init_app():
+    bootstrap.mark('web_panel')
+    bootstrap.init_db()
+
+# Потоки логов читаются в собственном пуле, а не в общем пуле Starlette:
+# next() может ждать до FOLLOW_HEARTBEAT секунд. Потоков в пуле больше, чем
+# клиентов, — запасные нужны для закрытия стримов отключившихся клиентов.
+LOG_STREAM_MAX_CLIENTS = 50
+LOG_STREAM_WORKERS = LOG_STREAM_MAX_CLIENTS + 8
+_log_stream_slots = threading.BoundedSemaphore(LOG_STREAM_MAX_CLIENTS)
+_log_executor = ThreadPoolExecutor(max_workers=LOG_STREAM_WORKERS, thread_name_prefix='web-log')
+
+# Обработчики асинхронные и сами не блокируют цикл событий. Запросы к SQLite
+# идут в пул из DB_WORKERS потоков (у каждого своё соединение), обращения к
+# хостам (SSH, статусы, логи) — в пул из IO_WORKERS потоков с таймаутом
+# IO_TIMEOUT секунд на запрос (504). Больше IO_MAX_PENDING незавершённых
+# обращений не принимаем (503), чтобы зависшие хосты не копили очередь.
+# Запуск, остановка и групповые действия — фоновые задания (jobs.py).
+DB_WORKERS = 4
+IO_WORKERS = 32
+IO_TIMEOUT = float(os.environ.get('WEB_IO_TIMEOUT', '20'))
+IO_MAX_PENDING = 200
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='web-db')
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='web-io')
+_io_slots = threading.BoundedSemaphore(IO_MAX_PENDING)
+
+async def _db(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, functools.partial(func, *args))
+
+def _discard_late(future, discard):
+    if not future.cancelled() and future.exception() is None:
+        discard(future.result())
+
+async def _io(func, *args, timeout=IO_TIMEOUT, discard=None):
+    # discard(result) — освободить результат, который пришёл уже после таймаута
+    if not _io_slots.acquire(blocking=False):
+        raise HTTPException(503, 'Слишком много незавершённых обращений к хостам')
+    future = _io_executor.submit(func, *args)
+    # слот освобождается, когда вызов действительно завершился, а не по таймауту
+    future.add_done_callback(lambda _: _io_slots.release())
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        if discard is not None:
+            future.add_done_callback(functools.partial(_discard_late, discard=discard))
+        raise HTTPException(504, f'Хост не ответил за {timeout:g} с')
+
+def _job_response(job):
+    return JSONResponse(job, status_code=202, headers={'Location': f'/jobs/{job["id"]}'})
+
 class BotCreate(BaseModel):
     name: str
     script_path: str
@@ -19,68 +91,330 @@ class BotCreate(BaseModel):
     group_name: str = None
     schedule: str = None
 
-@app.get('/bots')
-def list_bots():
-    bots = get_bots()
-    return [
-        {
+def _validate_schedule(schedule):
+    if not schedule:
+        return
+    try:
+        parse_schedule(schedule)
+    except ValueError as e:
+        raise HTTPException(400, f'Некорректное расписание: {e}')
+
+class BulkRequest(BaseModel):
+    action: str
+    group_name: str = None
+    type: str = None
+    ids: List[int] = None
+
+def _bulk_job(action, bot_ids):
+    results = bot_actions.bulk_action(action, bot_ids)
+    return {'results': [{'id': bot_id, 'ok': ok, 'error': err} for bot_id, (ok, err) in sorted(results.items())]}
+
+@app.post('/bots/bulk')
+async def bulk(request: BulkRequest):
+    # 202 и задание; результаты по ботам — в result задания
+    if request.action not in bot_actions.BULK_ACTIONS:
+        raise HTTPException(400, f'Неизвестное действие: {request.action}')
+    bot_ids = await _db(bot_actions.select_bots, request.group_name, request.type, set(request.ids) if request.ids is not None else None)
+    job = jobs.submit(f'bulk_{request.action}', ('bulk', request.action, tuple(sorted(bot_ids))), _bulk_job, request.action, bot_ids)
+    return _job_response(job)
+
+IMPORT_SPOOL_SIZE = 1024 * 1024  # больше — тело запроса уходит на диск
+
+def _import_spooled(spool, on_conflict):
+    with spool:
+        spool.seek(0)
+        summary = bot_transfer.import_bots(io.TextIOWrapper(spool, encoding='utf-8-sig'), on_conflict)
+    if summary['ok']:
+        reload_schedules()
+    return summary
+
+@app.post('/bots/import')
+async def import_bots(request: Request, on_conflict: str = 'skip'):
+    # Тело — JSON-массив или NDJSON; пишем его во временный файл по мере приёма
+    if on_conflict not in bot_transfer.IMPORT_CONFLICT_MODES:
+        raise HTTPException(400, f'on_conflict должен быть одним из: {", ".join(bot_transfer.IMPORT_CONFLICT_MODES)}')
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    summary = await _db(_import_spooled, spool, on_conflict)
+    if not summary['ok']:
+        raise HTTPException(409 if on_conflict == 'fail' else 400, summary)
+    return summary
+
+@app.get('/bots/export')
+async def export_bots(format: str = 'json'):
+    if format not in ('json', 'ndjson'):
+        raise HTTPException(400, 'format должен быть json или ndjson')
+    media_type = 'application/x-ndjson' if format == 'ndjson' else 'application/json'
+    return StreamingResponse(bot_transfer.export_bots(format), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="bots_export.{format}"'})
+
+def _bot_items(bots):
+    statuses = status_cache.get_many([b[0] for b in bots])
+    supervisions = get_supervisions()
+    result = []
+    for b in bots:
+        process = statuses[b[0]]
+        policy, restart_count, last_exit_code, _, _, crash_loop = supervisions.get(b[0], ('never', 0, None, None, None, 0))
+        result.append({
             'id': b[0], 'name': b[1], 'script_path': b[2], 'status': b[3], 'type': b[4],
-            'host': b[5], 'port': b[6], 'user': b[7], 'ssh_key_path': b[8], 'group_name': b[9], 'schedule': b[10]
-        } for b in bots
-    ]
+            'host': b[5], 'port': b[6], 'user': b[7], 'ssh_key_path': b[8], 'group_name': b[9], 'schedule': b[10],
+            'real_status': process['status'], 'process': process,
+            'restart_policy': policy, 'restart_count': restart_count, 'last_exit_code': last_exit_code,
+            'crash_loop': bool(crash_loop)
+        })
+    return result
+
+def _etag(revision):
+    # слабый: снимок процесса (process) может отличаться при той же ревизии
+    return f'W/"{revision}"'
+
+@app.get('/bots')
+async def list_bots(request: Request, response: Response):
+    # ревизия берётся до чтения списка: при гонке клиент лишь лишний раз получит список
+    revision = await _db(get_revision)
+    etag = _etag(revision)
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    # статусы ботов без свежего кэша опрашиваются на хостах — это I/O
+    return await _io(_bot_items, await _db(get_bots))
+
+CHANGES_LIMIT = 500
+CHANGES_MAX_WAIT = 60
+CHANGES_POLL_INTERVAL = 1.0
+
+@app.get('/bots/changes')
+async def bot_changes(request: Request, since: int = 0, wait: float = 0):
+    # Боты, изменённые после ревизии since, и id удалённых. С wait>0 запрос ждёт
+    # (до CHANGES_MAX_WAIT секунд) первого изменения. Следующий since — revision
+    # из ответа; more=true — изменений больше CHANGES_LIMIT, стоит запросить сразу.
+    revision = await _db(get_revision)
+    reset = since > revision  # база пересоздана — клиенту нужен полный список
+    if reset:
+        since = 0
+    deadline = time.monotonic() + min(max(wait, 0), CHANGES_MAX_WAIT)
+    while revision <= since and time.monotonic() < deadline and not await request.is_disconnected():
+        await asyncio.sleep(CHANGES_POLL_INTERVAL)
+        revision = await _db(get_revision)
+    changes = await _db(get_bot_changes, since, CHANGES_LIMIT)
+    rows = [row for _, _, row in changes if row is not None]
+    items = await _io(_bot_items, rows) if rows else []
+    revisions = {bot_id: rev for rev, bot_id, _ in changes}
+    for item in items:
+        item['revision'] = revisions[item['id']]
+    return {
+        'revision': changes[-1][0] if changes else since,
+        'changes': items,
+        'deleted': [bot_id for _, bot_id, row in changes if row is None],
+        'more': len(changes) == CHANGES_LIMIT,
+        'reset': reset,
+    }
 
 @app.post('/bots')
-def create_bot(bot: BotCreate):
+async def create_bot(bot: BotCreate):
+    _validate_schedule(bot.schedule)
     if bot.type == 'local':
-        add_local_bot(bot.name, bot.script_path, bot.group_name, bot.schedule)
+        bot_id = await _db(add_local_bot, bot.name, bot.script_path, bot.group_name, bot.schedule)
     else:
-        add_ssh_bot(bot.name, bot.script_path, bot.host, bot.port, bot.user, bot.password, bot.ssh_key_path, bot.group_name, bot.schedule)
-    return {'ok': True}
+        bot_id = await _db(add_ssh_bot, bot.name, bot.script_path, bot.host, bot.port, bot.user, bot.password, bot.ssh_key_path, bot.group_name, bot.schedule)
+    notify_schedule_changed(bot_id, bot.schedule)
+    return {'ok': True, 'id': bot_id}
 
 @app.delete('/bots/{bot_id}')
-def remove_bot(bot_id: int):
-    delete_bot(bot_id)
+async def remove_bot(bot_id: int):
+    await _db(delete_bot, bot_id)
+    status_cache.invalidate(bot_id)
+    notify_schedule_changed(bot_id, None)
     return {'ok': True}
 
+def _bot_job(action, bot_id):
+    ok, err = action(bot_id)
+    if not ok:
+        raise RuntimeError(err or 'Неизвестная ошибка')
+    return {'id': bot_id}
+
 @app.post('/bots/{bot_id}/start')
-def start(bot_id: int):
-    bot = get_bot_by_id(bot_id)
-    if not bot:
+async def start(bot_id: int):
+    # 202 и задание: GET /jobs/{id} покажет, чем закончился запуск
+    if not await _db(get_bot_by_id, bot_id):
         raise HTTPException(404)
-    if bot[4] == 'local':
-        start_local_bot(bot[2])
-    else:
-        start_ssh_bot(bot[5], bot[6], bot[7], bot[8], bot[2], bot[9])
-    update_bot_status(bot_id, 'running')
-    return {'ok': True}
+    return _job_response(jobs.submit('start', ('start', bot_id), _bot_job, bot_actions.start_bot, bot_id))
 
 @app.post('/bots/{bot_id}/stop')
-def stop(bot_id: int):
-    bot = get_bot_by_id(bot_id)
-    if not bot:
+async def stop(bot_id: int):
+    if not await _db(get_bot_by_id, bot_id):
         raise HTTPException(404)
-    if bot[4] == 'local':
-        stop_local_bot(bot[1])
-    else:
-        stop_ssh_bot(bot[5], bot[6], bot[7], bot[8], bot[1], bot[9])
-    update_bot_status(bot_id, 'stopped')
+    return _job_response(jobs.submit('stop', ('stop', bot_id), _bot_job, bot_actions.stop_bot, bot_id))
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    # status: queued, running, succeeded, failed или timeout (дольше JOB_TIMEOUT)
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404)
+    return job
+
+class RestartPolicy(BaseModel):
+    policy: str
+
+@app.put('/bots/{bot_id}/restart_policy')
+async def update_restart_policy(bot_id: int, data: RestartPolicy):
+    if not await _db(get_bot_by_id, bot_id):
+        raise HTTPException(404)
+    if data.policy not in supervisor.RESTART_POLICIES:
+        raise HTTPException(400, f'Политика должна быть одной из: {", ".join(supervisor.RESTART_POLICIES)}')
+    await _db(set_restart_policy, bot_id, data.policy)
     return {'ok': True}
 
+@app.get('/metrics')
+async def metrics():
+    return Response(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
+
+@app.on_event('startup')
+def start_resource_sampler():
+    resource_sampler.start()
+
+@app.on_event('startup')
+def start_webhook_mode():
+    # Режим webhook: этот же процесс обслуживает Telegram-бота и фоновые задачи
+    if webhook.enabled():
+        if not webhook.initialized():
+            import main  # noqa: F401 — запуск через `uvicorn web_panel_api:app`
+        webhook.start()
+
+@app.on_event('shutdown')
+def stop_webhook_mode():
+    webhook.stop()
+
+@app.post(webhook.WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    if not webhook.enabled():
+        raise HTTPException(404)
+    if not webhook.check_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        raise HTTPException(403)
+    payload = await request.json()
+    if not isinstance(payload, dict):
+        raise HTTPException(400)
+    if not webhook.dispatch(payload):
+        # Telegram повторит доставку позже
+        raise HTTPException(503, 'Очередь обновлений переполнена')
+    return {'ok': True}
+
+@app.get('/bots/{bot_id}/metrics')
+async def get_metrics(bot_id: int, window: int = 3600):
+    if not await _db(get_bot_by_id, bot_id):
+        raise HTTPException(404)
+    return resource_sampler.get_metrics(bot_id, window)
+
 @app.get('/bots/{bot_id}/log')
-def get_log(bot_id: int):
-    bot = get_bot_by_id(bot_id)
+async def get_log(bot_id: int):
+    bot = await _db(get_bot_by_id, bot_id)
     if not bot:
         raise HTTPException(404)
     if bot[4] == 'local':
-        log = get_local_bot_log(bot[2])
+        log = await _io(get_local_bot_log, bot[2])
     else:
-        log = get_ssh_bot_log(bot[5], bot[6], bot[7], bot[8], bot[2], bot[9])
+        log = await _io(get_ssh_bot_log, bot[5], bot[6], bot[7], bot[8], bot[2], bot[9])
     return {'log': log}
 
+class _LogStream:
+    # Владеет генератором follow_*_log и слотом потока. next() и close()
+    # генератора выполняются в _log_executor под одним локом: закрыть генератор,
+    # пока другой поток ждёт в нём данных, нельзя.
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def next(self):
+        with self._lock:
+            return None if self._closed else next(self._chunks, None)
+
+    def _close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._chunks.close()
+        _log_stream_slots.release()
+
+    def close(self):
+        _log_executor.submit(self._close)
+
+
+class _LogStreamResponse(StreamingResponse):
+    # Стрим закрывается при любом исходе ответа — в том числе если клиент
+    # отключился раньше первого блока и генератор событий так и не запустился
+    def __init__(self, stream, **kwargs):
+        super().__init__(_sse_log_events(stream), **kwargs)
+        self._stream = stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._stream.close()
+
+
+async def _sse_log_events(stream):
+    # stream отдаёт (offset, bytes) из follow_*_log. id события — байтовое смещение,
+    # с которого клиент может продолжить (Last-Event-ID или ?offset=).
+    loop = asyncio.get_running_loop()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        item = await loop.run_in_executor(_log_executor, stream.next)
+        if item is None:
+            return
+        offset, data = item
+        if not data:
+            yield ': ping\n\n'
+            continue
+        text = decoder.decode(data)
+        if not text:
+            continue
+        event_id = max(offset - len(decoder.getstate()[0]), 0)
+        yield f'id: {event_id}\n' + ''.join(f'data: {line}\n' for line in text.split('\n')) + '\n'
+
+@app.get('/bots/{bot_id}/log/stream')
+async def stream_log(bot_id: int, request: Request, offset: int = None):
+    # Блоки лога читаются в _log_executor по одному next() за раз, так что
+    # открытый поток не занимает ни цикл событий, ни общий пул Starlette.
+    bot = await _db(get_bot_by_id, bot_id)
+    if not bot:
+        raise HTTPException(404)
+    if offset is None and request.headers.get('last-event-id', '').isdigit():
+        offset = int(request.headers['last-event-id'])
+    if not _log_stream_slots.acquire(blocking=False):
+        raise HTTPException(429, 'Слишком много открытых потоков логов')
+    try:
+        if bot[4] == 'local':
+            chunks = follow_local_log(bot[2], offset)
+        else:
+            chunks = await _io(follow_ssh_log, bot[5], bot[6], bot[7], bot[8], bot[2], bot[9], offset,
+                               discard=lambda late: late.close())
+    except HTTPException:
+        _log_stream_slots.release()
+        raise
+    except Exception as e:
+        _log_stream_slots.release()
+        raise HTTPException(502, f'Ошибка подключения: {e}')
+    return _LogStreamResponse(_LogStream(chunks), media_type='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.post('/bots/{bot_id}/schedule')
-def set_schedule(bot_id: int, schedule: str):
-    update_bot_schedule(bot_id, schedule)
+async def set_schedule(bot_id: int, schedule: str):
+    _validate_schedule(schedule)
+    await _db(update_bot_schedule, bot_id, schedule)
+    notify_schedule_changed(bot_id, schedule)
     return {'ok': True}
 
+@app.on_event('startup')
+def report_startup():
+    # зарегистрирован последним — выполняется после остальных startup-обработчиков
+    bootstrap.report()
+
 if __name__ == '__main__':
-    uvicorn.run('web_panel_api:app', host='0.0.0.0', port=8000, reload=True) 
\ No newline at end of file
+    import uvicorn
+    # reload перезапускает процесс при правке файлов — с ботом внутри (webhook) он не нужен
+    uvicorn.run('web_panel_api:app', host='0.0.0.0', port=8000, reload=not webhook.enabled()) 
\ No newline at end of file
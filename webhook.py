@@ -0,0 +1,147 @@
+import os
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bootstrap
+import telemetry
+
+# Приём обновлений Telegram через webhook вместо long polling. Включается
+# переменной TELEGRAM_WEBHOOK_URL (публичный https-адрес веб-панели); тогда
+# веб-панель в одном процессе с ботом принимает POST на WEBHOOK_PATH и
+# раздаёт обновления пулу из WEBHOOK_WORKERS потоков. Обновления одного чата
+# обрабатываются строго по очереди (мастер добавления, next_step_handler),
+# разные чаты — параллельно. Больше WEBHOOK_MAX_PENDING необработанных
+# обновлений не принимаем: 503, и Telegram повторит доставку позже.
+
+WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', '')
+WEBHOOK_PATH = '/telegram/webhook'
+WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '8'))
+WEBHOOK_MAX_PENDING = int(os.environ.get('WEBHOOK_MAX_PENDING', '500'))
+WEBHOOK_ALLOWED_UPDATES = ['message', 'callback_query']
+
+WEBHOOK_UPDATES = telemetry.counter('botmanager_webhook_updates', 'Telegram updates received via webhook', ('result',))
+WEBHOOK_PENDING = telemetry.gauge('botmanager_webhook_pending_updates', 'Webhook updates accepted but not yet handled')
+
+
+def enabled():
+    return bool(WEBHOOK_URL)
+
+
+def webhook_url():
+    return WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH
+
+
+def _chat_key(payload):
+    # Ключ очереди: чат сообщения или нажатой кнопки, иначе само обновление
+    for kind in WEBHOOK_ALLOWED_UPDATES:
+        item = payload.get(kind)
+        if item:
+            chat = (item.get('message') or item).get('chat') or item.get('from') or {}
+            if 'id' in chat:
+                return chat['id']
+    return ('update', payload.get('update_id'))
+
+
+class UpdateDispatcher:
+    def __init__(self, bot, workers=WEBHOOK_WORKERS, max_pending=WEBHOOK_MAX_PENDING):
+        self.bot = bot
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._chats = {}  # ключ чата -> deque обновлений; есть ключ — чат уже обрабатывается
+        self._pending = 0
+
+    def submit(self, payload):
+        # False — очередь переполнена
+        if not self._slots.acquire(blocking=False):
+            WEBHOOK_UPDATES.inc('rejected')
+            return False
+        key = _chat_key(payload)
+        with self._lock:
+            self._pending += 1
+            WEBHOOK_PENDING.set(value=self._pending)
+            queue = self._chats.get(key)
+            if queue is not None:
+                queue.append(payload)
+                return True
+            self._chats[key] = deque([payload])
+        self._executor.submit(self._drain, key)
+        return True
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._chats[key]
+                if not queue:
+                    del self._chats[key]
+                    return
+                payload = queue.popleft()
+            try:
+                self._process(payload)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    WEBHOOK_PENDING.set(value=self._pending)
+                self._slots.release()
+
+    def _process(self, payload):
+        from telebot import types
+        try:
+            self.bot.process_new_updates([types.Update.de_json(payload)])
+            WEBHOOK_UPDATES.inc('processed')
+        except Exception as e:
+            WEBHOOK_UPDATES.inc('failed')
+            print(f'Ошибка обработки обновления {payload.get("update_id")}: {e}')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_bot = None
+_start_background = None
+dispatcher = None
+
+
+def init_webhook(bot, start_background):
+    # Вызывается из main.py: бот с обработчиками и запуск фоновых задач
+    global _bot, _start_background
+    _bot = bot
+    _start_background = start_background
+
+
+def initialized():
+    return _bot is not None
+
+
+def start():
+    # Старт веб-панели: фоновые задачи, пул обработчиков и регистрация webhook
+    global dispatcher
+    if dispatcher is not None:
+        return dispatcher
+    bootstrap.init_bot(_bot)
+    _start_background()
+    # обработчики выполняются в нашем пуле, а не во внутреннем пуле telebot
+    _bot.threaded = False
+    dispatcher = UpdateDispatcher(_bot)
+    _bot.set_webhook(url=webhook_url(), secret_token=WEBHOOK_SECRET, allowed_updates=WEBHOOK_ALLOWED_UPDATES,
+                     max_connections=min(WEBHOOK_WORKERS * 2, 100))
+    return dispatcher
+
+
+def stop():
+    global dispatcher
+    if dispatcher is None:
+        return
+    dispatcher.shutdown()
+    dispatcher = None
+
+
+def check_secret(token):
+    return secrets.compare_digest(token or '', WEBHOOK_SECRET)
+
+
+def dispatch(payload):
+    return dispatcher is not None and dispatcher.submit(payload)